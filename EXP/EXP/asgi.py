@@ -1,7 +1,17 @@
 import os
 
-from django.core.asgi import get_asgi_application
+import django
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'EXP.settings')
 
-application = get_asgi_application()
+# То же, что get_asgi_application(), но с обработчиком, который отдаёт потоковые
+# ответы (выгрузки, файлы) из потока, а не из цикла событий
+django.setup(set_prefix=False)
+
+from main.asgi import ASGIHandler  # noqa: E402
+# Поток живых обновлений (SSE) обслуживается до Django; импорт - после настройки Django
+from main.sse import with_live_events  # noqa: E402
+
+django_application = ASGIHandler()
+
+application = with_live_events(django_application)
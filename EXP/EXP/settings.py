@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -33,6 +34,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'main.metrics.MetricsMiddleware',
+    'main.sqlwatch.SQLWatchMiddleware',
+    'main.replicas.ReplicaPinMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -46,7 +50,7 @@ ROOT_URLCONF = 'EXP.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'main.metrics.TimedDjangoTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -66,13 +70,44 @@ WSGI_APPLICATION = 'EXP.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# DATABASE_PATH позволяет держать отдельную базу, например для замеров (seed_bench)
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        # main.sqlite - стандартный бэкенд с BEGIN IMMEDIATE и SQLITE_PRAGMAS (см. ниже);
+        # SQLITE_PROFILE=off возвращает django.db.backends.sqlite3 без настроек
+        'ENGINE': ('django.db.backends.sqlite3' if os.environ.get('SQLITE_PROFILE') == 'off'
+                   else 'main.sqlite'),
+        'NAME': os.environ.get('DATABASE_PATH') or BASE_DIR / 'db.sqlite3',
     }
 }
 
+# Выполняются на каждом новом соединении. WAL позволяет читать во время записи,
+# busy_timeout - ждать освободившуюся блокировку вместо ошибки "database is locked"
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000)),
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,  # в КиБ, т. е. 64 МиБ на соединение
+    'temp_store': 'memory',
+}
+
+# Реплика для чтения
+# С DATABASE_REPLICA_PATH страницы, которые только показывают данные (главная, заявки,
+# кабинет руководителя, задачи отдела, выгрузка, поиск), читают из копии базы, которую
+# обновляет sync_replica. После изменяющего запроса пользователь REPLICA_PIN_SECONDS
+# секунд читает из основной базы, чтобы сразу видеть свои изменения.
+
+if os.environ.get('DATABASE_REPLICA_PATH'):
+    DATABASES['replica'] = {
+        'ENGINE': DATABASES['default']['ENGINE'],
+        'NAME': os.environ['DATABASE_REPLICA_PATH'],
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['main.replicas.ReplicaRouter']
+REPLICA_DATABASE = 'replica'
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', 15))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -121,4 +156,85 @@ LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = '/login/'
 
 MEDIA_URL = '/media/'
-MEDIA_ROOT = BASE_DIR / 'media'
\ No newline at end of file
+MEDIA_ROOT = BASE_DIR / 'media'
+
+# Вложения отдаются через attachment_download_view после проверки прав.
+# Сами байты может передавать веб-сервер: 'x-accel-redirect' (nginx, internal-location
+# ATTACHMENT_ACCEL_REDIRECT_PREFIX смотрит в MEDIA_ROOT) или 'x-sendfile' (Apache).
+# Без настройки файл отдаёт Django через FileResponse.
+ATTACHMENT_SENDFILE_BACKEND = os.environ.get('ATTACHMENT_SENDFILE_BACKEND') or None
+ATTACHMENT_ACCEL_REDIRECT_PREFIX = '/protected-media/'
+
+
+# Фоновые задания
+# Очередь хранится в таблице main_job и выполняется командой runworker.
+# JOB_QUEUE_EAGER=1 выполняет задания сразу после коммита (без обработчика).
+
+JOB_QUEUE_EAGER = os.environ.get('JOB_QUEUE_EAGER') == '1'
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', os.cpu_count() or 2))
+
+
+# Асинхронные представления
+# ASYNC_READ_VIEWS=1 подключает async-версии главной страницы, заявок, кабинета
+# руководителя и задач отдела. Включать только при запуске под ASGI: под WSGI
+# каждый запрос к ним создаёт собственный цикл событий.
+
+ASYNC_READ_VIEWS = os.environ.get('ASYNC_READ_VIEWS') == '1'
+
+
+# Метрики
+# MetricsMiddleware замеряет каждый запрос; /metrics отдаёт значения в формате
+# Prometheus без входа запросам с заголовком Authorization: Bearer METRICS_TOKEN
+# и адресам из METRICS_ALLOWED_IPS, остальным - только администраторам. Оба
+# по умолчанию пусты: за nginx все запросы приходят с 127.0.0.1, и разрешённый
+# по умолчанию localhost открыл бы метрики всем. Процессы сервера раз в
+# METRICS_FLUSH_INTERVAL секунд сбрасывают накопленное в общий SQLite-файл METRICS_PATH.
+
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+METRICS_PATH = os.environ.get('METRICS_PATH') or BASE_DIR / 'cache' / 'metrics.sqlite3'
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 5))
+METRICS_ALLOWED_IPS = [ip for ip in os.environ.get('METRICS_ALLOWED_IPS', '').split(',') if ip]
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+
+# Разбор SQL запросов
+# SQLWatchMiddleware проверяет долю запросов SQL_WATCH_SAMPLE_RATE (при DEBUG -
+# все, в работе - например 0.01, 0 - выключено): одинаковые запросы из одного
+# места от SQL_WATCH_REPEAT_THRESHOLD раз (N+1) и запросы дольше SQL_WATCH_SLOW_MS
+# пишутся в журнал main.sqlwatch и в SQL_WATCH_REPORT_PATH. Сводка - sql_report.
+
+SQL_WATCH_SAMPLE_RATE = float(os.environ.get('SQL_WATCH_SAMPLE_RATE', 1 if DEBUG else 0))
+SQL_WATCH_REPEAT_THRESHOLD = int(os.environ.get('SQL_WATCH_REPEAT_THRESHOLD', 5))
+SQL_WATCH_SLOW_MS = float(os.environ.get('SQL_WATCH_SLOW_MS', 100))
+SQL_WATCH_REPORT_PATH = os.environ.get('SQL_WATCH_REPORT_PATH') or BASE_DIR / 'cache' / 'sql_report.jsonl'
+
+
+# Кэш
+# Фрагменты дашбордов хранятся в отдельном кэше. Бэкенд задаётся переменной
+# окружения DASHBOARD_CACHE_BACKEND: file (по умолчанию), locmem или полный
+# путь к классу бэкенда Django (тогда используется DASHBOARD_CACHE_LOCATION).
+# Кэш должен быть общим для всех процессов: сброс версий после записи виден
+# только тем процессам, которые видят тот же кэш. locmem годится лишь для
+# одного процесса (runserver без runworker).
+
+DASHBOARD_CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+}
+_dashboard_backend = os.environ.get('DASHBOARD_CACHE_BACKEND', 'file')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'dashboard': {
+        'BACKEND': DASHBOARD_CACHE_BACKENDS.get(_dashboard_backend, _dashboard_backend),
+        'LOCATION': os.environ.get(
+            'DASHBOARD_CACHE_LOCATION',
+            str(BASE_DIR / 'cache' / 'dashboard') if _dashboard_backend == 'file' else 'dashboard',
+        ),
+        'TIMEOUT': 600,
+    },
+}
+
+DASHBOARD_CACHE_ALIAS = 'dashboard'
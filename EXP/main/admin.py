@@ -1,6 +1,15 @@
 from django.contrib import admin
 from .models import User, Department, Task, Request
 from django.contrib.auth.admin import UserAdmin
+from .search import search_ids
+
+
+class FullTextSearchMixin:
+    # Поиск в списке идёт по индексу FTS5, а не LIKE '%...%' по всей таблице
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        return queryset.filter(pk__in=search_ids(self.model, search_term)), False
 
 # Регистрируем модель Department
 @admin.register(Department)
@@ -21,14 +30,14 @@ class CustomUserAdmin(UserAdmin):
 
 # Регистрируем модель Task
 @admin.register(Task)
-class TaskAdmin(admin.ModelAdmin):
+class TaskAdmin(FullTextSearchMixin, admin.ModelAdmin):
     list_display = ('title', 'status', 'priority', 'author', 'assignee', 'deadline')
     list_filter = ('status', 'priority', 'deadline') # Фильтры сбоку
     search_fields = ('title', 'description')
 
 # Регистрируем модель Request
 @admin.register(Request)
-class RequestAdmin(admin.ModelAdmin):
+class RequestAdmin(FullTextSearchMixin, admin.ModelAdmin):
     list_display = ('title', 'request_type', 'status', 'requester', 'created_at')
     list_filter = ('request_type', 'status')
     search_fields = ('title', 'justification')
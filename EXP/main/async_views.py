@@ -0,0 +1,110 @@
+import asyncio
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.views import redirect_to_login
+from django.http import HttpResponseForbidden
+from django.shortcuts import render
+
+from . import views
+from .forms import TaskExportForm
+from .live import latest_event_id
+from .replicas import replica_reads
+from .roster import department_roster
+from .sse import in_db_thread
+from .stats import department_task_stats
+
+# Async-версии представлений, которые только читают данные. В Django 3.2 нет
+# асинхронного ORM, поэтому каждый запрос к БД выполняется в пуле потоков,
+# а независимые запросы одной страницы идут параллельно через asyncio.gather.
+
+
+def _load_user(request):
+    # request.user загружается из сессии при первом обращении - это запрос к БД
+    request.user.is_authenticated
+    return request.user
+
+
+def async_login_required(view):
+    """login_required для async-представлений: встроенный в Django 3.2 их не поддерживает."""
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        user = await in_db_thread(_load_user, request)
+        if not user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+async def _render(request, template_name, context):
+    # Шаблон рендерится в потоке: это и процессорная работа, и возможные ленивые запросы
+    return await in_db_thread(render, request, template_name, context)
+
+
+@async_login_required
+@replica_reads
+async def home_view(request):
+    user = request.user
+    board_html, employees, live_after = await asyncio.gather(
+        in_db_thread(views.home_board_html, user),
+        in_db_thread(department_roster, user.department_id),
+        in_db_thread(latest_event_id),
+    )
+    return await _render(request, 'main/home.html', {
+        'board_html': board_html,
+        'employees': employees,
+        'live_after': live_after,
+    })
+
+
+@async_login_required
+@replica_reads
+async def request_list_view(request):
+    if not request.user.is_staff:
+        return HttpResponseForbidden('Доступ к заявкам есть только у руководителей отделов.')
+    requests = await in_db_thread(views.user_requests, request.user)
+    return await _render(request, 'main/request_list.html', {'requests': requests})
+
+
+@async_login_required
+@replica_reads
+async def manager_dashboard_view(request):
+    user = request.user
+    if not user.is_staff:
+        return HttpResponseForbidden('Доступ запрещён')
+
+    if request.method == 'POST' and 'assign_request' in request.POST:
+        # Запись остаётся синхронной и выполняется в общем потоке, как у обычных представлений
+        return await sync_to_async(views.assign_request)(request)
+
+    pending_requests, employees = await asyncio.gather(
+        in_db_thread(views.pending_requests, user),
+        in_db_thread(department_roster, user.department_id),
+    )
+    return await _render(request, 'main/manager_dashboard.html', {
+        'requests': pending_requests,
+        'employees': employees,
+    })
+
+
+@async_login_required
+@replica_reads
+async def department_tasks_view(request):
+    user = request.user
+    department = await in_db_thread(getattr, user, 'department') if user.department_id else None
+    if not user.is_staff or not department:
+        return HttpResponseForbidden("Доступ есть только у руководителей отделов.")
+    page, stats, live_after, export_form = await asyncio.gather(
+        in_db_thread(views.department_tasks_page, department),
+        in_db_thread(department_task_stats, department),
+        in_db_thread(latest_event_id),
+        in_db_thread(TaskExportForm, user=user),
+    )
+    return await _render(request, 'main/department_tasks.html', {
+        'tasks': page.items,
+        'next_cursor': page.next_cursor,
+        'stats': stats,
+        'department': department,
+        'live_after': live_after,
+        'export_form': export_form,
+    })
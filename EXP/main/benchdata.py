@@ -0,0 +1,420 @@
+"""Синтетические данные и набор страниц для замеров производительности.
+
+Данные генерируются детерминированно (по ``seed``), поэтому замеры на разных
+коммитах сравнимы, если база заполнена одними и теми же параметрами.
+"""
+import hashlib
+import itertools
+import json
+import random
+import struct
+import zlib
+from dataclasses import dataclass, field
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import Attachment, Blob, Comment, Department, Request, Task, UploadSession, User
+from .uploads import blob_name
+
+# Все сгенерированные записи помечены этими префиксами - по ним их можно удалить
+USERNAME_PREFIX = 'bench_'
+DEPARTMENT_PREFIX = 'Бенч-отдел '
+PASSWORD = 'bench'
+# Текст, которого нет в сгенерированных данных, - его ищет страница поиска
+SEARCH_TEXT = 'Замер поиска'
+
+WORDS = (
+    'отчёт', 'договор', 'сервер', 'поставка', 'проверка', 'бюджет', 'закупка', 'ремонт', 'склад',
+    'клиент', 'счёт', 'лицензия', 'обучение', 'встреча', 'презентация', 'аудит', 'план', 'график',
+    'оборудование', 'принтер', 'сеть', 'доступ', 'резервная', 'копия', 'инвентаризация', 'акт',
+    'квартал', 'сверка', 'заказ', 'доставка', 'монтаж', 'настройка', 'обновление', 'выгрузка',
+)
+
+STATUS_WEIGHTS = {
+    Task.Status.NEW: 30,
+    Task.Status.IN_PROGRESS: 25,
+    Task.Status.COMPLETED: 40,
+    Task.Status.CANCELED: 5,
+}
+PRIORITY_WEIGHTS = {Task.Priority.LOW: 25, Task.Priority.MEDIUM: 50, Task.Priority.HIGH: 25}
+REQUEST_STATUS_WEIGHTS = {
+    Request.RequestStatus.NEW: 50,
+    Request.RequestStatus.APPROVED: 35,
+    Request.RequestStatus.REJECTED: 15,
+}
+
+
+@dataclass
+class SeedSizes:
+    departments: int = 10
+    users: int = 200
+    tasks: int = 20000
+    comments: int = 50000
+    attachments: int = 500
+    requests: int = 2000
+    # Показатель закона Ципфа: чем больше, тем сильнее задачи и комментарии
+    # сосредоточены у небольшого числа сотрудников и задач
+    skew: float = 1.1
+
+
+def _zipf_cum_weights(count, skew):
+    weights = (1 / (rank ** skew) for rank in range(1, count + 1))
+    return list(itertools.accumulate(weights))
+
+
+def _text(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+
+def _png(index):
+    # Картинка 8x8 одного цвета: у каждого индекса свой цвет и, значит, свой SHA-256
+    def chunk(kind, data):
+        return (struct.pack('>I', len(data)) + kind + data
+                + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff))
+
+    pixel = (index % (1 << 24)).to_bytes(3, 'big')
+    raw = b''.join(b'\x00' + pixel * 8 for _ in range(8))
+    return (b'\x89PNG\r\n\x1a\n'
+            + chunk(b'IHDR', struct.pack('>IIBBBBB', 8, 8, 8, 2, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(raw))
+            + chunk(b'IEND', b''))
+
+
+def _new_ids(model, after_id, *fields):
+    # bulk_create в SQLite не возвращает первичные ключи - перечитываем добавленные строки
+    return list(model.objects.filter(pk__gt=after_id).order_by('pk').values_list('pk', *fields))
+
+
+def _last_id(model):
+    return model.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+
+
+def _bulk(model, objects, batch_size):
+    for start in range(0, len(objects), batch_size):
+        with transaction.atomic():
+            model.objects.bulk_create(objects[start:start + batch_size])
+
+
+def has_bench_data():
+    return (User.objects.filter(username__startswith=USERNAME_PREFIX).exists()
+            or Department.objects.filter(name__startswith=DEPARTMENT_PREFIX).exists())
+
+
+def _delete_rows(queryset):
+    # Удаление одним запросом: без загрузки объектов и сигналов на каждую строку
+    sql, params = queryset.values('pk').query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {queryset.model._meta.db_table} WHERE id IN ({sql})', params)
+
+
+def clear():
+    """Удаляет ранее сгенерированные записи вместе с файлами вложений."""
+    users = User.objects.filter(username__startswith=USERNAME_PREFIX)
+    departments = Department.objects.filter(name__startswith=DEPARTMENT_PREFIX)
+    tasks = Task.objects.filter(author__in=users)
+    blob_ids = list(Blob.objects.filter(attachments__task__in=tasks).values_list('pk', flat=True).distinct())
+    with transaction.atomic():
+        _delete_rows(Comment.objects.filter(task__in=tasks))
+        _delete_rows(Attachment.objects.filter(task__in=tasks))
+        _delete_rows(UploadSession.objects.filter(task__in=tasks))
+        _delete_rows(tasks)
+        _delete_rows(Request.objects.filter(requester__in=users))
+        _delete_rows(users)
+        _delete_rows(departments)
+        blobs = list(Blob.objects.filter(pk__in=blob_ids, attachments__isnull=True))
+        Blob.objects.filter(pk__in=[blob.pk for blob in blobs]).delete()
+    for blob in blobs:
+        default_storage.delete(blob.file.name)
+
+
+def seed(sizes, seed=42, batch_size=2000, progress=None):
+    """Заполняет базу синтетическими данными размера ``sizes``.
+
+    Каждому отделу достаётся руководитель (первый сотрудник отдела). Исполнители
+    задач и задачи для комментариев выбираются по закону Ципфа, так что у
+    немногих сотрудников задач на порядки больше, чем у остальных.
+    Записи вставляются через bulk_create, поэтому сигналы не срабатывают;
+    поисковый индекс обновляют триггеры базы.
+    """
+    rng = random.Random(seed)
+    report = progress or (lambda name, count: None)
+    today = timezone.localdate()
+    # Хеш пароля общий: считать PBKDF2 для каждого сотрудника незачем
+    password = make_password(PASSWORD)
+    department_count = max(1, sizes.departments)
+    user_count = max(department_count, sizes.users)
+
+    # Отделы и сотрудники
+    last = _last_id(Department)
+    _bulk(Department, [Department(name=f'{DEPARTMENT_PREFIX}{number + 1}')
+                       for number in range(department_count)], batch_size)
+    department_ids = [pk for pk, in _new_ids(Department, last)]
+    report('departments', len(department_ids))
+
+    last = _last_id(User)
+    users = []
+    for number in range(user_count):
+        # Первые department_count сотрудников - руководители своих отделов
+        leader = number < department_count
+        users.append(User(
+            username=f'{USERNAME_PREFIX}{number + 1:06d}',
+            password=password,
+            first_name=rng.choice(('Иван', 'Мария', 'Пётр', 'Анна', 'Олег', 'Елена')),
+            last_name=f'Сотрудник {number + 1}',
+            email=f'{USERNAME_PREFIX}{number + 1}@example.com',
+            is_staff=leader,
+            department_id=department_ids[number] if leader else rng.choice(department_ids),
+        ))
+    users.append(User(username=f'{USERNAME_PREFIX}admin', password=password,
+                      is_staff=True, is_superuser=True))
+    _bulk(User, users, batch_size)
+    user_rows = _new_ids(User, last, 'department_id', 'is_superuser')
+    user_rows = [(pk, department_id) for pk, department_id, superuser in user_rows if not superuser]
+    leaders = dict(zip(department_ids, (pk for pk, _ in user_rows[:department_count])))
+    with transaction.atomic():
+        for department_id, leader_id in leaders.items():
+            Department.objects.filter(pk=department_id).update(leader_id=leader_id)
+    members = {}
+    for pk, department_id in user_rows:
+        members.setdefault(department_id, []).append(pk)
+    report('users', len(user_rows))
+
+    # Задачи: исполнитель - по Ципфу среди всех сотрудников, автор - из его отдела
+    assignees = [pk for pk, _ in user_rows]
+    rng.shuffle(assignees)
+    user_department = dict(user_rows)
+    assignee_weights = _zipf_cum_weights(len(assignees), sizes.skew)
+    statuses, status_weights = zip(*STATUS_WEIGHTS.items())
+    priorities, priority_weights = zip(*PRIORITY_WEIGHTS.items())
+    last = _last_id(Task)
+    for start in range(0, sizes.tasks, batch_size):
+        count = min(batch_size, sizes.tasks - start)
+        batch = []
+        for assignee_id in rng.choices(assignees, cum_weights=assignee_weights, k=count):
+            department_id = user_department[assignee_id]
+            author_id = leaders[department_id] if rng.random() < 0.7 else rng.choice(members[department_id])
+            batch.append(Task(
+                title=_text(rng, rng.randint(2, 5)),
+                description=_text(rng, rng.randint(0, 30)),
+                status=rng.choices(statuses, status_weights)[0],
+                priority=rng.choices(priorities, priority_weights)[0],
+                deadline=today + timedelta(days=rng.randint(-30, 90)) if rng.random() < 0.8 else None,
+                author_id=author_id,
+                assignee_id=assignee_id,
+                department_id=department_id,
+            ))
+        with transaction.atomic():
+            Task.objects.bulk_create(batch)
+        report('tasks', start + count)
+    task_rows = _new_ids(Task, last, 'author_id', 'assignee_id')
+
+    # Комментарии: задачи - тоже по Ципфу, автор - автор или исполнитель задачи
+    if task_rows and sizes.comments:
+        commented = list(task_rows)
+        rng.shuffle(commented)
+        task_weights = _zipf_cum_weights(len(commented), sizes.skew)
+        for start in range(0, sizes.comments, batch_size):
+            count = min(batch_size, sizes.comments - start)
+            batch = [Comment(task_id=task_id, author_id=rng.choice((author_id, assignee_id)),
+                             text=_text(rng, rng.randint(3, 25)))
+                     for task_id, author_id, assignee_id
+                     in rng.choices(commented, cum_weights=task_weights, k=count)]
+            with transaction.atomic():
+                Comment.objects.bulk_create(batch)
+            report('comments', start + count)
+
+    # Вложения: одно содержимое часто прикреплено к нескольким задачам
+    if task_rows and sizes.attachments:
+        last = _last_id(Blob)
+        blobs = []
+        for number in range(max(1, sizes.attachments // 4)):
+            content = _png(seed * 7919 + number)
+            sha256 = hashlib.sha256(content).hexdigest()
+            name = default_storage.save(blob_name(sha256, 'bench.png'), ContentFile(content))
+            # Картинка сама служит себе миниатюрой и превью
+            blobs.append(Blob(sha256=sha256, size=len(content), file=name, thumbnail=name, preview=name,
+                              preview_status=Blob.PreviewStatus.READY))
+        _bulk(Blob, blobs, batch_size)
+        blob_rows = _new_ids(Blob, last, 'file')
+        attachments = []
+        for number in range(sizes.attachments):
+            task_id, author_id, assignee_id = rng.choice(task_rows)
+            # Каждое содержимое прикреплено хотя бы раз - иначе clear() его не найдёт
+            blob_id, file_name = blob_rows[number] if number < len(blob_rows) else rng.choice(blob_rows)
+            attachments.append(Attachment(task_id=task_id, author_id=rng.choice((author_id, assignee_id)),
+                                          blob_id=blob_id, file=file_name, name=f'скан-{number + 1}.png'))
+        _bulk(Attachment, attachments, batch_size)
+        report('attachments', len(attachments))
+
+    # Заявки подают руководители в чужие отделы; исполнитель - руководитель отдела
+    if sizes.requests:
+        leader_ids = list(leaders.values())
+        request_statuses, request_weights = zip(*REQUEST_STATUS_WEIGHTS.items())
+        batch = []
+        for _ in range(sizes.requests):
+            department_id = rng.choice(department_ids)
+            batch.append(Request(
+                title=_text(rng, rng.randint(2, 4)),
+                justification=_text(rng, rng.randint(5, 20)),
+                request_type=rng.choice(Request.RequestType.values),
+                status=rng.choices(request_statuses, request_weights)[0],
+                requester_id=rng.choice(leader_ids),
+                department_id=department_id,
+                assignee_id=leaders[department_id],
+            ))
+        _bulk(Request, batch, batch_size)
+        report('requests', len(batch))
+
+
+def dataset_summary():
+    # Размер данных - чтобы замеры с разными базами не сравнивались незаметно
+    return {
+        'departments': Department.objects.count(),
+        'users': User.objects.count(),
+        'tasks': Task.objects.count(),
+        'comments': Comment.objects.count(),
+        'attachments': Attachment.objects.count(),
+        'requests': Request.objects.count(),
+    }
+
+
+def bench_fixtures():
+    """Сотрудники и объекты, от имени которых и с которыми открываются страницы.
+
+    Выбирается самый загруженный исполнитель, руководитель его отдела, самая
+    обсуждаемая задача этого руководителя и т.д. - то есть худший случай.
+    Создаёт незавершённую загрузку и записи для поиска, поэтому вызывать её
+    нужно в транзакции, которая потом откатывается.
+    """
+    employee = (User.objects
+                .filter(is_staff=False, department__leader__isnull=False)
+                .annotate(task_count=Count('assigned_tasks'))
+                .order_by('-task_count', 'pk')
+                .select_related('department__leader')
+                .first())
+    if employee is None:
+        return None
+    leader = employee.department.leader
+    admin = User.objects.filter(is_superuser=True).order_by('pk').first() or leader
+    leader_tasks = Task.objects.filter(author=leader)
+    task = (leader_tasks
+            .filter(pk__in=Comment.objects
+                    .filter(task__author=leader)
+                    .values('task')
+                    .annotate(count=Count('pk'))
+                    .order_by('-count')
+                    .values('task')[:1])
+            .first()) or leader_tasks.order_by('pk').first()
+    if task is None:
+        task = Task.objects.create(title='Замер', author=leader, assignee=employee)
+    assigned_task = (Task.objects.filter(assignee=employee).order_by('-pk').first()
+                     or Task.objects.create(title='Замер', author=leader, assignee=employee))
+    req = (Request.objects.filter(department__leader=leader).order_by('pk').first()
+           or Request.objects.create(title='Замер', request_type=Request.RequestType.SOFTWARE,
+                                     requester=leader, department=employee.department, assignee=leader))
+    attachment = (Attachment.objects
+                  .filter(task__assignee=employee, blob__preview_status=Blob.PreviewStatus.READY)
+                  .order_by('pk')
+                  .first())
+    # Поиск находит записи всех видов при любых данных: иначе число запросов
+    # поиска зависело бы от того, что нашлось среди случайных текстов
+    search_task = Task.objects.create(title=SEARCH_TEXT, author=leader, assignee=employee)
+    Comment.objects.create(task=search_task, author=employee, text=SEARCH_TEXT)
+    Request.objects.create(title=SEARCH_TEXT, request_type=Request.RequestType.SOFTWARE,
+                           requester=leader, department=employee.department, assignee=leader)
+    upload = UploadSession.objects.create(task=task, author=leader, filename='замер.bin', size=1024)
+    return {
+        'leader': leader,
+        'employee': employee,
+        'admin': admin,
+        'anonymous': None,
+        'task': task,
+        'assigned_task': assigned_task,
+        'request': req,
+        'attachment': attachment,
+        'upload': upload,
+    }
+
+
+@dataclass
+class RouteCase:
+    # Один запрос к странице: маршрут, аргументы, от чьего имени и чем
+    name: str
+    user: str
+    kwargs: dict = field(default_factory=dict)
+    method: str = 'get'
+    query: dict = field(default_factory=dict)
+    body: object = None
+    # Запрос меняет данные - его изменения откатываются
+    writes: bool = False
+    # Запрос завершает сессию - перед каждым повтором нужен новый вход
+    relogin: bool = False
+    label: str = ''
+
+    def __post_init__(self):
+        self.label = self.label or f'{self.name} ({self.user})'
+
+
+def route_cases(fixtures):
+    """Запросы ко всем маршрутам ``main/urls.py`` с данными из ``bench_fixtures()``."""
+    task, req, upload = fixtures['task'], fixtures['request'], fixtures['upload']
+    # Менять статус и получать карточку для доски может только исполнитель
+    assigned_task, attachment = fixtures['assigned_task'], fixtures['attachment']
+    # Перемещение в ту же колонку пачка пропускает, не записывая
+    moved_status = Task.Status.COMPLETED if assigned_task.status != Task.Status.COMPLETED else Task.Status.NEW
+    cases = [
+        RouteCase('register', 'anonymous'),
+        RouteCase('login', 'anonymous'),
+        RouteCase('logout', 'leader', method='post', writes=True, relogin=True),
+        RouteCase('home', 'employee'),
+        RouteCase('home', 'leader'),
+        RouteCase('board_column', 'employee', {'status': Task.Status.COMPLETED}, query={'offset': 20}),
+        RouteCase('create_task', 'leader'),
+        RouteCase('task_detail', 'leader', {'pk': task.pk}),
+        RouteCase('task_comments', 'leader', {'pk': task.pk}),
+        RouteCase('start_upload', 'leader', {'pk': task.pk}, method='post',
+                  body={'filename': 'замер.txt', 'size': 10}, writes=True),
+        RouteCase('upload_chunk', 'leader', {'upload_id': upload.pk}),
+        RouteCase('edit_task', 'leader', {'pk': task.pk}),
+        RouteCase('delete_task', 'leader', {'pk': task.pk}),
+        RouteCase('search', 'employee', query={'q': SEARCH_TEXT}),
+        RouteCase('search', 'leader', query={'q': SEARCH_TEXT}),
+        RouteCase('request_list', 'leader'),
+        RouteCase('create_request', 'leader'),
+        RouteCase('delete_request', 'leader', {'pk': req.pk}),
+        RouteCase('manager_dashboard', 'leader'),
+        RouteCase('department_tasks', 'leader'),
+        RouteCase('department_tasks_feed', 'leader'),
+        RouteCase('department_tasks_export', 'leader', query={'format': 'csv', 'status': Task.Status.NEW}),
+        RouteCase('update_task_status', 'employee', method='post',
+                  body={'task_id': assigned_task.pk, 'status': Task.Status.IN_PROGRESS}, writes=True),
+        RouteCase('update_task_status_batch', 'employee', method='post', writes=True,
+                  body={'changes': [{'task_id': assigned_task.pk, 'status': moved_status}]}),
+        RouteCase('task_fragment', 'employee', {'pk': assigned_task.pk}, query={'kind': 'board'}),
+        RouteCase('task_fragment', 'leader', {'pk': task.pk}, query={'kind': 'department'},
+                  label='task_fragment (leader, department)'),
+        RouteCase('live_events', 'employee'),
+        RouteCase('live_poll', 'employee'),
+        RouteCase('dashboard_cache_stats', 'admin'),
+        RouteCase('job_stats', 'admin'),
+        RouteCase('metrics', 'admin'),
+    ]
+    if attachment is not None:
+        cases += [
+            RouteCase('attachment_download', 'employee', {'pk': attachment.pk}),
+            RouteCase('attachment_preview', 'employee', {'pk': attachment.pk, 'kind': 'thumb'}),
+        ]
+    return cases
+
+
+def request_kwargs(case):
+    # Аргументы для django.test.Client: JSON-тело для POST и GET-параметры
+    if case.body is not None:
+        return {'data': json.dumps(case.body), 'content_type': 'application/json'}
+    return {'data': case.query}
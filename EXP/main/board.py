@@ -0,0 +1,137 @@
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .dashboard_cache import invalidate_for_tasks
+from .live import record_task_events
+from .models import Task
+
+# Колонки канбан-доски на главной странице (в порядке отображения)
+BOARD_STATUSES = (Task.Status.NEW, Task.Status.IN_PROGRESS, Task.Status.COMPLETED)
+
+# Заголовки колонок
+BOARD_COLUMN_TITLES = {
+    Task.Status.NEW: 'Новые',
+    Task.Status.IN_PROGRESS: 'В работе',
+    Task.Status.COMPLETED: 'Выполнены',
+}
+
+# Поля, которые нужны карточке задачи на доске
+BOARD_CARD_FIELDS = ('id', 'title', 'status', 'priority', 'deadline', 'created_at', 'assignee_id')
+
+
+def get_column_limit():
+    return getattr(settings, 'BOARD_COLUMN_LIMIT', 50)
+
+
+@dataclass
+class BoardColumn:
+    status: str
+    label: str
+    tasks: list = field(default_factory=list)
+    total: int = 0
+
+    @property
+    def has_more(self):
+        return self.total > len(self.tasks)
+
+
+def board_tasks(user, status=None):
+    # Задачи пользователя для доски; внутри колонки сортировка совпадает с порядком карточек
+    tasks = Task.objects.filter(assignee=user).only(*BOARD_CARD_FIELDS)
+    if status is None:
+        # Сортировка сначала по статусу позволяет читать индекс
+        # (assignee, status, created_at, id) без временной сортировки
+        return tasks.filter(status__in=BOARD_STATUSES).order_by('status', '-created_at', '-id')
+    return tasks.filter(status=status).order_by('-created_at', '-id')
+
+
+def build_board(user, limit=None):
+    """Собирает канбан-доску пользователя одним запросом к БД.
+
+    Задачи раскладываются по колонкам в Python; в каждой колонке остаётся
+    не больше ``limit`` карточек, а ``total`` хранит полное количество.
+    """
+    if limit is None:
+        limit = get_column_limit()
+
+    columns = {status: BoardColumn(status=status, label=BOARD_COLUMN_TITLES[status]) for status in BOARD_STATUSES}
+
+    for task in board_tasks(user).iterator():
+        column = columns[task.status]
+        column.total += 1
+        if len(column.tasks) < limit:
+            # Исполнитель известен заранее - не подгружаем его отдельным запросом
+            task.assignee = user
+            column.tasks.append(task)
+
+    return [columns[status] for status in BOARD_STATUSES]
+
+
+def board_column_page(user, status, offset, limit=None):
+    # Следующая порция карточек для кнопки «Показать ещё»
+    if limit is None:
+        limit = get_column_limit()
+    tasks = list(board_tasks(user, status)[offset:offset + limit + 1])
+    has_more = len(tasks) > limit
+    tasks = tasks[:limit]
+    for task in tasks:
+        task.assignee = user
+    return tasks, has_more
+
+
+def apply_status_changes(user, changes):
+    """Применяет пачку перемещений карточек ``[{task_id, status}, ...]``.
+
+    Права проверяются одним запросом, изменения записываются одним
+    ``bulk_update`` в общей транзакции. Для каждой задачи возвращается
+    отдельный результат; если задача встречается несколько раз,
+    действует последнее перемещение.
+    """
+    results = {}
+    wanted = {}
+    for item in changes:
+        raw_id = item.get('task_id') if isinstance(item, dict) else None
+        try:
+            task_id = int(raw_id)
+        except (TypeError, ValueError):
+            results[str(raw_id)] = {'task_id': raw_id, 'success': False, 'error': 'Invalid task id'}
+            continue
+        status = item.get('status')
+        if status not in Task.Status.values:
+            wanted.pop(task_id, None)
+            results[task_id] = {'task_id': task_id, 'success': False, 'error': 'Invalid status'}
+            continue
+        wanted[task_id] = status
+        results[task_id] = None
+
+    now = timezone.now()
+    with transaction.atomic():
+        tasks = (Task.objects
+                 .filter(pk__in=wanted)
+                 .only('id', 'assignee_id', 'author_id', 'department_id', 'status')
+                 .order_by())
+        tasks = {task.pk: task for task in tasks}
+        to_update = []
+        for task_id, status in wanted.items():
+            task = tasks.get(task_id)
+            if task is None:
+                results[task_id] = {'task_id': task_id, 'success': False, 'error': 'Task not found'}
+            elif task.assignee_id != user.pk:
+                # Менять статус может только исполнитель
+                results[task_id] = {'task_id': task_id, 'success': False, 'error': 'Permission denied'}
+            else:
+                if task.status != status:
+                    task.status = status
+                    task.updated_at = now
+                    to_update.append(task)
+                results[task_id] = {'task_id': task_id, 'success': True, 'status': status}
+        if to_update:
+            Task.objects.bulk_update(to_update, ['status', 'updated_at'])
+            # bulk_update не отправляет post_save, поэтому кэш и события - сами
+            invalidate_for_tasks(to_update)
+            record_task_events(to_update)
+
+    return list(results.values())
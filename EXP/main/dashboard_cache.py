@@ -0,0 +1,99 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .models import Department
+from .replicas import primary
+
+# Счётчики попаданий и промахов (в пределах процесса)
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+
+def get_cache():
+    return caches[getattr(settings, 'DASHBOARD_CACHE_ALIAS', 'default')]
+
+
+def _version_key(user_id):
+    return f'dashboard:version:{user_id}'
+
+
+def _new_version():
+    # Версия, которая не совпадёт ни с одной прежней, даже если старый ключ версии
+    # был вытеснен из кэша, а фрагменты под ним ещё остались
+    return time.time_ns()
+
+
+def _count(name, amount=1):
+    with _stats_lock:
+        _stats[name] += amount
+
+
+def get_version(user_id):
+    cache = get_cache()
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _new_version(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_versions(user_ids):
+    """Делает недействительными все закэшированные фрагменты пользователей."""
+    cache = get_cache()
+    user_ids = {user_id for user_id in user_ids if user_id}
+    for user_id in user_ids:
+        try:
+            cache.incr(_version_key(user_id))
+        except ValueError:
+            cache.set(_version_key(user_id), _new_version(), None)
+    _count('invalidations', len(user_ids))
+
+
+def cached_fragment(user_id, name, render, suffix=''):
+    """Возвращает фрагмент ``name`` пользователя из кэша или строит его через ``render()``."""
+    cache = get_cache()
+    key = f'dashboard:{name}:{user_id}:{get_version(user_id)}'
+    if suffix:
+        key = f'{key}:{suffix}'
+    value = cache.get(key)
+    if value is None:
+        _count('misses')
+        # Кэш общий для всех: фрагмент строится по основной базе, а не по отстающей реплике
+        with primary():
+            value = render()
+        cache.set(key, value)
+    else:
+        _count('hits')
+    return value
+
+
+def department_leaders(department_ids):
+    department_ids = {pk for pk in department_ids if pk}
+    if not department_ids:
+        return set()
+    return set(Department.objects
+               .filter(pk__in=department_ids, leader__isnull=False)
+               .values_list('leader_id', flat=True))
+
+
+def invalidate_for_tasks(tasks):
+    # Затронуты исполнитель (текущий и прежний), автор и руководитель отдела задачи
+    user_ids = set()
+    department_ids = set()
+    for task in tasks:
+        loaded = getattr(task, '_loaded_values', {})
+        user_ids.update((task.assignee_id, task.author_id, loaded.get('assignee_id')))
+        department_ids.add(task.department_id)
+    bump_versions(user_ids | department_leaders(department_ids))
+
+
+def dashboard_cache_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_ratio'] = round(stats['hits'] / lookups, 4) if lookups else None
+    return stats
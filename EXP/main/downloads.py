@@ -0,0 +1,135 @@
+import mimetypes
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified
+
+# Размер блока, которым FileResponse отдаёт файл, если веб-сервер не забирает передачу на себя
+BLOCK_SIZE = 64 * 1024
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+# Управляющие символы в имени файла: CR/LF в заголовке позволили бы дописать свои заголовки
+CONTROL_CHARS_RE = re.compile(r'[\x00-\x1f\x7f]')
+
+
+def get_sendfile_backend():
+    # None, 'x-sendfile' (Apache, lighttpd) или 'x-accel-redirect' (nginx)
+    return getattr(settings, 'ATTACHMENT_SENDFILE_BACKEND', None)
+
+
+def content_disposition(filename, as_attachment=True):
+    disposition = 'attachment' if as_attachment else 'inline'
+    filename = CONTROL_CHARS_RE.sub('', filename)
+    try:
+        filename.encode('ascii')
+        return '{}; filename="{}"'.format(disposition, filename.replace('\\', '\\\\').replace('"', r'\"'))
+    except UnicodeEncodeError:
+        return "{}; filename*=utf-8''{}".format(disposition, quote(filename))
+
+
+def parse_range(header, size):
+    """Разбирает заголовок Range для одного диапазона байт.
+
+    Возвращает ``(start, end)`` включительно, ``None`` если заголовка нет или
+    диапазонов несколько (тогда отдаётся весь файл), и ``False`` если диапазон
+    не пересекается с файлом.
+    """
+    match = RANGE_RE.match((header or '').replace(' ', ''))
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # bytes=-500 - последние 500 байт
+        length = int(last)
+        if not length:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size or end < start:
+        return False
+    return start, min(end, size - 1)
+
+
+def etag_matches(header, etag):
+    if not header or not etag:
+        return False
+    if header.strip() == '*':
+        return True
+    # Слабые и сильные теги сравниваем по значению
+    tags = (tag.strip() for tag in header.split(','))
+    return etag in (tag[2:] if tag.startswith('W/') else tag for tag in tags)
+
+
+class RangeFile:
+    # Читает из файла только байты start..end, не загружая их в память целиком
+    def __init__(self, file, start, end):
+        self.file = file
+        self.file.seek(start)
+        self.remaining = end - start + 1
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def serve_file(request, fieldfile, filename, size, etag=None, as_attachment=True):
+    """Отдаёт файл из хранилища с поддержкой Range и If-None-Match.
+
+    Если настроен ``ATTACHMENT_SENDFILE_BACKEND``, сами байты (и диапазоны)
+    отдаёт веб-сервер; иначе - ``FileResponse`` блоками по ``BLOCK_SIZE``.
+    """
+    if etag and etag_matches(request.headers.get('If-None-Match'), etag):
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+
+    backend = get_sendfile_backend()
+    if backend:
+        content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        response = HttpResponse(content_type=content_type)
+        if backend == 'x-accel-redirect':
+            prefix = getattr(settings, 'ATTACHMENT_ACCEL_REDIRECT_PREFIX', '/protected-media/')
+            response['X-Accel-Redirect'] = prefix + quote(fieldfile.name)
+        else:
+            response['X-Sendfile'] = fieldfile.path
+    else:
+        byte_range = None
+        if_range = request.headers.get('If-Range')
+        if size and (not if_range or etag_matches(if_range, etag)):
+            byte_range = parse_range(request.headers.get('Range'), size)
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+        file = fieldfile.storage.open(fieldfile.name, 'rb')
+        if byte_range:
+            start, end = byte_range
+            response = FileResponse(RangeFile(file, start, end), status=206, filename=filename)
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            response['Content-Length'] = end - start + 1
+        else:
+            response = FileResponse(file, filename=filename)
+            response['Content-Length'] = size
+        response.block_size = BLOCK_SIZE
+        response['Accept-Ranges'] = 'bytes'
+
+    response['Content-Disposition'] = content_disposition(filename, as_attachment)
+    # Файлы доступны не всем, поэтому кэшировать их можно только в браузере
+    response['Cache-Control'] = 'private, max-age=0, must-revalidate'
+    if etag:
+        response['ETag'] = etag
+    return response
@@ -0,0 +1,255 @@
+import csv
+import re
+import zipfile
+from datetime import date, datetime
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Task
+
+# Колонки выгрузки: заголовок и поля values_list, из которых собирается значение
+EXPORT_COLUMNS = [
+    ('№', ('id',)),
+    ('Заголовок', ('title',)),
+    ('Статус', ('status',)),
+    ('Приоритет', ('priority',)),
+    ('Автор', ('author__first_name', 'author__last_name', 'author__username')),
+    ('Исполнитель', ('assignee__first_name', 'assignee__last_name', 'assignee__username')),
+    ('Срок', ('deadline',)),
+    ('Создана', ('created_at',)),
+    ('Обновлена', ('updated_at',)),
+    ('Описание', ('description',)),
+]
+
+STATUS_LABELS = dict(Task.Status.choices)
+PRIORITY_LABELS = dict(Task.Priority.choices)
+
+# Символы, недопустимые в XML (и в XLSX)
+XML_ILLEGAL_RE = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def get_chunk_size():
+    # Сколько строк читать из БД за раз
+    return getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+
+
+def export_rows(tasks):
+    """Строки выгрузки по одной: кортежи значений в порядке ``EXPORT_COLUMNS``.
+
+    Строки читаются курсором по ``get_chunk_size()`` штук и не накапливаются,
+    поэтому память не зависит от числа задач.
+    """
+    fields = [field for _, column_fields in EXPORT_COLUMNS for field in column_fields]
+    rows = (tasks
+            .order_by('-created_at', '-id')
+            .values_list(*fields)
+            .iterator(chunk_size=get_chunk_size()))
+    for (pk, title, status, priority, author_first, author_last, author_username,
+         assignee_first, assignee_last, assignee_username,
+         deadline, created_at, updated_at, description) in rows:
+        yield (
+            pk,
+            title,
+            STATUS_LABELS.get(status, status),
+            PRIORITY_LABELS.get(priority, priority),
+            f'{author_first} {author_last}'.strip() or author_username,
+            f'{assignee_first} {assignee_last}'.strip() or assignee_username,
+            deadline,
+            timezone.localtime(created_at).replace(tzinfo=None),
+            timezone.localtime(updated_at).replace(tzinfo=None),
+            description,
+        )
+
+
+class _Pipe:
+    # Поток только для записи: всё записанное забирается порциями через take()
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+class _TextPipe:
+    # csv.writer пишет строки - кодируем их в UTF-8 по ходу
+    def __init__(self, pipe):
+        self.pipe = pipe
+
+    def write(self, text):
+        return self.pipe.write(text.encode())
+
+
+# С этих символов Excel начинает формулу: текст «=HYPERLINK(...)» из названия
+# задачи выполнился бы при открытии файла
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _csv_value(value):
+    if isinstance(value, datetime):
+        return value.strftime('%d.%m.%Y %H:%M')
+    if isinstance(value, date):
+        return value.strftime('%d.%m.%Y')
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return '' if value is None else value
+
+
+def stream_csv(rows):
+    # BOM и разделитель «;» - чтобы Excel с русской локалью сразу разбил файл на колонки
+    yield '\ufeff'.encode()
+    pipe = _Pipe()
+    writer = csv.writer(_TextPipe(pipe), delimiter=';')
+    writer.writerow([title for title, _ in EXPORT_COLUMNS])
+    for count, row in enumerate(rows, 1):
+        writer.writerow([_csv_value(value) for value in row])
+        if count % 500 == 0:
+            yield pipe.take()
+    yield pipe.take()
+
+
+# --- XLSX ---
+# Книга из одного листа собирается вручную: ячейки пишутся как встроенные строки
+# (без таблицы sharedStrings, которую пришлось бы держать в памяти), а ZIP
+# пишется в поток без перемотки - с дескрипторами данных после каждого файла
+
+XLSX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '<Override PartName="/xl/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '</Types>'
+)
+
+XLSX_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+
+XLSX_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="Задачи" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+
+XLSX_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '<Relationship Id="rId2" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+    'Target="styles.xml"/>'
+    '</Relationships>'
+)
+
+# Стили ячеек: 0 - обычная, 1 - дата, 2 - дата и время, 3 - заголовок (жирный)
+XLSX_STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<numFmts count="2">'
+    '<numFmt numFmtId="164" formatCode="dd.mm.yyyy"/>'
+    '<numFmt numFmtId="165" formatCode="dd.mm.yyyy hh:mm"/>'
+    '</numFmts>'
+    '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+    '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="4">'
+    '<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="164" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="165" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/>'
+    '</cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+
+XLSX_SHEET_START = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<sheetViews><sheetView workbookViewId="0">'
+    '<pane ySplit="1" topLeftCell="A2" activePane="bottomLeft" state="frozen"/>'
+    '</sheetView></sheetViews>'
+    '<sheetData>'
+)
+
+XLSX_SHEET_END = '</sheetData></worksheet>'
+
+# День 0 в датах Excel
+EXCEL_EPOCH = datetime(1899, 12, 30)
+
+
+def _xlsx_cell(value, style=0):
+    if value is None or value == '':
+        return '<c/>'
+    if isinstance(value, datetime):
+        serial = (value - EXCEL_EPOCH).total_seconds() / 86400
+        return f'<c s="2"><v>{serial:.6f}</v></c>'
+    if isinstance(value, date):
+        return f'<c s="1"><v>{(value - EXCEL_EPOCH.date()).days}</v></c>'
+    if isinstance(value, (int, float)):
+        return f'<c><v>{value}</v></c>'
+    text = escape(XML_ILLEGAL_RE.sub('', str(value)))
+    style_attr = f' s="{style}"' if style else ''
+    return f'<c t="inlineStr"{style_attr}><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _xlsx_row(values, style=0):
+    return '<row>' + ''.join(_xlsx_cell(value, style) for value in values) + '</row>'
+
+
+def stream_xlsx(rows):
+    pipe = _Pipe()
+    with zipfile.ZipFile(pipe, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=1) as archive:
+        for name, content in (
+            ('[Content_Types].xml', XLSX_CONTENT_TYPES),
+            ('_rels/.rels', XLSX_ROOT_RELS),
+            ('xl/workbook.xml', XLSX_WORKBOOK),
+            ('xl/_rels/workbook.xml.rels', XLSX_WORKBOOK_RELS),
+            ('xl/styles.xml', XLSX_STYLES),
+        ):
+            archive.writestr(name, content)
+        yield pipe.take()
+
+        # Размер листа заранее неизвестен, поэтому сразу включаем ZIP64
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write(XLSX_SHEET_START.encode())
+            sheet.write(_xlsx_row([title for title, _ in EXPORT_COLUMNS], style=3).encode())
+            for count, row in enumerate(rows, 1):
+                sheet.write(_xlsx_row(row).encode())
+                if count % 500 == 0:
+                    yield pipe.take()
+            sheet.write(XLSX_SHEET_END.encode())
+    yield pipe.take()
+
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv; charset=utf-8', stream_csv),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', stream_xlsx),
+}
@@ -1,6 +1,10 @@
+from datetime import datetime, time, timedelta
+
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
 from django import forms
+from django.utils import timezone
 from .models import User, Department, Request, Task, Comment, Attachment
+from .roster import limit_assignee_choices
 
 class CustomUserCreationForm(UserCreationForm):
     class Meta:
@@ -36,7 +40,7 @@ class TaskCreationForm(forms.ModelForm):
         super().__init__(*args, **kwargs)
         if user:
             # Показываем только сотрудников из отдела текущего пользователя (включая руководителя)
-            self.fields['assignee'].queryset = User.objects.filter(department=user.department)
+            limit_assignee_choices(self.fields['assignee'], user)
         
         # Добавляем Bootstrap классы ко всем полям
         for field_name, field in self.fields.items():
@@ -65,9 +69,59 @@ class TaskUpdateForm(forms.ModelForm):
         super().__init__(*args, **kwargs)
         if user:
             # Ограничиваем список исполнителей сотрудниками текущего отдела
-            self.fields['assignee'].queryset = User.objects.filter(department=user.department)
+            limit_assignee_choices(self.fields['assignee'], user)
 
 class AttachmentForm(forms.ModelForm):
     class Meta:
         model = Attachment
-        fields = ['file']
\ No newline at end of file
+        fields = ['file']
+
+
+class TaskExportForm(forms.Form):
+    # Фильтры выгрузки задач отдела; все поля необязательные
+    format = forms.ChoiceField(label='Формат', choices=[('csv', 'CSV'), ('xlsx', 'Excel (XLSX)')],
+                               initial='csv', widget=forms.Select(attrs={'class': 'form-select'}))
+    status = forms.ChoiceField(label='Статус', choices=[('', 'Все статусы')] + Task.Status.choices,
+                               required=False, widget=forms.Select(attrs={'class': 'form-select'}))
+    priority = forms.ChoiceField(label='Приоритет', choices=[('', 'Любой приоритет')] + Task.Priority.choices,
+                                 required=False, widget=forms.Select(attrs={'class': 'form-select'}))
+    assignee = forms.ModelChoiceField(label='Исполнитель', queryset=User.objects.none(), required=False,
+                                      empty_label='Все исполнители',
+                                      widget=forms.Select(attrs={'class': 'form-select'}))
+    created_from = forms.DateField(label='Созданы с', required=False,
+                                   widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}))
+    created_to = forms.DateField(label='по', required=False,
+                                 widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}))
+
+    def __init__(self, *args, **kwargs):
+        user = kwargs.pop('user', None)
+        super().__init__(*args, **kwargs)
+        if user:
+            limit_assignee_choices(self.fields['assignee'], user)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        created_from, created_to = cleaned_data.get('created_from'), cleaned_data.get('created_to')
+        if created_from and created_to and created_from > created_to:
+            raise forms.ValidationError('Начало периода позже его конца.')
+        return cleaned_data
+
+    def filter(self, tasks):
+        data = self.cleaned_data
+        if data.get('status'):
+            tasks = tasks.filter(status=data['status'])
+        if data.get('priority'):
+            tasks = tasks.filter(priority=data['priority'])
+        if data.get('assignee'):
+            tasks = tasks.filter(assignee=data['assignee'])
+        # Границы периода - начало суток в текущем часовом поясе: сравнение с самим
+        # created_at, а не с его датой, позволяет использовать индекс
+        if data.get('created_from'):
+            tasks = tasks.filter(created_at__gte=_day_start(data['created_from']))
+        if data.get('created_to'):
+            tasks = tasks.filter(created_at__lt=_day_start(data['created_to'] + timedelta(days=1)))
+        return tasks
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
@@ -0,0 +1,301 @@
+import csv
+import json
+import multiprocessing
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+
+from .dashboard_cache import invalidate_for_tasks
+from .models import Department, Task, User
+from .roster import invalidate_rosters
+
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 'да', '+'}
+DATE_FORMATS = ('%Y-%m-%d', '%d.%m.%Y')
+
+
+class RowError(ValueError):
+    pass
+
+
+def read_rows(path):
+    """Строки файла по одной: ``(номер строки, словарь)`` или ``(номер, RowError)``.
+
+    CSV (разделитель «,» или «;», первая строка - заголовки) или JSON Lines -
+    по расширению файла. Файл читается построчно и целиком в память не попадает.
+    """
+    if path.lower().endswith('.csv'):
+        with open(path, newline='', encoding='utf-8-sig') as file:
+            header = file.readline()
+            file.seek(0)
+            delimiter = ';' if header.count(';') > header.count(',') else ','
+            reader = csv.DictReader(file, delimiter=delimiter)
+            for row in reader:
+                yield reader.line_num, {key.strip(): (value or '').strip()
+                                        for key, value in row.items() if key}
+        return
+
+    with open(path, encoding='utf-8-sig') as file:
+        for line_number, line in enumerate(file, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as exc:
+                yield line_number, RowError(f'Некорректный JSON: {exc}')
+                continue
+            if not isinstance(row, dict):
+                yield line_number, RowError('Ожидается JSON-объект')
+                continue
+            yield line_number, {key: value.strip() if isinstance(value, str) else value
+                                for key, value in row.items()}
+
+
+def _text(row, key):
+    value = row.get(key)
+    return '' if value is None else str(value).strip()
+
+
+def _bool(row, key):
+    value = row.get(key)
+    if isinstance(value, bool):
+        return value
+    return _text(row, key).lower() in TRUE_VALUES
+
+
+def _date(row, key):
+    value = _text(row, key)
+    if not value:
+        return None
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format).date()
+        except ValueError:
+            pass
+    raise RowError(f'{key}: дата должна быть в формате ГГГГ-ММ-ДД или ДД.ММ.ГГГГ')
+
+
+def _message(exc):
+    if isinstance(exc, ValidationError):
+        if hasattr(exc, 'error_dict'):
+            return '; '.join(f'{field}: {" ".join(messages)}' for field, messages in exc.message_dict.items())
+        return ' '.join(exc.messages)
+    return str(exc)
+
+
+def hash_password(raw):
+    # Пустой пароль - вход по паролю невозможен, пока его не зададут
+    return make_password(raw or None)
+
+
+class Importer:
+    """Загрузка отделов, сотрудников и задач пачками через bulk_create.
+
+    Ссылки на отделы и сотрудников разрешаются по словарям в памяти (имя отдела
+    -> id, логин -> id и отдел), которые пополняются после каждой пачки.
+    Ошибочная строка пропускается и передаётся в ``report``, загрузка продолжается.
+    """
+
+    def __init__(self, batch_size=500, workers=1, report=None):
+        self.batch_size = batch_size
+        self.workers = workers
+        self.report = report or (lambda where, message: None)
+        self.stats = Counter()
+        # При одинаковых названиях ссылка ведёт на отдел, созданный раньше
+        self.departments = dict(Department.objects.order_by('-id').values_list('name', 'id'))
+        self.users = {username: (pk, department_id) for username, pk, department_id
+                      in User.objects.values_list('username', 'id', 'department_id')}
+        # Руководители назначаются после загрузки сотрудников: (файл, строка, отдел, логин)
+        self.pending_leaders = []
+        self.pool = None
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def error(self, source, line, message):
+        self.stats['errors'] += 1
+        self.report(f'{source}:{line}', message)
+
+    def batches(self, path, kind, build):
+        # Проверенные объекты пачками по batch_size вместе с номерами строк
+        batch = []
+        for line, row in read_rows(path):
+            if isinstance(row, RowError):
+                self.error(path, line, str(row))
+                continue
+            try:
+                obj = build(path, line, row)
+            except (RowError, ValidationError) as exc:
+                self.error(path, line, _message(exc))
+                continue
+            if obj is None:
+                self.stats[kind, 'skipped'] += 1
+                continue
+            batch.append((line, obj))
+            if len(batch) == self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def save(self, path, kind, model, batch):
+        # Пачка пишется одной транзакцией; если она не прошла, строки пишутся
+        # по одной, чтобы ошибку получила только виноватая строка
+        try:
+            with transaction.atomic():
+                model.objects.bulk_create([obj for _, obj in batch])
+            saved = [obj for _, obj in batch]
+        except IntegrityError:
+            saved = []
+            for line, obj in batch:
+                try:
+                    with transaction.atomic():
+                        model.objects.bulk_create([obj])
+                    saved.append(obj)
+                except IntegrityError as exc:
+                    self.error(path, line, str(exc))
+        self.stats[kind, 'created'] += len(saved)
+        return saved
+
+    # --- Отделы ---
+
+    def build_department(self, path, line, row):
+        name = _text(row, 'name')
+        if not name:
+            raise RowError('name: не указано название отдела')
+        leader = _text(row, 'leader')
+        if leader:
+            self.pending_leaders.append((path, line, name, leader))
+        if name in self.departments:
+            return None
+        department = Department(name=name)
+        department.clean_fields(exclude=['leader'])
+        # Название занято уже с этой строки, чтобы повтор в файле не создал второй отдел
+        self.departments[name] = None
+        return department
+
+    def import_departments(self, path):
+        for batch in self.batches(path, 'departments', self.build_department):
+            saved = self.save(path, 'departments', Department, batch)
+            names = [department.name for department in saved]
+            self.departments.update(Department.objects
+                                    .filter(name__in=names)
+                                    .order_by('-id')
+                                    .values_list('name', 'id'))
+
+    def assign_leaders(self):
+        for path, line, name, username in self.pending_leaders:
+            department_id = self.departments.get(name)
+            if username not in self.users:
+                self.error(path, line, f'leader: неизвестный сотрудник {username}')
+                continue
+            if department_id:
+                Department.objects.filter(pk=department_id).update(leader_id=self.users[username][0])
+        self.pending_leaders = []
+
+    # --- Сотрудники ---
+
+    def build_user(self, path, line, row):
+        username = _text(row, 'username')
+        if not username:
+            raise RowError('username: не указан логин')
+        if username in self.users:
+            return None
+        department_name = _text(row, 'department')
+        department_id = None
+        if department_name:
+            department_id = self.departments.get(department_name)
+            if not department_id:
+                raise RowError(f'department: неизвестный отдел {department_name}')
+        user = User(
+            username=username,
+            first_name=_text(row, 'first_name'),
+            last_name=_text(row, 'last_name'),
+            patronymic=_text(row, 'patronymic'),
+            email=_text(row, 'email'),
+            is_staff=_bool(row, 'is_staff'),
+            department_id=department_id,
+        )
+        user.clean_fields(exclude=['password', 'department', 'last_login'])
+        # Пока пароль не захеширован, он лежит в поле password
+        user.password = _text(row, 'password')
+        self.users[username] = (None, department_id)
+        return user
+
+    def hash_passwords(self, passwords):
+        # PBKDF2 занимает процессор на десятки миллисекунд на пароль - считаем в пуле процессов
+        if self.workers <= 1 or len(passwords) < 2:
+            return [hash_password(raw) for raw in passwords]
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=django.setup,
+            )
+        chunksize = max(1, len(passwords) // (self.workers * 4))
+        return list(self.pool.map(hash_password, passwords, chunksize=chunksize))
+
+    def import_users(self, path):
+        department_ids = set()
+        for batch in self.batches(path, 'users', self.build_user):
+            hashed = self.hash_passwords([user.password for _, user in batch])
+            for (_, user), password in zip(batch, hashed):
+                user.password = password
+            saved = self.save(path, 'users', User, batch)
+            usernames = [user.username for user in saved]
+            for username, pk, department_id in (User.objects
+                                                .filter(username__in=usernames)
+                                                .values_list('username', 'id', 'department_id')):
+                self.users[username] = (pk, department_id)
+                department_ids.add(department_id)
+            # Логины из строк, которые не записались, снова свободны
+            for _, user in batch:
+                if self.users.get(user.username, (None,))[0] is None:
+                    del self.users[user.username]
+        # bulk_create не отправляет сигналов - списки сотрудников сбрасываем сами
+        invalidate_rosters(department_ids)
+
+    # --- Задачи ---
+
+    def resolve_user(self, row, key):
+        username = _text(row, key)
+        if not username:
+            raise RowError(f'{key}: не указан сотрудник')
+        pk, department_id = self.users.get(username, (None, None))
+        if pk is None:
+            raise RowError(f'{key}: неизвестный сотрудник {username}')
+        return pk, department_id
+
+    def build_task(self, path, line, row):
+        title = _text(row, 'title')
+        if not title:
+            raise RowError('title: не указан заголовок')
+        author_id, author_department_id = self.resolve_user(row, 'author')
+        assignee_id, _ = self.resolve_user(row, 'assignee')
+        task = Task(
+            title=title,
+            description=_text(row, 'description'),
+            status=_text(row, 'status') or Task.Status.NEW,
+            priority=_text(row, 'priority') or Task.Priority.MEDIUM,
+            deadline=_date(row, 'deadline'),
+            author_id=author_id,
+            assignee_id=assignee_id,
+            # Как и Task.save(): задача относится к отделу автора
+            department_id=author_department_id,
+        )
+        task.clean_fields(exclude=['author', 'assignee', 'department'])
+        return task
+
+    def import_tasks(self, path):
+        for batch in self.batches(path, 'tasks', self.build_task):
+            saved = self.save(path, 'tasks', Task, batch)
+            # Сигналы post_save при bulk_create не срабатывают, поэтому кэш дашбордов
+            # сбрасываем здесь. События живого обновления не пишем: открытые страницы
+            # не должны догружать тысячи карточек, новые задачи появятся при обновлении
+            invalidate_for_tasks(saved)
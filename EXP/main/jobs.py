@@ -0,0 +1,251 @@
+import logging
+import random
+import time
+import traceback
+from contextlib import nullcontext
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Avg, Count, F, Max, Min, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+
+def is_eager():
+    # В режиме eager задания выполняются сразу после коммита, без очереди и runworker
+    return getattr(settings, 'JOB_QUEUE_EAGER', False)
+
+
+def get_backoff():
+    # Базовая и максимальная пауза перед повтором, в секундах
+    return getattr(settings, 'JOB_RETRY_BACKOFF', 10), getattr(settings, 'JOB_RETRY_BACKOFF_MAX', 3600)
+
+
+class JobFunction:
+    """Функция, которую можно поставить в очередь: ``func.enqueue(**kwargs)``.
+
+    Аргументы сохраняются в JSON, поэтому передавать нужно id, а не объекты.
+    При ``atomic=True`` задание выполняется в одной транзакции с отметкой о
+    выполнении; долгие задания, которые не должны держать блокировку записи
+    SQLite, объявляются с ``atomic=False``. ``on_failure(**kwargs)`` вызывается,
+    когда задание окончательно не выполнено: попытки исчерпаны, в том числе
+    из-за падения или зависания обработчика.
+    """
+
+    def __init__(self, func, priority=0, max_attempts=5, atomic=True, on_failure=None):
+        self.func = func
+        self.name = f'{func.__module__}.{func.__qualname__}'
+        self.priority = priority
+        self.max_attempts = max_attempts
+        self.atomic = atomic
+        self.on_failure = on_failure
+        self.__doc__ = func.__doc__
+
+    def __call__(self, **kwargs):
+        return self.func(**kwargs)
+
+    def run_eager(self, kwargs):
+        # Без очереди попытка одна, и её неудача - окончательная
+        try:
+            self.func(**kwargs)
+        except Exception:
+            if self.on_failure is not None:
+                self.on_failure(**kwargs)
+            raise
+
+    def enqueue(self, priority=None, delay=None, **kwargs):
+        # Задание пишется в той же транзакции, что и изменение, которое его породило:
+        # если транзакция откатится, задания тоже не будет
+        if is_eager():
+            transaction.on_commit(lambda: self.run_eager(kwargs))
+            return None
+        return Job.objects.create(
+            name=self.name,
+            kwargs=kwargs,
+            priority=self.priority if priority is None else priority,
+            max_attempts=self.max_attempts,
+            run_at=timezone.now() + (delay or timedelta(0)),
+        )
+
+
+def job(func=None, *, priority=0, max_attempts=5, atomic=True, on_failure=None):
+    """Декоратор фонового задания: ``@job`` или ``@job(priority=10)``."""
+    if func is None:
+        return lambda f: JobFunction(f, priority=priority, max_attempts=max_attempts, atomic=atomic,
+                                     on_failure=on_failure)
+    return JobFunction(func, priority=priority, max_attempts=max_attempts, atomic=atomic, on_failure=on_failure)
+
+
+def run_failure_hook(job_row):
+    # Ошибка обработчика не должна мешать отметить само задание
+    try:
+        func = import_string(job_row.name)
+        if getattr(func, 'on_failure', None) is not None:
+            func.on_failure(**job_row.kwargs)
+    except Exception:
+        logger.exception('Ошибка on_failure задания %s #%s', job_row.name, job_row.pk)
+
+
+def claim_jobs(worker, limit):
+    """Забирает до ``limit`` готовых к запуску заданий и возвращает их id.
+
+    Блокировка строк - условный UPDATE по статусу: если задание уже взял
+    другой обработчик, обновится 0 строк и оно будет пропущено.
+    """
+    now = timezone.now()
+    candidates = (Job.objects
+                  .filter(status=Job.Status.QUEUED, run_at__lte=now)
+                  .order_by('-priority', 'run_at', 'id')
+                  .values_list('id', flat=True)[:limit * 2])
+    claimed = []
+    for job_id in candidates:
+        updated = (Job.objects
+                   .filter(pk=job_id, status=Job.Status.QUEUED)
+                   .update(status=Job.Status.RUNNING, locked_by=worker, locked_at=now,
+                           attempts=F('attempts') + 1))
+        if updated:
+            claimed.append(job_id)
+            if len(claimed) == limit:
+                break
+    return claimed
+
+
+def retry_delay(attempts):
+    # Экспоненциальная пауза со случайным разбросом, чтобы повторы не шли волной
+    base, cap = get_backoff()
+    delay = min(cap, base * 2 ** (attempts - 1))
+    return timedelta(seconds=delay * random.uniform(0.5, 1.0))
+
+
+def record_failure(job_id, error, worker=None):
+    """Отмечает неудачную попытку: задание вернётся в очередь или станет FAILED.
+
+    Отметка ставится, только если задание всё ещё выполняется (и, если указан
+    ``worker``, этим обработчиком): выполненное или перехваченное другим
+    обработчиком задание не трогается. Возвращает, была ли отметка поставлена.
+    """
+    running = Job.objects.filter(pk=job_id, status=Job.Status.RUNNING)
+    if worker is not None:
+        running = running.filter(locked_by=worker)
+    job_row = running.only('id', 'name', 'kwargs', 'attempts', 'max_attempts').first()
+    if job_row is None:
+        return False
+    now = timezone.now()
+    if job_row.attempts < job_row.max_attempts:
+        status, run_at = Job.Status.QUEUED, now + retry_delay(job_row.attempts)
+    else:
+        status, run_at = Job.Status.FAILED, now
+    # Та же попытка: если задание успели вернуть в очередь и взять снова, строка не изменится
+    updated = running.filter(attempts=job_row.attempts).update(
+        status=status, run_at=run_at, last_error=error[-10000:],
+        locked_by='', locked_at=None, finished_at=now if status == Job.Status.FAILED else None,
+    )
+    if updated and status == Job.Status.FAILED:
+        logger.error('Задание %s #%s не выполнено за %s попыток', job_row.name, job_id, job_row.attempts)
+        run_failure_hook(job_row)
+    return bool(updated)
+
+
+def execute_job(job_id):
+    """Выполняет одно взятое в работу задание. Вызывается в процессе пула runworker.
+
+    Для атомарных заданий функция и отметка о выполнении попадают в одну
+    транзакцию, поэтому изменения в БД не повторятся при повторном запуске.
+    """
+    job_row = Job.objects.get(pk=job_id)
+    started = time.monotonic()
+    try:
+        func = import_string(job_row.name)
+        with transaction.atomic() if func.atomic else nullcontext():
+            func(**job_row.kwargs)
+            # Та же проверка, что в record_failure: задание, перехваченное другим
+            # обработчиком после истечения блокировки, этот обработчик уже не отмечает
+            updated = (Job.objects
+                       .filter(pk=job_id, status=Job.Status.RUNNING, locked_by=job_row.locked_by,
+                               attempts=job_row.attempts)
+                       .update(status=Job.Status.DONE, finished_at=timezone.now(), last_error='',
+                               duration_ms=int((time.monotonic() - started) * 1000)))
+            if not updated:
+                logger.warning('Задание %s #%s выполняется другим обработчиком, результат не записан',
+                               job_row.name, job_id)
+                if func.atomic:
+                    # Изменения атомарного задания откатываются: их сделает новый владелец
+                    transaction.set_rollback(True)
+                return False
+    except Exception:
+        record_failure(job_id, traceback.format_exc(), worker=job_row.locked_by)
+        return False
+    return True
+
+
+def requeue_stale_jobs(timeout):
+    """Возвращает в очередь задания, чей обработчик умер, не отметив результат.
+
+    Зависание считается попыткой: задание, исчерпавшее ``max_attempts``, не
+    возвращается, а становится FAILED. Возвращает (возвращено, отмечено FAILED).
+    """
+    now = timezone.now()
+    stale = Job.objects.filter(status=Job.Status.RUNNING, locked_at__lt=now - timeout)
+    # Исчерпавшие попытки отмечаются по одному: on_failure вызывается только для тех,
+    # кого не успел отметить сам обработчик
+    failed = 0
+    for job_row in stale.filter(attempts__gte=F('max_attempts')).only('id', 'name', 'kwargs'):
+        if stale.filter(pk=job_row.pk).update(
+                status=Job.Status.FAILED, locked_by='', locked_at=None, finished_at=now,
+                last_error='Обработчик не отметил результат задания за отведённое время'):
+            failed += 1
+            run_failure_hook(job_row)
+    if failed:
+        logger.error('Зависших заданий, исчерпавших попытки: %s', failed)
+    requeued = (stale
+                .filter(attempts__lt=F('max_attempts'))
+                .update(status=Job.Status.QUEUED, locked_by='', locked_at=None))
+    return requeued, failed
+
+
+def purge_finished_jobs(older_than):
+    deleted, _ = (Job.objects
+                  .filter(status=Job.Status.DONE, finished_at__lt=timezone.now() - older_than)
+                  .delete())
+    return deleted
+
+
+def job_stats():
+    """Метрики очереди: задания по статусам и по именам, задержка и длительность."""
+    now = timezone.now()
+    by_status = dict.fromkeys(Job.Status.values, 0)
+    for row in Job.objects.values('status').annotate(count=Count('id')).order_by():
+        by_status[row['status']] = row['count']
+
+    by_name = {}
+    rows = (Job.objects
+            .values('name')
+            .annotate(
+                queued=Count('id', filter=Q(status=Job.Status.QUEUED)),
+                running=Count('id', filter=Q(status=Job.Status.RUNNING)),
+                done=Count('id', filter=Q(status=Job.Status.DONE)),
+                failed=Count('id', filter=Q(status=Job.Status.FAILED)),
+                retried=Count('id', filter=Q(attempts__gt=1)),
+                avg_ms=Avg('duration_ms'),
+                max_ms=Max('duration_ms'),
+            )
+            .order_by('name'))
+    for row in rows:
+        name = row.pop('name')
+        row['avg_ms'] = round(row['avg_ms'], 1) if row['avg_ms'] is not None else None
+        by_name[name] = row
+
+    oldest = (Job.objects
+              .filter(status=Job.Status.QUEUED, run_at__lte=now)
+              .aggregate(oldest=Min('run_at'))['oldest'])
+    return {
+        'by_status': by_status,
+        'by_name': by_name,
+        # Сколько секунд ждёт самое старое задание, которое уже пора выполнить
+        'queue_lag_seconds': round((now - oldest).total_seconds(), 1) if oldest else 0,
+    }
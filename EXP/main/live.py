@@ -0,0 +1,92 @@
+import random
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import TaskEvent
+
+# Сколько событий отдавать за один раз
+EVENTS_BATCH = 100
+
+# Доля записей, после которых чистится журнал событий
+PRUNE_PROBABILITY = 0.01
+
+# Поля события в том виде, в каком они уходят клиенту
+EVENT_FIELDS = ('id', 'task_id', 'kind', 'status', 'previous_status', 'assignee_id',
+                'previous_assignee_id', 'department_id', 'previous_department_id')
+
+
+def get_poll_interval():
+    # Как часто проверять новые события, в секундах
+    return getattr(settings, 'LIVE_POLL_INTERVAL', 1.0)
+
+
+def task_event(task, kind):
+    loaded = getattr(task, '_loaded_values', {})
+    return TaskEvent(
+        task_id=task.pk,
+        kind=kind,
+        status=task.status,
+        previous_status=loaded.get('status') or '',
+        assignee_id=task.assignee_id,
+        previous_assignee_id=loaded.get('assignee_id'),
+        department_id=task.department_id,
+        previous_department_id=loaded.get('department_id'),
+    )
+
+
+def record_task_events(tasks, kind=TaskEvent.Kind.UPDATED):
+    TaskEvent.objects.bulk_create([task_event(task, kind) for task in tasks])
+    # Время от времени удаляем старые события, отдельное расписание для этого не нужно
+    if random.random() < PRUNE_PROBABILITY:
+        prune_task_events()
+
+
+def prune_task_events():
+    # События нужны только открытым страницам, поэтому храним их недолго
+    keep = timedelta(seconds=getattr(settings, 'LIVE_EVENTS_RETENTION', 3600))
+    deleted, _ = TaskEvent.objects.filter(created_at__lt=timezone.now() - keep).delete()
+    return deleted
+
+
+class Viewer:
+    # Кому показывать события: исполнителю - его доска, руководителю - ещё и отдел
+    def __init__(self, user_id, department_id=None, is_staff=False):
+        self.user_id = user_id
+        self.department_id = department_id if is_staff else None
+
+    @classmethod
+    def for_user(cls, user):
+        return cls(user.pk, user.department_id, user.is_staff)
+
+    def q(self):
+        q = Q(assignee_id=self.user_id) | Q(previous_assignee_id=self.user_id)
+        if self.department_id:
+            q |= Q(department_id=self.department_id) | Q(previous_department_id=self.department_id)
+        return q
+
+    def can_see(self, event):
+        if self.user_id in (event['assignee_id'], event['previous_assignee_id']):
+            return True
+        return bool(self.department_id) and self.department_id in (
+            event['department_id'], event['previous_department_id'])
+
+
+def latest_event_id():
+    return TaskEvent.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+
+def events_after(after_id, viewer=None, until_id=None, limit=EVENTS_BATCH):
+    """События с id больше ``after_id`` (по возрастанию id) в виде словарей.
+
+    Запрос идёт по первичному ключу, поэтому остаётся дешёвым при любом
+    размере журнала; с ``viewer`` отбираются только события его доски и отдела.
+    """
+    events = TaskEvent.objects.filter(id__gt=after_id)
+    if until_id is not None:
+        events = events.filter(id__lte=until_id)
+    if viewer is not None:
+        events = events.filter(viewer.q())
+    return list(events.order_by('id').values(*EVENT_FIELDS)[:limit])
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max, Min, OuterRef, Subquery
+
+from main.models import Task, User
+
+
+class Command(BaseCommand):
+    help = 'Заполняет Task.department отделом автора, обрабатывая задачи пачками по id.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Сколько задач обновлять в одной транзакции (по умолчанию 1000).')
+        parser.add_argument('--all', action='store_true',
+                            help='Пересчитать отдел у всех задач, а не только у незаполненных.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        bounds = Task.objects.aggregate(lo=Min('id'), hi=Max('id'))
+        if bounds['lo'] is None:
+            self.stdout.write('Задач нет.')
+            return
+
+        author_department = User.objects.filter(pk=OuterRef('author_id')).values('department_id')[:1]
+        total = 0
+        for start in range(bounds['lo'], bounds['hi'] + 1, batch_size):
+            tasks = Task.objects.filter(pk__gte=start, pk__lt=start + batch_size)
+            if not options['all']:
+                tasks = tasks.filter(department__isnull=True)
+            # Каждая пачка - отдельная короткая транзакция, чтобы не держать блокировку записи
+            with transaction.atomic():
+                updated = tasks.update(department_id=Subquery(author_department))
+            total += updated
+            if updated and options['verbosity'] > 1:
+                self.stdout.write(f'  id {start}..{start + batch_size - 1}: {updated}')
+
+        self.stdout.write(self.style.SUCCESS(f'Обновлено задач: {total}'))
@@ -0,0 +1,160 @@
+import asyncio
+import importlib
+import io
+import json
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import clear_url_caches, reverse
+
+from main.asgi import ASGIHandler
+from main.models import User
+
+# Страницы, у которых есть async-версии
+READ_VIEWS = ('home', 'request_list', 'manager_dashboard', 'department_tasks')
+
+HOST = 'localhost'
+
+
+def use_async_views(enabled):
+    # Набор представлений выбирается при импорте urls, поэтому перечитываются и они,
+    # и корневой urls, в котором закэширован разбор подключённых маршрутов
+    with override_settings(ASYNC_READ_VIEWS=enabled):
+        importlib.reload(importlib.import_module('main.urls'))
+        importlib.reload(importlib.import_module(settings.ROOT_URLCONF))
+    clear_url_caches()
+
+
+def percentile(values, share):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+def wsgi_request(handler, path, cookie):
+    environ = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'SCRIPT_NAME': '', 'QUERY_STRING': '',
+        'SERVER_NAME': HOST, 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': HOST, 'HTTP_COOKIE': cookie,
+        'wsgi.input': io.BytesIO(), 'wsgi.errors': io.StringIO(), 'wsgi.url_scheme': 'http',
+        'wsgi.multithread': True, 'wsgi.multiprocess': False, 'wsgi.run_once': False,
+    }
+    status = []
+    started = time.perf_counter()
+    response = handler(environ, lambda s, headers, exc_info=None: status.append(s))
+    b''.join(response)
+    response.close()
+    return int(status[0].split()[0]), time.perf_counter() - started
+
+
+async def asgi_request(handler, path, cookie):
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+        'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': b'',
+        'root_path': '', 'server': (HOST, 80), 'client': ('127.0.0.1', 50000),
+        'headers': [(b'host', HOST.encode()), (b'cookie', cookie.encode())],
+    }
+    started = time.perf_counter()
+    await handler(scope, receive, send)
+    return messages[0]['status'], time.perf_counter() - started
+
+
+def run_wsgi(paths, cookie, total, workers):
+    handler = WSGIHandler()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        started = time.perf_counter()
+        results = list(pool.map(lambda i: wsgi_request(handler, paths[i % len(paths)], cookie), range(total)))
+    return results, time.perf_counter() - started
+
+
+def run_asgi(paths, cookie, total, workers):
+    handler = ASGIHandler()
+
+    async def main():
+        counter = iter(range(total))
+        results = []
+
+        async def worker():
+            # Одновременно обрабатывается не больше workers запросов - как у сервера с workers соединениями
+            for i in counter:
+                results.append(await asgi_request(handler, paths[i % len(paths)], cookie))
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(workers)))
+        return results, time.perf_counter() - started
+
+    return asyncio.run(main())
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает пропускную способность страниц под WSGI и ASGI при одинаковом числе обработчиков.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', help='От чьего имени открывать страницы (по умолчанию - руководитель отдела).')
+        parser.add_argument('--requests', type=int, default=200, help='Сколько запросов выполнить в каждом режиме.')
+        parser.add_argument('--workers', type=int, default=8,
+                            help='Потоков WSGI и одновременных запросов ASGI.')
+        parser.add_argument('--json', action='store_true', help='Вывести результаты в JSON.')
+
+    def handle(self, *args, **options):
+        if options['username']:
+            user = User.objects.filter(username=options['username']).first()
+        else:
+            user = User.objects.filter(is_staff=True, department__isnull=False).order_by('id').first()
+        if user is None:
+            raise CommandError('Не найден пользователь для замера.')
+
+        client = Client()
+        client.force_login(user)
+        cookie = f'{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}'
+        paths = [reverse(name) for name in READ_VIEWS]
+        total, workers = options['requests'], max(1, options['workers'])
+
+        modes = (
+            ('wsgi', run_wsgi, False),
+            ('asgi', run_asgi, False),
+            ('asgi+async', run_asgi, True),
+        )
+        report = []
+        with override_settings(ALLOWED_HOSTS=[HOST]):
+            try:
+                for mode, run, async_views in modes:
+                    use_async_views(async_views)
+                    # Прогрев: кэш фрагментов и шаблонов
+                    run(paths, cookie, len(paths), 1)
+                    results, elapsed = run(paths, cookie, total, workers)
+                    timings = [duration * 1000 for _, duration in results]
+                    report.append({
+                        'mode': mode,
+                        'workers': workers,
+                        'requests': total,
+                        'errors': sum(1 for status, _ in results if status != 200),
+                        'rps': round(total / elapsed, 1),
+                        'p50_ms': round(statistics.median(timings), 2),
+                        'p95_ms': round(percentile(timings, 0.95), 2),
+                    })
+            finally:
+                use_async_views(getattr(settings, 'ASYNC_READ_VIEWS', False))
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        self.stdout.write(f'Пользователь {user.username}, обработчиков {workers}, запросов {total}')
+        for row in report:
+            self.stdout.write(
+                f"  {row['mode']:<11} {row['rps']:>8} запр/с  p50 {row['p50_ms']} мс  "
+                f"p95 {row['p95_ms']} мс  ошибок {row['errors']}"
+            )
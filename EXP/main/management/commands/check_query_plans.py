@@ -0,0 +1,135 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from django.urls import resolve, reverse
+
+from main.models import Attachment, Blob, Comment, Department, Request, Task, UploadSession, User
+
+# Таблицы, которые растут вместе с данными: полный проход по ним недопустим
+HOT_TABLES = ('main_task', 'main_request', 'main_comment', 'main_attachment')
+
+FULL_SCAN_RE = re.compile(r'^SCAN (?:TABLE )?(\w+)')
+TEMP_BTREE_RE = re.compile(r'USE TEMP B-TREE')
+
+
+def view_routes(fixtures):
+    # (имя маршрута, аргументы, пользователь[, GET-параметры]) для каждой страницы, которую проверяем
+    task, req = fixtures['task'], fixtures['request']
+    leader, employee = fixtures['leader'], fixtures['employee']
+    return [
+        ('home', {}, employee),
+        ('home', {}, leader),
+        ('board_column', {'status': Task.Status.NEW}, employee),
+        ('create_task', {}, leader),
+        ('task_detail', {'pk': task.pk}, leader),
+        ('task_comments', {'pk': task.pk}, leader),
+        ('attachment_download', {'pk': fixtures['attachment'].pk}, employee),
+        ('upload_chunk', {'upload_id': fixtures['upload'].pk}, leader),
+        ('edit_task', {'pk': task.pk}, leader),
+        ('delete_task', {'pk': task.pk}, leader),
+        ('request_list', {}, leader),
+        ('create_request', {}, leader),
+        ('delete_request', {'pk': req.pk}, leader),
+        ('manager_dashboard', {}, leader),
+        ('department_tasks', {}, leader),
+        ('department_tasks_feed', {}, leader),
+        ('department_tasks_export', {}, leader, {'status': Task.Status.NEW, 'created_from': '2020-01-01'}),
+        ('search', {}, employee, {'q': 'Проверка'}),
+        ('search', {}, leader, {'q': 'Проверка'}),
+    ]
+
+
+class Command(BaseCommand):
+    help = ('Выполняет EXPLAIN QUERY PLAN для запросов каждой страницы и завершается '
+            'с ошибкой, если какой-либо запрос полностью сканирует большую таблицу.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verbose-plans', action='store_true',
+                            help='Печатать планы всех запросов, а не только проблемных.')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Проверка планов запросов поддерживается только для SQLite.')
+
+        failures = []
+        warnings = []
+        # Тестовые данные создаются во временной транзакции и откатываются.
+        # Вложения отдаются через X-Accel-Redirect, чтобы не читать файлы с диска:
+        # на запросы к БД способ отдачи не влияет
+        with transaction.atomic(), override_settings(ATTACHMENT_SENDFILE_BACKEND='x-accel-redirect'):
+            fixtures = self.create_fixtures()
+            for name, kwargs, user, *query in view_routes(fixtures):
+                for sql, params in self.capture_view_queries(name, kwargs, user, *query):
+                    if not sql.lstrip().upper().startswith('SELECT'):
+                        continue
+                    plan = self.explain(sql, params)
+                    scans = [detail for detail in plan
+                             if (m := FULL_SCAN_RE.match(detail)) and m.group(1) in HOT_TABLES]
+                    sorts = [detail for detail in plan if TEMP_BTREE_RE.search(detail)]
+                    if scans:
+                        failures.append((name, sql, plan))
+                    elif sorts:
+                        warnings.append((name, sql, plan))
+                    elif options['verbose_plans']:
+                        self.report(name, sql, plan, self.style.SUCCESS)
+            transaction.set_rollback(True)
+
+        for name, sql, plan in warnings:
+            self.report(name, sql, plan, self.style.WARNING)
+        for name, sql, plan in failures:
+            self.report(name, sql, plan, self.style.ERROR)
+
+        if failures:
+            raise CommandError(f'Полный проход по таблице в {len(failures)} запрос(ах).')
+        self.stdout.write(self.style.SUCCESS(
+            f'Полных проходов по таблицам нет (временных сортировок: {len(warnings)}).'
+        ))
+
+    def create_fixtures(self):
+        department = Department.objects.create(name='Проверка планов')
+        leader = User.objects.create(username='__plan_leader', is_staff=True, department=department)
+        employee = User.objects.create(username='__plan_employee', department=department)
+        department.leader = leader
+        department.save()
+        task = Task.objects.create(title='Проверка', author=leader, assignee=employee)
+        Comment.objects.create(task=task, author=leader, text='Проверка')
+        req = Request.objects.create(title='Проверка', request_type=Request.RequestType.SOFTWARE,
+                                     requester=leader, department=department, assignee=leader)
+        blob = Blob.objects.create(sha256='0' * 64, size=0, file='blobs/00/00/plan')
+        attachment = Attachment.objects.create(task=task, author=leader, blob=blob, file=blob.file.name, name='plan')
+        upload = UploadSession.objects.create(task=task, author=leader, filename='plan', size=1)
+        return {'department': department, 'leader': leader, 'employee': employee,
+                'task': task, 'request': req, 'attachment': attachment, 'upload': upload}
+
+    def capture_view_queries(self, name, kwargs, user, query=None):
+        path = reverse(name, kwargs=kwargs)
+        request = RequestFactory().get(path, query)
+        request.user = user
+        match = resolve(path)
+
+        queries = []
+
+        def record(execute, sql, params, many, context):
+            queries.append((sql, params))
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(record):
+            response = match.func(request, *match.args, **match.kwargs)
+            # Потоковый ответ читает БД только при отдаче - дочитываем его здесь
+            if response.streaming:
+                for _ in response:
+                    pass
+        return queries
+
+    def explain(self, sql, params):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def report(self, name, sql, plan, style):
+        self.stdout.write(style(f'[{name}] {sql}'))
+        for detail in plan:
+            self.stdout.write(f'    {detail}')
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import F, OuterRef, Q, Subquery
+
+from main.models import Task, User
+
+
+def mismatched_tasks():
+    # Задачи, у которых сохранённый отдел не совпадает с текущим отделом автора
+    return (Task.objects
+            .annotate(expected_department=F('author__department'))
+            .filter(Q(department__isnull=True, expected_department__isnull=False)
+                    | Q(department__isnull=False, expected_department__isnull=True)
+                    | ~Q(department=F('expected_department'))))
+
+
+class Command(BaseCommand):
+    help = 'Проверяет, что Task.department совпадает с отделом автора задачи.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true',
+                            help='Исправить найденные расхождения.')
+        parser.add_argument('--limit', type=int, default=20,
+                            help='Сколько расхождений вывести (по умолчанию 20).')
+
+    def handle(self, *args, **options):
+        mismatched = mismatched_tasks()
+        count = mismatched.count()
+        if not count:
+            self.stdout.write(self.style.SUCCESS('Расхождений нет.'))
+            return
+
+        for task_id, stored, expected in mismatched.values_list('id', 'department_id', 'expected_department')[:options['limit']]:
+            self.stdout.write(f'  задача {task_id}: в задаче {stored}, у автора {expected}')
+
+        if not options['fix']:
+            raise CommandError(f'Найдено расхождений: {count}')
+
+        author_department = User.objects.filter(pk=OuterRef('author_id')).values('department_id')[:1]
+        fixed = (Task.objects
+                 .filter(pk__in=list(mismatched.values_list('pk', flat=True)))
+                 .update(department_id=Subquery(author_department)))
+        self.stdout.write(self.style.SUCCESS(f'Исправлено задач: {fixed}'))
@@ -0,0 +1,17 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from main.uploads import cleanup_stale_uploads
+
+
+class Command(BaseCommand):
+    help = 'Удаляет незавершённые загрузки файлов, которые давно не продолжались.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=24,
+                            help='Сколько часов загрузка может простаивать (по умолчанию 24).')
+
+    def handle(self, *args, **options):
+        removed = cleanup_stale_uploads(timedelta(hours=options['hours']))
+        self.stdout.write(self.style.SUCCESS(f'Удалено загрузок: {removed}'))
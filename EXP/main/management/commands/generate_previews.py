@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from main.models import Blob
+from main.previews import generate_previews
+
+
+class Command(BaseCommand):
+    help = 'Ставит в очередь построение превью для вложений, у которых их ещё нет.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retry-failed', action='store_true',
+                            help='Повторить файлы, для которых построение завершилось ошибкой.')
+        parser.add_argument('--stuck', action='store_true',
+                            help='Повторить файлы, оставшиеся в статусе «строится» '
+                                 '(например, после аварийной остановки обработчика).')
+
+    def handle(self, *args, **options):
+        statuses = []
+        if options['retry_failed']:
+            statuses.append(Blob.PreviewStatus.FAILED)
+        if options['stuck']:
+            statuses.append(Blob.PreviewStatus.PROCESSING)
+        if statuses:
+            Blob.objects.filter(preview_status__in=statuses).update(preview_status=Blob.PreviewStatus.PENDING)
+
+        blob_ids = list(Blob.objects
+                        .filter(preview_status=Blob.PreviewStatus.PENDING)
+                        .values_list('pk', flat=True))
+        for blob_id in blob_ids:
+            generate_previews.enqueue(blob_id=blob_id)
+        self.stdout.write(self.style.SUCCESS(f'Поставлено в очередь: {len(blob_ids)}'))
@@ -0,0 +1,61 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main.importer import Importer
+
+KINDS = (
+    ('departments', 'Отделы'),
+    ('users', 'Сотрудники'),
+    ('tasks', 'Задачи'),
+)
+
+
+class Command(BaseCommand):
+    help = ('Загружает отделы, сотрудников и задачи из CSV или JSON Lines. '
+            'Строки с ошибками пропускаются, остальные загружаются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--departments', help='Файл отделов: name, leader.')
+        parser.add_argument('--users', help='Файл сотрудников: username, password, first_name, last_name, '
+                                            'patronymic, email, department, is_staff.')
+        parser.add_argument('--tasks', help='Файл задач: title, description, status, priority, deadline, '
+                                            'author, assignee.')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Сколько строк записывать одной транзакцией (по умолчанию 500).')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Процессов для хеширования паролей (по умолчанию - по числу ядер).')
+
+    def handle(self, *args, **options):
+        files = {kind: options[kind] for kind, _ in KINDS if options[kind]}
+        if not files:
+            raise CommandError('Укажите хотя бы один файл: --departments, --users или --tasks.')
+        for path in files.values():
+            if not os.path.isfile(path):
+                raise CommandError(f'Файл не найден: {path}')
+
+        importer = Importer(
+            batch_size=max(1, options['batch_size']),
+            workers=options['workers'],
+            report=lambda where, message: self.stderr.write(f'{where}: {message}'),
+        )
+        try:
+            if 'departments' in files:
+                importer.import_departments(files['departments'])
+            if 'users' in files:
+                importer.import_users(files['users'])
+            # Руководителями могут быть и только что загруженные сотрудники
+            importer.assign_leaders()
+            if 'tasks' in files:
+                importer.import_tasks(files['tasks'])
+        finally:
+            importer.close()
+
+        stats = importer.stats
+        for kind, title in KINDS:
+            if kind in files:
+                self.stdout.write(f'{title}: создано {stats[kind, "created"]}, '
+                                  f'уже были {stats[kind, "skipped"]}')
+        if stats['errors']:
+            raise CommandError(f'Строк с ошибками: {stats["errors"]}')
+        self.stdout.write(self.style.SUCCESS('Загрузка завершена'))
@@ -0,0 +1,30 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from main.jobs import job_stats
+
+
+class Command(BaseCommand):
+    help = 'Показывает состояние очереди фоновых заданий.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--json', action='store_true', help='Вывести метрики в JSON.')
+
+    def handle(self, *args, **options):
+        stats = job_stats()
+        if options['json']:
+            self.stdout.write(json.dumps(stats, ensure_ascii=False, indent=2))
+            return
+
+        by_status = stats['by_status']
+        self.stdout.write(
+            f"В очереди: {by_status['queued']}, выполняется: {by_status['running']}, "
+            f"выполнено: {by_status['done']}, ошибок: {by_status['failed']}"
+        )
+        self.stdout.write(f"Задержка очереди: {stats['queue_lag_seconds']} с")
+        for name, row in stats['by_name'].items():
+            self.stdout.write(
+                f"  {name}: выполнено {row['done']}, в очереди {row['queued']}, ошибок {row['failed']}, "
+                f"с повторами {row['retried']}, среднее {row['avg_ms']} мс, максимум {row['max_ms']} мс"
+            )
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from main.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Заново заполняет полнотекстовый индекс задач, заявок и комментариев.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Сколько строк индексировать в одной транзакции.')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Полнотекстовый индекс (FTS5) поддерживается только для SQLite.')
+
+        started = time.monotonic()
+
+        def progress(kind, total):
+            if options['verbosity'] > 1:
+                self.stdout.write(f'  {kind}: проиндексировано строк всего {total}')
+
+        total = rebuild_index(batch_size=max(1, options['batch_size']), progress=progress)
+        self.stdout.write(self.style.SUCCESS(
+            f'Индекс перестроен: {total} записей за {time.monotonic() - started:.1f} с.'
+        ))
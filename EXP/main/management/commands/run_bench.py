@@ -0,0 +1,206 @@
+import json
+import logging
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from main import benchdata
+from main.dashboard_cache import get_cache
+from main.urls import urlpatterns
+
+from .bench_views import percentile
+
+
+def git_commit():
+    try:
+        result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                                capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip()
+
+
+@contextmanager
+def quiet_request_log():
+    # Ожидаемые ответы 4xx (например, live_events под WSGI) не засоряют вывод предупреждениями
+    logger = logging.getLogger('django.request')
+    level = logger.level
+    logger.setLevel(logging.ERROR)
+    try:
+        yield
+    finally:
+        logger.setLevel(level)
+
+
+class Command(BaseCommand):
+    help = ('Открывает каждую страницу из main/urls.py через тестовый клиент и выводит в JSON '
+            'p50/p95 времени ответа, число SQL-запросов и пик памяти. '
+            'Данные для замера создаёт seed_bench.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20, help='Замеров на страницу (по умолчанию 20).')
+        parser.add_argument('--warmup', type=int, default=2, help='Запросов на прогрев перед замером.')
+        parser.add_argument('--route', action='append', default=[],
+                            help='Замерить только этот маршрут (можно указать несколько раз).')
+        parser.add_argument('--cold', action='store_true',
+                            help='Очищать кэш дашбордов перед каждым запросом.')
+        parser.add_argument('--output', help='Записать результаты в файл, а не в stdout.')
+        parser.add_argument('--compare', help='Сравнить с результатами из файла и завершиться с ошибкой '
+                                              'при регрессии.')
+        parser.add_argument('--threshold', type=float, default=1.5,
+                            help='Во сколько раз может вырасти p50, прежде чем это считается регрессией.')
+        parser.add_argument('--min-delta-ms', type=float, default=5.0,
+                            help='Рост p50 меньше этого не считается регрессией (шум замера).')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as file:
+                baseline = json.load(file)
+
+        report = {
+            'meta': {
+                'commit': git_commit(),
+                'created_at': timezone.now().isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'async_read_views': getattr(settings, 'ASYNC_READ_VIEWS', False),
+                'repeat': options['repeat'],
+                'cold_cache': options['cold'],
+                'dataset': benchdata.dataset_summary(),
+            },
+            'routes': [],
+        }
+
+        # Всё, что страницы меняют, откатывается вместе с внешней транзакцией;
+        # временные файлы загрузок пишутся во временный каталог
+        with tempfile.TemporaryDirectory() as upload_dir, quiet_request_log(), \
+                override_settings(ALLOWED_HOSTS=['testserver'], UPLOAD_TEMP_DIR=upload_dir), \
+                transaction.atomic():
+            fixtures = benchdata.bench_fixtures()
+            if fixtures is None:
+                raise CommandError('В базе нет сотрудников отделов. Сначала запустите seed_bench.')
+            cases = benchdata.route_cases(fixtures)
+            covered = {case.name for case in cases}
+            if options['route']:
+                cases = [case for case in cases if case.name in options['route']]
+            for case in cases:
+                report['routes'].append(self.measure(case, fixtures[case.user], options))
+                if options['verbosity'] > 1:
+                    self.stderr.write(f"  {case.label}: p50 {report['routes'][-1]['p50_ms']} мс")
+            transaction.set_rollback(True)
+
+        report['meta']['uncovered_routes'] = sorted(pattern.name for pattern in urlpatterns
+                                                    if pattern.name not in covered)
+
+        output = json.dumps(report, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(output + '\n')
+        else:
+            self.stdout.write(output)
+        for name in report['meta']['uncovered_routes']:
+            self.stderr.write(self.style.WARNING(f'Маршрут {name} не замеряется: добавьте его в route_cases()'))
+
+        if baseline is not None:
+            self.compare(baseline, report, options['threshold'], options['min_delta_ms'])
+
+    def measure(self, case, user, options):
+        client = Client()
+        if user is not None:
+            client.force_login(user)
+        path = reverse(case.name, kwargs=case.kwargs)
+        queries = []
+
+        def count_query(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        def call():
+            # Подготовка (вход, очистка кэша) не входит в замер
+            if case.relogin:
+                client.force_login(user)
+            if options['cold']:
+                get_cache().clear()
+            queries.clear()
+            started = time.perf_counter()
+            # Изменения пишущих запросов откатываются точкой сохранения
+            with connection.execute_wrapper(count_query), \
+                    transaction.atomic() if case.writes else nullcontext():
+                response = getattr(client, case.method)(path, **benchdata.request_kwargs(case))
+                # Потоковый ответ формируется при чтении - дочитываем его в замере
+                if response.streaming:
+                    for _ in response.streaming_content:
+                        pass
+                if case.writes:
+                    transaction.set_rollback(True)
+            return response.status_code, time.perf_counter() - started
+
+        for _ in range(options['warmup']):
+            call()
+        timings = []
+        for _ in range(max(1, options['repeat'])):
+            status, elapsed = call()
+            timings.append(elapsed * 1000)
+        query_count = len(queries)
+
+        # Память - отдельным запросом: tracemalloc сильно замедляет выполнение
+        tracemalloc.start()
+        try:
+            before = tracemalloc.get_traced_memory()[0]
+            call()
+            peak = tracemalloc.get_traced_memory()[1] - before
+        finally:
+            tracemalloc.stop()
+
+        return {
+            'label': case.label,
+            'route': case.name,
+            'method': case.method.upper(),
+            'status': status,
+            'p50_ms': round(statistics.median(timings), 2),
+            'p95_ms': round(percentile(timings, 0.95), 2),
+            'queries': query_count,
+            'peak_kb': round(peak / 1024, 1),
+        }
+
+    def compare(self, baseline, report, threshold, min_delta_ms):
+        if baseline.get('meta', {}).get('dataset') != report['meta']['dataset']:
+            self.stderr.write(self.style.WARNING(
+                'Данные в базе отличаются от данных базового замера - сравнение может быть некорректным.'
+            ))
+        previous = {row['label']: row for row in baseline.get('routes', [])}
+        regressions = []
+        for row in report['routes']:
+            old = previous.get(row['label'])
+            if old is None:
+                continue
+            if row['queries'] > old['queries']:
+                regressions.append(f"{row['label']}: SQL-запросов {old['queries']} -> {row['queries']}")
+            # Медиана устойчивее к шуму, чем p95 из пары десятков замеров
+            if row['p50_ms'] > old['p50_ms'] * threshold and row['p50_ms'] - old['p50_ms'] > min_delta_ms:
+                regressions.append(f"{row['label']}: p50 {old['p50_ms']} -> {row['p50_ms']} мс")
+            if row['status'] != old['status']:
+                regressions.append(f"{row['label']}: код ответа {old['status']} -> {row['status']}")
+
+        meta = baseline.get('meta', {})
+        commit = meta.get('commit') or meta.get('created_at') or 'базового замера'
+        if regressions:
+            for line in regressions:
+                self.stderr.write(self.style.ERROR(line))
+            raise CommandError(f'Регрессий относительно {commit}: {len(regressions)}')
+        self.stderr.write(self.style.SUCCESS(f'Регрессий относительно {commit} нет.'))
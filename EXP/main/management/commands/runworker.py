@@ -0,0 +1,113 @@
+import multiprocessing
+import os
+import signal
+import socket
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+
+from main.jobs import claim_jobs, execute_job, purge_finished_jobs, record_failure, requeue_stale_jobs
+
+# Как часто возвращать зависшие задания и чистить выполненные
+MAINTENANCE_INTERVAL = 60
+
+
+def run_job_in_worker(job_id):
+    # Сигналы остановки обрабатывает главный процесс: он дожидается текущих заданий,
+    # поэтому процессы пула их игнорируют
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    return execute_job(job_id)
+
+
+class Command(BaseCommand):
+    help = 'Выполняет фоновые задания из очереди в пуле процессов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=getattr(settings, 'JOB_WORKERS', os.cpu_count() or 2),
+                            help='Сколько заданий выполнять параллельно.')
+        parser.add_argument('--poll', type=float, default=1.0,
+                            help='Пауза между опросами пустой очереди, в секундах.')
+        parser.add_argument('--burst', action='store_true',
+                            help='Выполнить все готовые задания и завершиться.')
+
+    def handle(self, *args, **options):
+        self.worker = f'{socket.gethostname()}:{os.getpid()}'
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        workers = max(1, options['workers'])
+        lock_timeout = timedelta(seconds=getattr(settings, 'JOB_LOCK_TIMEOUT', 600))
+        retention = timedelta(days=getattr(settings, 'JOB_RETENTION_DAYS', 7))
+        self.stdout.write(f'Обработчик {self.worker}: процессов {workers}')
+
+        executor = self.create_executor(workers)
+        inflight = {}
+        next_maintenance = 0
+        try:
+            while not self.stopping:
+                if time.monotonic() >= next_maintenance:
+                    requeued, failed = requeue_stale_jobs(lock_timeout)
+                    purged = purge_finished_jobs(retention)
+                    if requeued or failed or purged:
+                        self.stdout.write(f'Возвращено в очередь: {requeued}, исчерпали попытки: {failed}, '
+                                          f'удалено выполненных: {purged}')
+                    next_maintenance = time.monotonic() + MAINTENANCE_INTERVAL
+
+                free = workers - len(inflight)
+                if free:
+                    for job_id in claim_jobs(self.worker, free):
+                        inflight[executor.submit(run_job_in_worker, job_id)] = job_id
+                # Соединение главного процесса не держим открытым между опросами
+                close_old_connections()
+
+                if not inflight:
+                    if options['burst']:
+                        break
+                    time.sleep(options['poll'])
+                    continue
+
+                done, _ = wait(inflight, timeout=options['poll'], return_when=FIRST_COMPLETED)
+                for future in done:
+                    job_id = inflight.pop(future)
+                    error = future.exception()
+                    if isinstance(error, BrokenProcessPool):
+                        # Процесс пула упал (например, из-за нехватки памяти) - задание
+                        # считается неудачной попыткой, пул пересоздаётся
+                        record_failure(job_id, f'Процесс обработчика аварийно завершился: {error}', worker=self.worker)
+                        executor = self.restart_executor(executor, workers, inflight)
+                        break
+                    if error is not None:
+                        record_failure(job_id, repr(error), worker=self.worker)
+        finally:
+            # Дожидаемся заданий, которые уже выполняются
+            executor.shutdown(wait=True)
+        self.stdout.write(self.style.SUCCESS('Обработчик остановлен.'))
+
+    def stop(self, signum, frame):
+        self.stopping = True
+
+    def create_executor(self, workers):
+        # Процессы запускаются через spawn и сами настраивают Django: унаследованное
+        # через fork соединение SQLite использовать нельзя
+        connections.close_all()
+        return ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=django.setup,
+        )
+
+    def restart_executor(self, executor, workers, inflight):
+        executor.shutdown(wait=False)
+        # Задания, которые пул успел выполнить до падения, уже не RUNNING и пропускаются
+        for job_id in inflight.values():
+            record_failure(job_id, 'Пул обработчиков перезапущен', worker=self.worker)
+        inflight.clear()
+        return self.create_executor(workers)
@@ -0,0 +1,43 @@
+import time
+from dataclasses import fields
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main import benchdata
+
+
+class Command(BaseCommand):
+    help = ('Заполняет базу синтетическими данными для замеров (run_bench). '
+            'Лучше запускать на отдельной базе: DATABASE_PATH=bench.sqlite3.')
+
+    def add_arguments(self, parser):
+        # Размеры данных - поля SeedSizes: --departments, --users, --tasks, ..., --skew
+        for size in fields(benchdata.SeedSizes):
+            parser.add_argument(f'--{size.name}', type=size.type, default=size.default,
+                                help=f'По умолчанию {size.default}.')
+        parser.add_argument('--seed', type=int, default=42,
+                            help='Зерно генератора: одинаковое зерно даёт одинаковые данные.')
+        parser.add_argument('--batch-size', type=int, default=2000,
+                            help='Сколько строк вставлять одной транзакцией.')
+        parser.add_argument('--clear', action='store_true',
+                            help='Сначала удалить данные, созданные предыдущим запуском.')
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            benchdata.clear()
+        elif benchdata.has_bench_data():
+            raise CommandError('В базе уже есть данные для замеров. Запустите с --clear, чтобы пересоздать их.')
+
+        sizes = benchdata.SeedSizes(**{size.name: options[size.name] for size in fields(benchdata.SeedSizes)})
+        verbosity = options['verbosity']
+
+        def progress(name, count):
+            if verbosity > 1:
+                self.stdout.write(f'  {name}: {count}')
+
+        started = time.monotonic()
+        benchdata.seed(sizes, seed=options['seed'], batch_size=max(1, options['batch_size']), progress=progress)
+        summary = ', '.join(f'{name} {count}' for name, count in benchdata.dataset_summary().items())
+        self.stdout.write(self.style.SUCCESS(
+            f'Данные созданы за {time.monotonic() - started:.1f} с. В базе: {summary}'
+        ))
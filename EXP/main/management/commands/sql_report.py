@@ -0,0 +1,64 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from main import sqlwatch
+
+TITLES = {
+    sqlwatch.N_PLUS_ONE: 'Повторяющиеся запросы (N+1)',
+    sqlwatch.SLOW: 'Медленные запросы',
+}
+
+
+class Command(BaseCommand):
+    help = ('Сводка находок SQLWatchMiddleware: повторяющиеся (N+1) и медленные запросы '
+            'с местом вызова в коде и шаблонах.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kind', choices=sorted(TITLES), help='Показать только находки этого вида.')
+        parser.add_argument('--limit', type=int, default=20, help='Сколько мест показать в каждом разделе.')
+        parser.add_argument('--path', help='Файл отчёта (по умолчанию SQL_WATCH_REPORT_PATH).')
+        parser.add_argument('--clear', action='store_true', help='Удалить отчёт после вывода.')
+
+    def handle(self, *args, **options):
+        path = Path(options['path']) if options['path'] else sqlwatch.get_report_path()
+        # Одно и то же место с одним и тем же запросом - одна строка сводки
+        groups = {}
+        for row in sqlwatch.read_report(path):
+            if options['kind'] and row['kind'] != options['kind']:
+                continue
+            group = groups.setdefault((row['kind'], row['site'], row['sql']), {
+                'hits': 0, 'max_count': 0, 'max_ms': 0, 'views': set(), 'last': row['at'],
+            })
+            group['hits'] += 1
+            group['max_count'] = max(group['max_count'], row['count'])
+            group['max_ms'] = max(group['max_ms'], row['ms'])
+            group['views'].add(row['view'] or row['path'])
+            group['last'] = max(group['last'], row['at'])
+
+        if not groups:
+            self.stdout.write(f'Находок нет ({path}).')
+            return
+
+        for kind, title in TITLES.items():
+            rows = sorted(((site, sql, group) for (row_kind, site, sql), group in groups.items() if row_kind == kind),
+                          key=lambda row: (-row[2]['hits'], -row[2]['max_ms']))
+            if not rows:
+                continue
+            self.stdout.write(self.style.MIGRATE_HEADING(f'{title}: {len(rows)}'))
+            for site, sql, group in rows[:options['limit']]:
+                if kind == sqlwatch.N_PLUS_ONE:
+                    summary = f"{group['hits']} запр., до {group['max_count']} повторов ({group['max_ms']} мс)"
+                else:
+                    summary = f"{group['hits']} раз, до {group['max_ms']} мс"
+                views = ', '.join(sorted(view for view in group['views'] if view))
+                if views:
+                    summary += f'  [{views}]'
+                self.stdout.write(f'  {summary}, последний {group["last"]}')
+                self.stdout.write(f'    {site}')
+                self.stdout.write(f'    {sql}')
+            if len(rows) > options['limit']:
+                self.stdout.write(f'  ... и ещё {len(rows) - options["limit"]}')
+
+        if options['clear']:
+            path.unlink(missing_ok=True)
@@ -0,0 +1,124 @@
+import multiprocessing
+import os
+import queue
+import sqlite3
+import statistics
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+
+from main.models import User
+from main.replicas import copy_database
+from main.sqlite.stress import run_worker
+
+from .bench_views import percentile
+
+PROFILES = {
+    'off': 'django.db.backends.sqlite3 без настроек',
+    'on': 'main.sqlite: BEGIN IMMEDIATE и SQLITE_PRAGMAS',
+}
+
+
+class Command(BaseCommand):
+    help = ('Нагрузка на копию базы: процессы-писатели перемещают карточки на доске, читатели '
+            'собирают доски. Сравнивает стандартный бэкенд SQLite и main.sqlite. '
+            'Данные для нагрузки создаёт seed_bench.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=8, help='Процессов, меняющих статусы задач.')
+        parser.add_argument('--readers', type=int, default=4, help='Процессов, читающих доски.')
+        parser.add_argument('--duration', type=float, default=10, help='Длительность каждого прогона, с.')
+        parser.add_argument('--profile', choices=sorted(PROFILES), action='append',
+                            help='Прогнать только этот профиль (по умолчанию оба).')
+
+    def handle(self, *args, **options):
+        users = list(User.objects
+                     .annotate(task_count=Count('assigned_tasks'))
+                     .filter(task_count__gt=0)
+                     .order_by('-task_count')
+                     .values_list('pk', flat=True)[:options['writers'] + options['readers']])
+        if not users:
+            raise CommandError('В базе нет задач с исполнителями. Сначала запустите seed_bench.')
+        task_ids = {
+            user_id: list(User.objects.get(pk=user_id).assigned_tasks.values_list('pk', flat=True))
+            for user_id in users
+        }
+
+        self.stdout.write(f"{options['writers']} писателей, {options['readers']} читателей, "
+                          f"{options['duration']:g} с на профиль")
+        rows = {}
+        for profile in options['profile'] or list(PROFILES):
+            with tempfile.TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, 'stress.sqlite3')
+                self.copy_database(path, wal=profile == 'on')
+                rows[profile] = self.run(profile, path, users, task_ids, options)
+            self.report(profile, rows[profile])
+
+        errors = rows.get('on', {}).get('errors')
+        if errors:
+            raise CommandError(f'С профилем main.sqlite были ошибки блокировки: {errors}')
+
+    def copy_database(self, path, wal):
+        # Нагрузка идёт на копии: рабочая база не меняется
+        copy_database(settings.DATABASES['default']['NAME'], path)
+        target = sqlite3.connect(path)
+        target.execute(f"PRAGMA journal_mode = {'wal' if wal else 'delete'}")
+        target.close()
+
+    def run(self, profile, path, users, task_ids, options):
+        context = multiprocessing.get_context('spawn')
+        start = context.Event()
+        results = context.Queue()
+        roles = ['writer'] * options['writers'] + ['reader'] * options['readers']
+        processes = []
+        for index, role in enumerate(roles):
+            user_id = users[index % len(users)]
+            process = context.Process(target=run_worker, args=(
+                role, profile, path, user_id, task_ids[user_id], options['duration'], index, start, results,
+            ))
+            process.start()
+            processes.append(process)
+
+        try:
+            # Замер начинается, когда все процессы подключились к базе
+            self.collect(results, processes)
+            start.set()
+            finished = self.collect(results, processes)
+        finally:
+            for process in processes:
+                process.join(timeout=5)
+                if process.is_alive():
+                    process.terminate()
+
+        row = {'writes': 0, 'reads': 0, 'errors': 0, 'write_ms': [], 'read_ms': []}
+        for role, done, errors, timings in finished:
+            row['writes' if role == 'writer' else 'reads'] += done
+            row['write_ms' if role == 'writer' else 'read_ms'].extend(timings)
+            row['errors'] += errors
+        row['duration'] = options['duration']
+        return row
+
+    def collect(self, results, processes):
+        # По сообщению от каждого процесса; упавший процесс не подвешивает команду
+        messages = []
+        while len(messages) < len(processes):
+            try:
+                messages.append(results.get(timeout=1))
+            except queue.Empty:
+                if any(process.exitcode not in (None, 0) for process in processes):
+                    raise CommandError('Процесс нагрузки завершился с ошибкой (см. вывод выше).')
+        return messages
+
+    def report(self, profile, row):
+        def latency(timings):
+            if not timings:
+                return '-'
+            return f'p50 {statistics.median(timings):.1f} мс, p95 {percentile(timings, 0.95):.1f} мс'
+
+        self.stdout.write(self.style.MIGRATE_HEADING(f'{profile}: {PROFILES[profile]}'))
+        self.stdout.write(f"  записей: {row['writes'] / row['duration']:.1f}/с ({latency(row['write_ms'])})")
+        self.stdout.write(f"  чтений:  {row['reads'] / row['duration']:.1f}/с ({latency(row['read_ms'])})")
+        style = self.style.ERROR if row['errors'] else self.style.SUCCESS
+        self.stdout.write(style(f"  ошибок блокировки: {row['errors']}"))
@@ -0,0 +1,42 @@
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from main.replicas import copy_database, get_replica
+
+
+class Command(BaseCommand):
+    help = ('Копирует основную SQLite-базу в реплику (DATABASE_REPLICA_PATH) через backup API. '
+            'С --interval обновляет её, пока не будет остановлена.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Повторять копирование раз в столько секунд (по умолчанию один раз).')
+
+    def handle(self, *args, **options):
+        replica = get_replica()
+        if replica is None:
+            raise CommandError('Реплика не настроена: задайте DATABASE_REPLICA_PATH.')
+        source = settings.DATABASES['default']['NAME']
+        target = settings.DATABASES[replica]['NAME']
+
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        while not self.stopping:
+            started = time.monotonic()
+            copy_database(source, target)
+            elapsed = time.monotonic() - started
+            if options['verbosity'] > 1 or not options['interval']:
+                self.stdout.write(f'Реплика {target} обновлена за {elapsed:.2f} с')
+            if not options['interval']:
+                break
+            # Задержка реплики - не больше интервала плюс время копирования
+            deadline = started + options['interval']
+            while not self.stopping and time.monotonic() < deadline:
+                time.sleep(min(0.5, max(0, deadline - time.monotonic())))
+
+    def stop(self, signum, frame):
+        self.stopping = True
@@ -0,0 +1,324 @@
+"""Метрики запросов по маршрутам в формате Prometheus.
+
+``MetricsMiddleware`` замеряет время ответа, число и время SQL-запросов, время
+отрисовки шаблонов и размер ответа и копит их в памяти процесса. Раз в
+``METRICS_FLUSH_INTERVAL`` секунд накопленное прибавляется к значениям в общем
+SQLite-файле ``METRICS_PATH``, поэтому ``/metrics`` показывает сумму по всем
+процессам сервера, а не только по тому, что ответил на запрос.
+"""
+import atexit
+import contextvars
+import hmac
+import os
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+from dataclasses import dataclass
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.template.backends.django import DjangoTemplates, Template
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+SIZE_BUCKETS = (1_000, 10_000, 100_000, 1_000_000, 10_000_000, 100_000_000)
+
+# Имя, тип, описание и границы корзин (для гистограмм)
+FAMILIES = {
+    'django_http_requests_total': ('counter', 'Запросы по маршруту, методу и классу ответа.', None),
+    'django_http_request_duration_seconds': ('histogram', 'Время ответа представления.', LATENCY_BUCKETS),
+    'django_http_request_db_queries': ('histogram', 'SQL-запросов на один запрос.', QUERY_BUCKETS),
+    'django_http_db_duration_seconds_total': ('counter', 'Суммарное время SQL-запросов.', None),
+    'django_http_template_duration_seconds_total': ('counter', 'Суммарное время отрисовки шаблонов.', None),
+    'django_http_response_size_bytes': ('histogram', 'Размер тела ответа.', SIZE_BUCKETS),
+}
+
+METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+
+
+def _number(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+# Подписи корзин считаются один раз: на каждый запрос - только bisect
+BUCKET_LABELS = {
+    name: [_number(bound) for bound in buckets] + ['+Inf']
+    for name, (kind, _, buckets) in FAMILIES.items() if kind == 'histogram'
+}
+
+
+def get_flush_interval():
+    return getattr(settings, 'METRICS_FLUSH_INTERVAL', 5)
+
+
+def get_metrics_path():
+    return Path(getattr(settings, 'METRICS_PATH', Path(settings.BASE_DIR) / 'cache' / 'metrics.sqlite3'))
+
+
+# --- Замеры одного запроса ---
+
+@dataclass
+class RequestStats:
+    queries: int = 0
+    db_time: float = 0.0
+    template_time: float = 0.0
+    template_depth: int = 0
+
+
+# Замеры текущего запроса. Контекстная переменная переходит и в потоки
+# sync_to_async, поэтому запросы async-представлений тоже учитываются
+_current = contextvars.ContextVar('metrics_request', default=None)
+
+
+def _record_query(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.db_time += time.perf_counter() - started
+
+
+@receiver(connection_created)
+def install_query_timer(sender, connection, **kwargs):
+    # То же, что connection.execute_wrapper(), но на всё время жизни соединения:
+    # соединения живут в разных потоках, и обернуть их на время запроса нельзя
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _record_query)
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        stats = _current.get()
+        # Вложенная отрисовка уже учтена во внешней
+        if stats is None or stats.template_depth:
+            return super().render(context, request)
+        stats.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            stats.template_time += time.perf_counter() - started
+            stats.template_depth -= 1
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """Бэкенд шаблонов Django, который засекает время отрисовки для метрик."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name).template, self)
+
+
+# --- Накопление в процессе и общий файл ---
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = {}
+        self.pid = os.getpid()
+        self.flushed_at = time.monotonic()
+        self.db = None
+
+    def _add(self, key, amount):
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def _observe(self, name, labels, value):
+        buckets = FAMILIES[name][2]
+        le = BUCKET_LABELS[name][bisect_left(buckets, value)]
+        self._add((name + '_bucket', labels, le), 1)
+        self._add((name + '_sum', labels, ''), value)
+
+    def observe_request(self, view, method, status, duration, stats, size):
+        labels = f'view="{view}"'
+        with self.lock:
+            self._add(('django_http_requests_total', f'{labels},method="{method}",status="{status}"', ''), 1)
+            self._observe('django_http_request_duration_seconds', labels, duration)
+            self._observe('django_http_request_db_queries', labels, stats.queries)
+            self._add(('django_http_db_duration_seconds_total', labels, ''), stats.db_time)
+            self._add(('django_http_template_duration_seconds_total', labels, ''), stats.template_time)
+            if size is not None:
+                self._observe('django_http_response_size_bytes', labels, size)
+
+    def _connect(self):
+        path = get_metrics_path()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        db = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+        db.execute('PRAGMA journal_mode=WAL')
+        db.execute('CREATE TABLE IF NOT EXISTS samples ('
+                   'name TEXT NOT NULL, labels TEXT NOT NULL, le TEXT NOT NULL, value REAL NOT NULL, '
+                   'PRIMARY KEY (name, labels, le))')
+        return db
+
+    def due(self):
+        return time.monotonic() - self.flushed_at >= get_flush_interval()
+
+    def flush(self):
+        with self.lock:
+            if self.pid != os.getpid():
+                # Процесс-потомок (fork после загрузки приложения) начинает с нуля
+                self.pid, self.values, self.db = os.getpid(), {}, None
+            values, self.values = self.values, {}
+            self.flushed_at = time.monotonic()
+            if not values:
+                return
+            try:
+                if self.db is None:
+                    self.db = self._connect()
+                with self.db:
+                    self.db.execute('BEGIN IMMEDIATE')
+                    self.db.executemany(
+                        'INSERT INTO samples (name, labels, le, value) VALUES (?, ?, ?, ?) '
+                        'ON CONFLICT (name, labels, le) DO UPDATE SET value = value + excluded.value',
+                        [(*key, amount) for key, amount in values.items()],
+                    )
+            except sqlite3.Error:
+                # Файл занят или недоступен - значения останутся до следующей попытки
+                for key, amount in values.items():
+                    self._add(key, amount)
+
+    def samples(self):
+        self.flush()
+        with self.lock:
+            if self.db is None:
+                self.db = self._connect()
+            return self.db.execute('SELECT name, labels, le, value FROM samples').fetchall()
+
+
+registry = Registry()
+atexit.register(registry.flush)
+
+
+def scrape_allowed(request):
+    """Можно ли отдать /metrics без входа: адрес в METRICS_ALLOWED_IPS или верный METRICS_TOKEN."""
+    if request.META.get('REMOTE_ADDR') in getattr(settings, 'METRICS_ALLOWED_IPS', ()):
+        return True
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    # Prometheus передаёт его заголовком Authorization: Bearer <токен>
+    return bool(token) and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+
+
+def render_metrics():
+    """Все метрики из общего файла в текстовом формате Prometheus."""
+    rows = {}
+    for name, labels, le, value in registry.samples():
+        rows.setdefault(name, {}).setdefault(labels, {})[le] = value
+
+    lines = []
+    for family, (kind, help_text, _) in FAMILIES.items():
+        lines.append(f'# HELP {family} {help_text}')
+        lines.append(f'# TYPE {family} {kind}')
+        if kind != 'histogram':
+            for labels, values in sorted(rows.get(family, {}).items()):
+                lines.append(f'{family}{{{labels}}} {_number(values[""])}')
+            continue
+        sums = rows.get(family + '_sum', {})
+        # В файле лежат количества по корзинам; Prometheus ждёт накопленные
+        for labels, buckets in sorted(rows.get(family + '_bucket', {}).items()):
+            total = 0
+            for le in BUCKET_LABELS[family]:
+                total += buckets.get(le, 0)
+                lines.append(f'{family}_bucket{{{labels},le="{le}"}} {_number(total)}')
+            lines.append(f'{family}_sum{{{labels}}} {_number(sums.get(labels, {}).get("", 0))}')
+            lines.append(f'{family}_count{{{labels}}} {_number(total)}')
+    return '\n'.join(lines) + '\n'
+
+
+# --- Middleware ---
+
+def _view_label(request):
+    match = getattr(request, 'resolver_match', None)
+    # Без маршрута (404) - одна общая метка, чтобы случайные адреса не плодили ряды
+    name = match.view_name if match is not None else '<unmatched>'
+    return name.replace('\\', '\\\\').replace('"', '\\"')
+
+
+def _record(request, response, stats, duration, size):
+    view = _view_label(request)
+    method = request.method if request.method in METHODS else 'other'
+    status = f'{response.status_code // 100}xx'
+    registry.observe_request(view, method, status, duration, stats, size)
+    if registry.due():
+        registry.flush()
+
+
+def _counted(chunks, request, response, stats, started):
+    # Потоковый ответ ходит в базу и отрисовывает шаблоны уже после выхода из
+    # представления: замеры запроса продолжаются, пока отдаётся тело, а сам запрос
+    # учитывается, когда тело отдано целиком или клиент отключился
+    chunks = iter(chunks)
+    done = object()
+    size = 0
+    try:
+        while True:
+            token = _current.set(stats)
+            try:
+                chunk = next(chunks, done)
+            finally:
+                _current.reset(token)
+            if chunk is done:
+                return
+            size += len(chunk)
+            yield chunk
+    finally:
+        _record(request, response, stats, time.perf_counter() - started, size)
+
+
+def _finish(request, response, stats, started):
+    if not response.streaming:
+        _record(request, response, stats, time.perf_counter() - started, len(response.content))
+    elif getattr(response, 'file_to_stream', None) is not None:
+        # Готовый файл (FileResponse): база при отдаче не нужна, а обёртка
+        # отключила бы wsgi.file_wrapper
+        size = int(response['Content-Length']) if response.has_header('Content-Length') else None
+        _record(request, response, stats, time.perf_counter() - started, size)
+    else:
+        response.streaming_content = _counted(response.streaming_content, request, response, stats, started)
+    return response
+
+
+class MetricsMiddleware:
+    """Замеряет каждый запрос; ставится первым в MIDDLEWARE, чтобы учесть и остальные."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'METRICS_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return _finish(request, response, stats, started)
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return _finish(request, response, stats, started)
@@ -0,0 +1,41 @@
+# Generated by Django 3.2.25 on 2026-10-17 19:20
+
+from django.db import migrations, models
+from django.db.models import Max, OuterRef, Subquery
+import django.db.models.deletion
+
+# Задач в одном UPDATE при заполнении отдела
+BATCH_SIZE = 1000
+
+
+def fill_task_departments(apps, schema_editor):
+    # Существующие задачи получают отдел автора, иначе они пропадут из выборок по отделу.
+    # То же делает команда backfill_task_departments
+    Task = apps.get_model('main', 'Task')
+    User = apps.get_model('main', 'User')
+    last_id = Task.objects.aggregate(last=Max('id'))['last'] or 0
+    author_department = User.objects.filter(pk=OuterRef('author_id')).values('department_id')[:1]
+    for start in range(0, last_id + 1, BATCH_SIZE):
+        (Task.objects
+         .filter(pk__gte=start, pk__lt=start + BATCH_SIZE, department__isnull=True)
+         .update(department_id=Subquery(author_department)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0006_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='department',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='tasks', to='main.department', verbose_name='Отдел'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['department', '-created_at', '-id'], name='task_department_created_idx'),
+        ),
+        migrations.RunPython(fill_task_departments, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 3.2.25 on 2026-10-17 19:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0008_content_addressed_uploads'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blob',
+            name='preview',
+            field=models.FileField(blank=True, max_length=255, upload_to='', verbose_name='Превью'),
+        ),
+        migrations.AddField(
+            model_name='blob',
+            name='preview_status',
+            field=models.CharField(choices=[('pending', 'Ожидает'), ('processing', 'Строится'), ('ready', 'Готово'), ('unsupported', 'Не поддерживается'), ('failed', 'Ошибка')], default='pending', max_length=20, verbose_name='Статус превью'),
+        ),
+        migrations.AddField(
+            model_name='blob',
+            name='thumbnail',
+            field=models.FileField(blank=True, max_length=255, upload_to='', verbose_name='Миниатюра'),
+        ),
+    ]
@@ -0,0 +1,79 @@
+from django.db import migrations, models
+
+# Источники индекса: (вид, таблица, колонка заголовка, колонка текста).
+# Вид записи хранится в rowid: rowid = id * 4 + вид
+SOURCES = [
+    (1, 'main_task', 'title', 'description'),
+    (2, 'main_request', 'title', 'justification'),
+    (3, 'main_comment', None, 'text'),
+]
+
+
+def _values(prefix, title, body):
+    return f"{prefix}.{title}" if title else "''", f"{prefix}.{body}"
+
+
+def index_statements():
+    # Индекс без собственной копии текста (content=''): при миллионах комментариев
+    # он не удваивает размер базы. Удаление из такого индекса требует прежних
+    # значений колонок - триггеры берут их из old.*
+    yield ("CREATE VIRTUAL TABLE main_search USING fts5("
+           "title, body, content='', prefix='2 3', tokenize='unicode61 remove_diacritics 2')")
+    # Совпадение в заголовке весит больше, чем в тексте
+    yield "INSERT INTO main_search(main_search, rank) VALUES('rank', 'bm25(10.0, 1.0)')"
+    for kind, table, title, body in SOURCES:
+        new_title, new_body = _values('new', title, body)
+        old_title, old_body = _values('old', title, body)
+        insert = (f"INSERT INTO main_search(rowid, title, body) "
+                  f"VALUES (new.id * 4 + {kind}, {new_title}, {new_body});")
+        delete = (f"INSERT INTO main_search(main_search, rowid, title, body) "
+                  f"VALUES ('delete', old.id * 4 + {kind}, {old_title}, {old_body});")
+        columns = ', '.join(column for column in (title, body) if column)
+        yield f"CREATE TRIGGER {table}_search_insert AFTER INSERT ON {table} BEGIN {insert} END"
+        yield f"CREATE TRIGGER {table}_search_delete AFTER DELETE ON {table} BEGIN {delete} END"
+        # Триггер срабатывает только на изменение индексируемых колонок, смена статуса его не задевает
+        yield (f"CREATE TRIGGER {table}_search_update AFTER UPDATE OF {columns} ON {table} "
+               f"BEGIN {delete} {insert} END")
+        title_sql, body_sql = _values(table, title, body)
+        yield (f"INSERT INTO main_search(rowid, title, body) "
+               f"SELECT {table}.id * 4 + {kind}, {title_sql}, {body_sql} FROM {table}")
+
+
+def create_search_index(apps, schema_editor):
+    # FTS5 есть только в SQLite; на других СУБД поиск нужно строить их средствами
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in index_statements():
+        schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for _, table, _, _ in SOURCES:
+        for action in ('insert', 'delete', 'update'):
+            schema_editor.execute(f'DROP TRIGGER IF EXISTS {table}_search_{action}')
+    schema_editor.execute('DROP TABLE IF EXISTS main_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0011_task_events'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchEntry',
+            fields=[
+                ('id', models.BigIntegerField(db_column='rowid', primary_key=True, serialize=False)),
+                ('title', models.TextField()),
+                ('body', models.TextField()),
+            ],
+            options={
+                'db_table': 'main_search',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -1,4 +1,7 @@
+import uuid
+
 from django.db import models
+from django.db.models import BooleanField, ExpressionWrapper, Q
 from django.contrib.auth.models import AbstractUser, Group, Permission
 from django.conf import settings
 
@@ -52,6 +55,44 @@ class User(AbstractUser):
     def __str__(self):
         return self.get_full_name() or self.username
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Запоминаем значения из БД, чтобы сигналы могли заметить смену отдела
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+def _as_flag(condition):
+    return ExpressionWrapper(condition, output_field=BooleanField())
+
+
+class TaskQuerySet(models.QuerySet):
+    # Правила доступа к задачам, выраженные в SQL
+
+    @staticmethod
+    def visible_q(user):
+        # Задачу видят автор, исполнитель и руководитель отдела, к которому она относится
+        condition = Q(author_id=user.pk) | Q(assignee_id=user.pk)
+        if user.is_staff and user.department_id:
+            condition |= Q(department_id=user.department_id)
+        return condition
+
+    def visible_to(self, user):
+        return self.filter(self.visible_q(user))
+
+    def editable_by(self, user):
+        # Редактировать и удалять задачу может только автор
+        return self.filter(author_id=user.pk)
+
+    def with_access(self, user):
+        # Вердикт о правах вычисляется в том же запросе, что и сама задача
+        return self.annotate(
+            can_view=_as_flag(self.visible_q(user)),
+            can_edit=_as_flag(Q(author_id=user.pk)),
+            can_change_status=_as_flag(Q(assignee_id=user.pk)),
+        )
+
+
 class Task(models.Model):
     class Status(models.TextChoices):
         NEW = 'new', 'Новая'
@@ -83,18 +124,79 @@ class Task(models.Model):
                                on_delete=models.CASCADE,
                                related_name='assigned_tasks',
                                verbose_name='Исполнитель')
+    # Отдел автора, скопированный в задачу, чтобы выборки по отделу не шли через User.
+    # Заполняется при создании и следует за автором при смене им отдела (см. signals.py)
+    department = models.ForeignKey(Department,
+                                   on_delete=models.SET_NULL,
+                                   null=True,
+                                   blank=True,
+                                   db_index=False,  # покрывается индексом task_department_created_idx
+                                   related_name='tasks',
+                                   verbose_name='Отдел')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата обновления')
 
+    objects = TaskQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Задача'
         verbose_name_plural = 'Задачи'
         ordering = ['-created_at']  # Сортировка по умолчанию - сначала новые
+        indexes = [
+            # Канбан на главной: задачи исполнителя по статусу, сначала новые
+            models.Index(fields=['assignee', 'status', '-created_at', '-id'], name='task_assignee_status_idx'),
+            # Лента и статистика задач отдела
+            models.Index(fields=['department', '-created_at', '-id'], name='task_department_created_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Запоминаем значения из БД, чтобы при сохранении видеть, что изменилось
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def save(self, *args, **kwargs):
+        loaded_author_id = getattr(self, '_loaded_values', {}).get('author_id')
+        author_changed = not self._state.adding and loaded_author_id not in (None, self.author_id)
+        if (self._state.adding and self.department_id is None) or author_changed:
+            self.department_id = self.author.department_id
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and 'department' not in update_fields:
+                kwargs['update_fields'] = list(update_fields) + ['department']
+        super().save(*args, **kwargs)
+
+class RequestQuerySet(models.QuerySet):
+    # Правила доступа к заявкам, выраженные в SQL
+
+    @staticmethod
+    def editable_q(user):
+        # Удалить заявку может автор или руководитель отдела-исполнителя
+        condition = Q(requester_id=user.pk)
+        if user.is_staff:
+            condition |= Q(department__leader_id=user.pk)
+        return condition
+
+    @classmethod
+    def visible_q(cls, user):
+        return cls.editable_q(user) | Q(assignee_id=user.pk)
+
+    def visible_to(self, user):
+        return self.filter(self.visible_q(user))
+
+    def editable_by(self, user):
+        return self.filter(self.editable_q(user))
+
+    def with_access(self, user):
+        return self.annotate(
+            can_view=_as_flag(self.visible_q(user)),
+            can_edit=_as_flag(self.editable_q(user)),
+        )
+
+
 class Request(models.Model):
     class RequestType(models.TextChoices):
         HARDWARE = 'hw', 'Оборудование'
@@ -144,15 +246,30 @@ class Request(models.Model):
                                  related_name='assigned_requests')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
 
+    objects = RequestQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Заявка'
         verbose_name_plural = 'Заявки'
         ordering = ['-created_at']
+        indexes = [
+            # Кабинет руководителя: новые заявки, назначенные руководителю
+            models.Index(fields=['assignee', 'status', '-created_at'], name='request_assignee_status_idx'),
+            # Список «Мои заявки»
+            models.Index(fields=['requester', '-created_at'], name='request_requester_idx'),
+        ]
 
     def __str__(self):
         # Также исправим отображение, чтобы было информативно
         return f'Заявка №{self.pk} на {self.title}'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Прежний исполнитель нужен, чтобы сбросить и его кэш дашборда
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
 class Comment(models.Model):
     task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='comments', verbose_name='Задача')
     author = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, verbose_name='Автор')
@@ -161,12 +278,129 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['task', 'created_at'], name='comment_task_created_idx'),
+        ]
+
+class Blob(models.Model):
+    # Содержимое файла, адресуемое по SHA-256: одинаковые файлы хранятся один раз,
+    # а на один Blob могут ссылаться несколько вложений
+    class PreviewStatus(models.TextChoices):
+        PENDING = 'pending', 'Ожидает'
+        PROCESSING = 'processing', 'Строится'
+        READY = 'ready', 'Готово'
+        UNSUPPORTED = 'unsupported', 'Не поддерживается'
+        FAILED = 'failed', 'Ошибка'
+
+    sha256 = models.CharField(max_length=64, unique=True, verbose_name='SHA-256')
+    size = models.BigIntegerField(verbose_name='Размер')
+    file = models.FileField(max_length=255, verbose_name='Файл')
+    # Миниатюра и превью (для PDF - первая страница) лежат рядом с файлом
+    thumbnail = models.FileField(max_length=255, blank=True, verbose_name='Миниатюра')
+    preview = models.FileField(max_length=255, blank=True, verbose_name='Превью')
+    preview_status = models.CharField(max_length=20, choices=PreviewStatus.choices,
+                                      default=PreviewStatus.PENDING, verbose_name='Статус превью')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Содержимое файла'
+        verbose_name_plural = 'Содержимое файлов'
+
+    def __str__(self):
+        return self.sha256
 
 class Attachment(models.Model):
     task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='attachments')
     author = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
-    file = models.FileField(upload_to='attachments/%Y/%m/%d/')
+    file = models.FileField(upload_to='attachments/%Y/%m/%d/', max_length=255)
+    blob = models.ForeignKey(Blob, on_delete=models.PROTECT, null=True, blank=True, related_name='attachments')
+    name = models.CharField(max_length=255, blank=True, verbose_name='Имя файла')
     uploaded_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
-        return self.file.name
\ No newline at end of file
+        return self.name or self.file.name
+
+class UploadSession(models.Model):
+    # Незавершённая загрузка файла по частям; части дописываются во временный файл
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='upload_sessions')
+    author = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    filename = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    received = models.BigIntegerField(default=0)
+    # Когда запрос занял смещение received и пишет часть; None - никто не пишет
+    writing_since = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.filename} ({self.received}/{self.size})'
+
+
+class Job(models.Model):
+    # Фоновое задание: строка таблицы и есть очередь, внешний брокер не нужен
+    class Status(models.TextChoices):
+        QUEUED = 'queued', 'В очереди'
+        RUNNING = 'running', 'Выполняется'
+        DONE = 'done', 'Выполнено'
+        FAILED = 'failed', 'Ошибка'
+
+    name = models.CharField(max_length=200, verbose_name='Задание')
+    kwargs = models.JSONField(default=dict, blank=True, verbose_name='Аргументы')
+    # Чем больше число, тем раньше задание будет взято в работу
+    priority = models.SmallIntegerField(default=0, verbose_name='Приоритет')
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.QUEUED, verbose_name='Статус')
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name='Попыток')
+    max_attempts = models.PositiveSmallIntegerField(default=5, verbose_name='Максимум попыток')
+    run_at = models.DateTimeField(verbose_name='Запустить не раньше')
+    locked_by = models.CharField(max_length=100, blank=True, verbose_name='Обработчик')
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, verbose_name='Последняя ошибка')
+    duration_ms = models.PositiveIntegerField(null=True, blank=True, verbose_name='Длительность, мс')
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Фоновое задание'
+        verbose_name_plural = 'Фоновые задания'
+        indexes = [
+            # Выбор следующих заданий: статус, приоритет, время запуска
+            models.Index(fields=['status', '-priority', 'run_at', 'id'], name='job_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.name} #{self.pk} ({self.status})'
+
+class TaskEvent(models.Model):
+    # Журнал изменений задач для живого обновления страниц (SSE и long-poll).
+    # Хранит прежние и новые значения, чтобы клиент мог убрать карточку из старой
+    # колонки или отдела; ссылок на задачу нет - событие переживает её удаление
+    class Kind(models.TextChoices):
+        CREATED = 'created', 'Создана'
+        UPDATED = 'updated', 'Изменена'
+        DELETED = 'deleted', 'Удалена'
+
+    task_id = models.BigIntegerField()
+    kind = models.CharField(max_length=10, choices=Kind.choices)
+    status = models.CharField(max_length=20)
+    previous_status = models.CharField(max_length=20, blank=True)
+    assignee_id = models.BigIntegerField(null=True)
+    previous_assignee_id = models.BigIntegerField(null=True)
+    department_id = models.BigIntegerField(null=True)
+    previous_department_id = models.BigIntegerField(null=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f'#{self.pk} {self.kind} task={self.task_id}'
+
+class SearchEntry(models.Model):
+    # Запись полнотекстового индекса - виртуальная таблица FTS5, которую ведут триггеры
+    # SQLite (миграция 0012). Текст в ней не хранится, а вид и id исходной записи
+    # закодированы в rowid: rowid = id * 4 + вид (см. main/search.py)
+    id = models.BigIntegerField(primary_key=True, db_column='rowid')
+    title = models.TextField()
+    body = models.TextField()
+
+    class Meta:
+        managed = False
+        db_table = 'main_search'
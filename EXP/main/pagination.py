@@ -0,0 +1,63 @@
+import base64
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+@dataclass
+class KeysetPage:
+    items: list = field(default_factory=list)
+    next_cursor: str = None
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+def encode_cursor(value, pk):
+    raw = f'{value.isoformat()}|{pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        value, pk = raw.rsplit('|', 1)
+        return datetime.fromisoformat(value), int(pk)
+    except (ValueError, UnicodeDecodeError) as exc:
+        raise InvalidCursor('Некорректный курсор') from exc
+
+
+def keyset_paginate(queryset, cursor=None, per_page=25, field='created_at', descending=True):
+    """Постраничная выборка по ключу (``field``, ``id``) без OFFSET.
+
+    Следующая страница начинается строго после последней строки предыдущей,
+    поэтому глубокие страницы стоят столько же, сколько первая.
+    """
+    if descending:
+        queryset = queryset.order_by(f'-{field}', '-id')
+        op = 'lt'
+    else:
+        queryset = queryset.order_by(field, 'id')
+        op = 'gt'
+
+    if cursor:
+        value, pk = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(**{f'{field}__{op}': value}) | Q(**{field: value, f'id__{op}': pk})
+        )
+
+    # Берём на одну строку больше, чтобы узнать, есть ли следующая страница
+    items = list(queryset[:per_page + 1])
+    next_cursor = None
+    if len(items) > per_page:
+        items = items[:per_page]
+        last = items[-1]
+        next_cursor = encode_cursor(getattr(last, field), last.pk)
+    return KeysetPage(items=items, next_cursor=next_cursor)
@@ -0,0 +1,134 @@
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+
+from django.core.files.storage import default_storage
+
+from .jobs import job
+from .models import Blob
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow не обязателен: без него превью строятся только для PDF
+    Image = ImageOps = None
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp', '.tif', '.tiff'}
+PDF_EXTENSIONS = {'.pdf'}
+
+# Длинная сторона миниатюры в списке вложений и превью по клику
+THUMBNAIL_SIZE = 320
+PREVIEW_SIZE = 1200
+
+
+def preview_kind(filename):
+    ext = os.path.splitext(filename)[1].lower()
+    if ext in PDF_EXTENSIONS and shutil.which('pdftoppm'):
+        return 'pdf'
+    if ext in IMAGE_EXTENSIONS and Image is not None:
+        return 'image'
+    return None
+
+
+def _save_jpeg(image, path, size):
+    image = image.copy()
+    image.thumbnail((size, size))
+    if image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    image.save(path, 'JPEG', quality=80, optimize=True)
+
+
+def _pdftoppm(source, target, size):
+    # pdftoppm сам добавляет расширение .png к имени выходного файла
+    subprocess.run(
+        ['pdftoppm', '-png', '-f', '1', '-l', '1', '-singlefile', '-scale-to', str(size), source, target],
+        check=True, capture_output=True, timeout=60,
+    )
+    return target + '.png'
+
+
+def render_previews(source, thumbnail_path, preview_path, kind):
+    """Строит миниатюру и превью файла ``source``.
+
+    Функция не обращается к БД: на вход - пути к файлам, результат - записанные файлы.
+    """
+    if kind == 'pdf':
+        with tempfile.TemporaryDirectory() as tmp:
+            page = _pdftoppm(source, os.path.join(tmp, 'page'), PREVIEW_SIZE)
+            if Image is None:
+                shutil.move(page, preview_path)
+                shutil.move(_pdftoppm(source, os.path.join(tmp, 'thumb'), THUMBNAIL_SIZE), thumbnail_path)
+                return
+            with Image.open(page) as image:
+                _save_jpeg(image, preview_path, PREVIEW_SIZE)
+                _save_jpeg(image, thumbnail_path, THUMBNAIL_SIZE)
+        return
+
+    with Image.open(source) as image:
+        # Для больших JPEG декодируем сразу в уменьшенном размере
+        image.draft('RGB', (PREVIEW_SIZE, PREVIEW_SIZE))
+        image = ImageOps.exif_transpose(image)
+        _save_jpeg(image, preview_path, PREVIEW_SIZE)
+        _save_jpeg(image, thumbnail_path, THUMBNAIL_SIZE)
+
+
+def preview_names(blob, kind):
+    # Файлы превью лежат рядом с оригиналом: blobs/ab/cd/<sha256>.thumb.jpg
+    base = os.path.splitext(blob.file.name)[0]
+    ext = '.png' if kind == 'pdf' and Image is None else '.jpg'
+    return f'{base}.thumb{ext}', f'{base}.preview{ext}'
+
+
+def _finish(blob_id, thumbnail, preview, error=None):
+    if error is not None:
+        logger.warning('Не удалось построить превью для blob %s: %s', blob_id, error)
+        Blob.objects.filter(pk=blob_id).update(preview_status=Blob.PreviewStatus.FAILED)
+    else:
+        Blob.objects.filter(pk=blob_id).update(
+            thumbnail=thumbnail, preview=preview, preview_status=Blob.PreviewStatus.READY,
+        )
+
+
+def _previews_failed(blob_id):
+    # Задание не выполнено до конца (например, упал процесс обработчика): без этого
+    # Blob остался бы «в работе», а страница задачи - с надписью «превью готовится»
+    (Blob.objects
+     .filter(pk=blob_id, preview_status__in=[Blob.PreviewStatus.PENDING, Blob.PreviewStatus.PROCESSING])
+     .update(preview_status=Blob.PreviewStatus.FAILED))
+
+
+@job(priority=-10, max_attempts=1, atomic=False, on_failure=_previews_failed)
+def generate_previews(blob_id):
+    """Строит превью для Blob ``blob_id`` в фоновом обработчике.
+
+    Картинки и PDF рендерятся в процессе runworker, а не в веб-воркере; статус
+    и пути к файлам записываются в Blob. Если превью уже строится или готово,
+    ничего не делает.
+    """
+    # Захватываем Blob условным UPDATE, чтобы одно содержимое не рендерилось дважды
+    claimed = (Blob.objects
+               .filter(pk=blob_id, preview_status=Blob.PreviewStatus.PENDING)
+               .update(preview_status=Blob.PreviewStatus.PROCESSING))
+    if not claimed:
+        return
+    blob = Blob.objects.only('id', 'file').get(pk=blob_id)
+    kind = preview_kind(blob.file.name)
+    if kind is None:
+        Blob.objects.filter(pk=blob_id).update(preview_status=Blob.PreviewStatus.UNSUPPORTED)
+        return
+    thumbnail, preview = preview_names(blob, kind)
+    try:
+        render_previews(
+            default_storage.path(blob.file.name),
+            default_storage.path(thumbnail),
+            default_storage.path(preview),
+            kind,
+        )
+    except Exception as error:
+        # Битый файл не станет целым при повторе, поэтому ошибка фиксируется сразу
+        _finish(blob_id, thumbnail, preview, error)
+    else:
+        _finish(blob_id, thumbnail, preview)
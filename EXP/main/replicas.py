@@ -0,0 +1,153 @@
+"""Чтение из реплики базы для страниц, которые только показывают данные.
+
+Представления с ``@replica_reads`` при GET/HEAD читают из базы
+``REPLICA_DATABASE``; всё остальное (запись, сессии, вход) идёт в основную.
+После изменяющего запроса ``ReplicaPinMiddleware`` ставит cookie, и следующие
+``REPLICA_PIN_SECONDS`` секунд пользователь читает из основной базы - реплика
+догоняет её с задержкой, а свои изменения он должен видеть сразу.
+"""
+import contextvars
+import sqlite3
+from contextlib import contextmanager
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS
+
+PIN_COOKIE = 'db_primary'
+SAFE_METHODS = ('GET', 'HEAD')
+
+# Откуда читает текущий запрос; None - из основной базы
+_read_alias = contextvars.ContextVar('replica_read_alias', default=None)
+
+
+def get_replica():
+    # Псевдоним реплики или None, если она не настроена (DATABASE_REPLICA_PATH)
+    alias = getattr(settings, 'REPLICA_DATABASE', 'replica')
+    return alias if alias in settings.DATABASES else None
+
+
+def get_pin_seconds():
+    return getattr(settings, 'REPLICA_PIN_SECONDS', 15)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # В реплике те же строки, что и в основной базе
+        if {obj1._state.db, obj2._state.db} <= {DEFAULT_DB_ALIAS, get_replica()}:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Схема попадает в реплику вместе с данными при sync_replica
+        return False if db == get_replica() else None
+
+
+@contextmanager
+def primary():
+    """Чтение внутри блока идёт в основную базу: например, то, что кладётся в общий кэш."""
+    token = _read_alias.set(None)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+def _alias_for(request):
+    replica = get_replica()
+    if replica is None or request.method not in SAFE_METHODS or PIN_COOKIE in request.COOKIES:
+        return None
+    return replica
+
+
+def _read_from(alias, chunks):
+    # Потоковый ответ читает из базы уже после выхода из представления
+    chunks = iter(chunks)
+    done = object()
+    while True:
+        token = _read_alias.set(alias)
+        try:
+            chunk = next(chunks, done)
+        finally:
+            _read_alias.reset(token)
+        if chunk is done:
+            return
+        yield chunk
+
+
+def replica_reads(view):
+    """GET/HEAD-запросы к представлению читают из реплики, если она настроена."""
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            # Контекст переходит и в потоки in_db_thread()
+            token = _read_alias.set(_alias_for(request))
+            try:
+                return await view(request, *args, **kwargs)
+            finally:
+                _read_alias.reset(token)
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        alias = _alias_for(request)
+        token = _read_alias.set(alias)
+        try:
+            response = view(request, *args, **kwargs)
+        finally:
+            _read_alias.reset(token)
+        if alias is not None and response.streaming:
+            response.streaming_content = _read_from(alias, response.streaming_content)
+        return response
+    return wrapper
+
+
+class ReplicaPinMiddleware:
+    """После изменяющего запроса закрепляет пользователя за основной базой."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if get_replica() is None:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def pin(self, request, response):
+        if request.method not in SAFE_METHODS:
+            response.set_cookie(PIN_COOKIE, '1', max_age=get_pin_seconds(), httponly=True, samesite='Lax')
+        return response
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        return self.pin(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.pin(request, await self.get_response(request))
+
+
+def copy_database(source, target):
+    """Копирует SQLite-базу source в target через backup API.
+
+    Копия делается за один шаг из согласованного снимка source; читатели target
+    видят либо прежнее, либо новое содержимое целиком.
+    """
+    source_db = sqlite3.connect(source, timeout=30)
+    target_db = sqlite3.connect(target, timeout=30)
+    try:
+        source_db.backup(target_db)
+    finally:
+        target_db.close()
+        source_db.close()
@@ -0,0 +1,58 @@
+from collections import namedtuple
+
+from django.conf import settings
+
+from .dashboard_cache import get_cache
+from .models import User
+from .replicas import primary
+
+RosterEntry = namedtuple('RosterEntry', 'pk name email')
+
+# Поля пользователя, изменение которых меняет состав или вид списка сотрудников
+ROSTER_FIELDS = ('department_id', 'first_name', 'last_name', 'username', 'email', 'is_active')
+
+
+def _roster_key(department_id):
+    return f'roster:{department_id}'
+
+
+def department_roster(department_id):
+    """Компактный список активных сотрудников отдела (pk, имя, email) из кэша."""
+    if not department_id:
+        return []
+    cache = get_cache()
+    key = _roster_key(department_id)
+    roster = cache.get(key)
+    if roster is None:
+        # Список попадает в общий кэш - читаем его из основной базы, а не из реплики
+        with primary():
+            users = list(User.objects
+                         .filter(department_id=department_id, is_active=True)
+                         .only('id', 'username', 'first_name', 'last_name', 'email')
+                         .order_by('id'))
+        roster = [RosterEntry(user.pk, str(user), user.email) for user in users]
+        cache.set(key, roster, getattr(settings, 'ROSTER_CACHE_TIMEOUT', 24 * 60 * 60))
+    return roster
+
+
+def invalidate_rosters(department_ids):
+    get_cache().delete_many([_roster_key(pk) for pk in set(department_ids) if pk])
+
+
+def roster_changed(user):
+    # Отделы, чей список сотрудников устарел после сохранения пользователя
+    loaded = getattr(user, '_loaded_values', {})
+    changed = any(field in loaded and loaded[field] != getattr(user, field) for field in ROSTER_FIELDS)
+    if not changed:
+        return set()
+    return {loaded.get('department_id'), user.department_id}
+
+
+def limit_assignee_choices(field, user):
+    # Исполнитель - активный сотрудник отдела пользователя. Варианты для <select>
+    # берутся из кэша, а запрос к БД выполняется только при проверке отправленной формы
+    field.queryset = User.objects.filter(department_id=user.department_id, is_active=True)
+    if user.department_id:
+        field.choices = [('', field.empty_label)] + [
+            (entry.pk, entry.name) for entry in department_roster(user.department_id)
+        ]
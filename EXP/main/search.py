@@ -0,0 +1,163 @@
+import re
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import BooleanField, Exists, F, OuterRef, Q
+from django.db.models.expressions import RawSQL
+
+from .models import Comment, Request, SearchEntry, Task
+
+# Вид записи индекса - остаток от деления rowid на 4, id исходной записи - частное
+KIND_TASK, KIND_REQUEST, KIND_COMMENT = 1, 2, 3
+KIND_NAMES = {KIND_TASK: 'task', KIND_REQUEST: 'request', KIND_COMMENT: 'comment'}
+
+# Откуда индекс берёт текст: модель, поле заголовка и поле текста
+SOURCES = {
+    KIND_TASK: (Task, 'title', 'description'),
+    KIND_REQUEST: (Request, 'title', 'justification'),
+    KIND_COMMENT: (Comment, None, 'text'),
+}
+
+# Не больше стольких слов из строки поиска
+MAX_TERMS = 8
+
+# Слова короче ищутся целиком: префикс из одной буквы перебирает почти весь словарь
+# индекса, а для префиксов из 2-3 букв в таблице есть отдельные индексы
+MIN_PREFIX = 2
+
+TERM_RE = re.compile(r'\w+')
+
+
+def get_page_size():
+    return getattr(settings, 'SEARCH_PAGE_SIZE', 20)
+
+
+def build_match(text):
+    """Превращает строку пользователя в запрос FTS5: все слова, каждое как префикс.
+
+    Кавычки и операторы FTS5 из ввода не попадают в запрос, поэтому любая
+    строка даёт корректный запрос, а не ошибку синтаксиса.
+    """
+    terms = TERM_RE.findall(text.lower())[:MAX_TERMS]
+    return ' '.join(f'"{term}"*' if len(term) >= MIN_PREFIX else f'"{term}"' for term in terms)
+
+
+def matching_entries(match):
+    # Записи индекса, подходящие под запрос FTS5, с видом и id исходной записи
+    table = SearchEntry._meta.db_table
+    return (SearchEntry.objects
+            .filter(RawSQL(f'{table} MATCH %s', [match], output_field=BooleanField()))
+            .annotate(kind=F('id') % 4, object_id=F('id') / 4))
+
+
+def visible_q(user):
+    # Запись видна, если видна задача или заявка. Комментарии, как и на странице
+    # задачи, видят только её автор и исполнитель - руководителю отдела задача
+    # видна, а переписка по ней нет.
+    # Проверка - поиск по первичному ключу для каждого совпадения
+    tasks = Task.objects.visible_to(user)
+    requests = Request.objects.visible_to(user)
+    commented_tasks = Task.objects.filter(Q(author_id=user.pk) | Q(assignee_id=user.pk))
+    # Сначала проверяется вид записи, и только потом - подзапрос для этого вида
+    return (
+        Q(kind=KIND_TASK) & Q(Exists(tasks.filter(pk=OuterRef('object_id'))))
+        | Q(kind=KIND_REQUEST) & Q(Exists(requests.filter(pk=OuterRef('object_id'))))
+        | Q(kind=KIND_COMMENT) & Q(Exists(commented_tasks.filter(comments__pk=OuterRef('object_id'))))
+    )
+
+
+@dataclass
+class SearchHit:
+    kind: str
+    obj: object
+
+
+@dataclass
+class SearchPage:
+    hits: list = field(default_factory=list)
+    number: int = 1
+    has_next: bool = False
+
+
+def search(user, text, page=1, per_page=None):
+    """Одна страница результатов поиска, лучшие совпадения первыми.
+
+    Ранжирование (bm25) и проверка прав выполняются одним запросом к индексу;
+    затем объекты страницы загружаются по первичному ключу.
+    """
+    match = build_match(text)
+    per_page = per_page or get_page_size()
+    if not match:
+        return SearchPage(number=page)
+
+    offset = (page - 1) * per_page
+    rows = list(matching_entries(match)
+                .filter(visible_q(user))
+                # Сортировку по rank FTS5 выполняет сам, без временного B-дерева
+                .order_by(RawSQL(f'{SearchEntry._meta.db_table}.rank', []))
+                .values_list('kind', 'object_id')[offset:offset + per_page + 1])
+    has_next = len(rows) > per_page
+    rows = rows[:per_page]
+
+    ids = {}
+    for kind, object_id in rows:
+        ids.setdefault(kind, []).append(object_id)
+    objects = {
+        KIND_TASK: Task.objects.select_related('assignee').in_bulk(ids.get(KIND_TASK, [])),
+        KIND_REQUEST: Request.objects.select_related('department').in_bulk(ids.get(KIND_REQUEST, [])),
+        KIND_COMMENT: Comment.objects.select_related('task', 'author').in_bulk(ids.get(KIND_COMMENT, [])),
+    }
+    hits = [SearchHit(KIND_NAMES[kind], objects[kind][object_id])
+            for kind, object_id in rows if object_id in objects[kind]]
+    return SearchPage(hits=hits, number=page, has_next=has_next)
+
+
+def search_ids(model, text):
+    # id записей одной модели, подходящих под запрос, - для поиска в админке
+    kind = next(kind for kind, (source, _, _) in SOURCES.items() if source is model)
+    match = build_match(text)
+    if not match:
+        return SearchEntry.objects.none().values('id')
+    return matching_entries(match).filter(kind=kind).values('object_id')
+
+
+def rebuild_index(batch_size=5000, progress=None):
+    """Заполняет индекс заново пачками по ``batch_size`` строк.
+
+    Каждая пачка пишется в своей транзакции, чтобы не держать блокировку
+    записи SQLite на всё время перестроения. Строки, добавленные после начала,
+    индексируют триггеры; правки уже существующих строк во время перестроения
+    могут потеряться, поэтому запускать его лучше в спокойное время.
+    """
+    table = SearchEntry._meta.db_table
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {table}({table}) VALUES('delete-all')")
+        bounds = {kind: model.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+                  for kind, (model, _, _) in SOURCES.items()}
+
+    total = 0
+    for kind, (model, title, body) in SOURCES.items():
+        title_sql = f'"{model._meta.get_field(title).column}"' if title else "''"
+        body_sql = f'"{model._meta.get_field(body).column}"'
+        insert = (f'INSERT INTO {table}(rowid, title, body) '
+                  f'SELECT id * 4 + {kind}, {title_sql}, {body_sql} FROM {model._meta.db_table} '
+                  f'WHERE id > %s AND id <= %s')
+        last_id = 0
+        while last_id < bounds[kind]:
+            upper = (model.objects
+                     .filter(pk__gt=last_id)
+                     .order_by('pk')
+                     .values_list('pk', flat=True)[batch_size - 1:batch_size].first())
+            upper = min(upper or bounds[kind], bounds[kind])
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(insert, [last_id, upper])
+                total += cursor.rowcount
+            last_id = upper
+            if progress:
+                progress(KIND_NAMES[kind], total)
+
+    # Слияние сегментов индекса ускоряет последующие запросы
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {table}({table}) VALUES('optimize')")
+    return total
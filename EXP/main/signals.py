@@ -0,0 +1,91 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .dashboard_cache import bump_versions, department_leaders, invalidate_for_tasks
+from .live import record_task_events
+from .models import Attachment, Comment, Request, Task, TaskEvent, User
+from .previews import generate_previews
+from .roster import invalidate_rosters, roster_changed
+
+
+@receiver(post_save, sender=User)
+def sync_user_dependents(sender, instance, created, **kwargs):
+    loaded = getattr(instance, '_loaded_values', None)
+    if created or loaded is None:
+        invalidate_rosters([instance.department_id])
+        return
+
+    # Политика: задачи следуют за автором. Если сотрудник перешёл в другой отдел,
+    # все его задачи переносятся вместе с ним (как было при фильтре author__department)
+    if 'department_id' in loaded and loaded['department_id'] != instance.department_id:
+        move_authored_tasks(instance, loaded['department_id'])
+
+    invalidate_rosters(roster_changed(instance))
+
+    # Сохранённое состояние становится новой точкой отсчёта для следующих сохранений
+    for field in loaded:
+        loaded[field] = getattr(instance, field)
+
+
+def move_authored_tasks(user, old_department_id):
+    # Массовый update не вызывает сигналов задач, поэтому кэш дашбордов обоих
+    # руководителей и события для живых страниц обновляются здесь же
+    tasks = list(Task.objects.filter(author=user).only('id', 'status', 'author_id', 'assignee_id', 'department_id'))
+    if not tasks:
+        return
+    previous_departments = {old_department_id} | {task.department_id for task in tasks}
+    Task.objects.filter(author=user).update(department_id=user.department_id)
+    for task in tasks:
+        task._loaded_values = {'status': task.status, 'assignee_id': task.assignee_id,
+                               'department_id': task.department_id}
+        task.department_id = user.department_id
+    invalidate_for_tasks(tasks)
+    bump_versions(department_leaders(previous_departments))
+    record_task_events(tasks, TaskEvent.Kind.UPDATED)
+
+
+@receiver(post_delete, sender=User)
+def invalidate_deleted_user_roster(sender, instance, **kwargs):
+    invalidate_rosters([instance.department_id])
+
+
+# --- Сброс кэша дашбордов и события для живого обновления ---
+@receiver(post_save, sender=Task)
+def task_saved(sender, instance, created, **kwargs):
+    invalidate_for_tasks([instance])
+    record_task_events([instance], TaskEvent.Kind.CREATED if created else TaskEvent.Kind.UPDATED)
+    # Сохранённое состояние становится точкой отсчёта для следующего сохранения
+    deferred = instance.get_deferred_fields()
+    instance._loaded_values = {field.attname: getattr(instance, field.attname)
+                               for field in Task._meta.concrete_fields if field.attname not in deferred}
+
+
+@receiver(post_delete, sender=Task)
+def task_deleted(sender, instance, **kwargs):
+    invalidate_for_tasks([instance])
+    record_task_events([instance], TaskEvent.Kind.DELETED)
+
+
+@receiver(post_save, sender=Request)
+@receiver(post_delete, sender=Request)
+def invalidate_request_dashboards(sender, instance, **kwargs):
+    loaded = getattr(instance, '_loaded_values', {})
+    user_ids = {instance.requester_id, instance.assignee_id, loaded.get('assignee_id')}
+    bump_versions(user_ids | department_leaders([instance.department_id]))
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_dashboards(sender, instance, **kwargs):
+    row = (Task.objects
+           .filter(pk=instance.task_id)
+           .values_list('assignee_id', 'author_id', 'department__leader_id')
+           .first())
+    if row:
+        bump_versions(row)
+
+
+@receiver(post_save, sender=Attachment)
+def build_attachment_previews(sender, instance, created, **kwargs):
+    if created and instance.blob_id:
+        generate_previews.enqueue(blob_id=instance.blob_id)
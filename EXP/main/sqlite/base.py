@@ -0,0 +1,26 @@
+"""Бэкенд SQLite для нескольких процессов сервера.
+
+Отличается от стандартного ``django.db.backends.sqlite3`` двумя вещами:
+
+* транзакции начинаются с ``BEGIN IMMEDIATE``. Обычный ``BEGIN`` берёт блокировку
+  на запись только при первом изменении, и если две транзакции сначала читают,
+  а потом пишут (перемещение карточек на доске), одна из них сразу получает
+  "database is locked" - ожидание busy_timeout в этом случае не работает;
+* при подключении выполняются ``PRAGMA`` из ``SQLITE_PRAGMAS`` (WAL, busy_timeout, ...).
+"""
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.db.backends.sqlite3 import base
+from django.dispatch import receiver
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute('BEGIN IMMEDIATE')
+
+
+@receiver(connection_created, sender=DatabaseWrapper)
+def apply_pragmas(sender, connection, **kwargs):
+    with connection.cursor() as cursor:
+        for name, value in getattr(settings, 'SQLITE_PRAGMAS', {}).items():
+            cursor.execute(f'PRAGMA {name} = {value}')
@@ -0,0 +1,46 @@
+"""Процесс нагрузки для команды stress_db.
+
+Модуль импортируется в новом процессе до django.setup(), поэтому модели
+подключаются внутри функции.
+"""
+import os
+import random
+import time
+
+import django
+
+
+def run_worker(role, profile, path, user_id, task_ids, duration, seed, start, results):
+    # Отдельный процесс со своим соединением - как воркер gunicorn
+    os.environ['SQLITE_PROFILE'] = profile
+    os.environ['DATABASE_PATH'] = path
+    django.setup()
+    from django.db import OperationalError
+
+    from main.board import apply_status_changes, build_board
+    from main.models import Task, User
+
+    user = User.objects.get(pk=user_id)
+    rng = random.Random(seed)
+    results.put(None)
+    start.wait()
+
+    done, errors, timings = 0, 0, []
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        try:
+            if role == 'writer':
+                # Перетаскивание нескольких карточек: чтение и запись в одной транзакции
+                apply_status_changes(user, [{'task_id': rng.choice(task_ids), 'status': rng.choice(Task.Status.values)}
+                                            for _ in range(3)])
+            else:
+                build_board(user)
+        except OperationalError as error:
+            if 'locked' not in str(error):
+                raise
+            errors += 1
+            continue
+        done += 1
+        timings.append((time.perf_counter() - started) * 1000)
+    results.put((role, done, errors, timings))
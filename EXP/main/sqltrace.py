@@ -0,0 +1,89 @@
+"""Запись SQL-запросов вместе с местом, откуда они выполнены.
+
+Место вызова - ближайшая строка кода проекта (не Django и не библиотек) и,
+если запрос выполнен при отрисовке шаблона, шаблон и строка в нём. Так N+1
+в шаблоне (``{{ task.author.department }}`` в цикле) виден сразу.
+"""
+import os
+import sys
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.db import connections
+
+# Код проекта - всё внутри BASE_DIR, кроме окружений и модулей, которые сами
+# перехватывают запросы и отрисовку шаблонов
+_EXCLUDED_DIRS = ('site-packages', 'dist-packages', f'{os.sep}venv{os.sep}', f'{os.sep}.venv{os.sep}')
+_INSTRUMENTATION_MODULES = {__name__, 'main.metrics', 'main.sqlwatch'}
+
+
+def _is_project_frame(frame):
+    filename = frame.f_code.co_filename
+    return (filename.startswith(str(settings.BASE_DIR))
+            and frame.f_globals.get('__name__') not in _INSTRUMENTATION_MODULES
+            and not any(part in filename for part in _EXCLUDED_DIRS))
+
+
+def _template_position(frame):
+    # Кадр Node.render_annotated знает свой шаблон и строку тега
+    node = frame.f_locals.get('self')
+    origin = getattr(node, 'origin', None)
+    token = getattr(node, 'token', None)
+    if origin is None or token is None:
+        return None
+    return f'{origin.template_name}:{token.lineno}'
+
+
+def call_site(frame=None):
+    """Строка вида ``main/views.py:42 in home_view`` или
+    ``main/includes/task_cards.html:7 <- main/views.py:42 in home_view``."""
+    frame = frame or sys._getframe(1)
+    template = None
+    while frame is not None:
+        code = frame.f_code
+        if template is None and code.co_name == 'render_annotated':
+            template = _template_position(frame)
+        if _is_project_frame(frame):
+            location = (f'{os.path.relpath(code.co_filename, settings.BASE_DIR)}:'
+                        f'{frame.f_lineno} in {code.co_name}')
+            return f'{template} <- {location}' if template else location
+        frame = frame.f_back
+    return template or '<вне кода проекта>'
+
+
+@dataclass
+class QueryTrace:
+    queries: list = field(default_factory=list)
+
+    def __len__(self):
+        return len(self.queries)
+
+    def by_call_site(self):
+        # {место вызова: [sql, ...]} - места с наибольшим числом запросов первыми
+        groups = {}
+        for sql, site in self.queries:
+            groups.setdefault(site, []).append(sql)
+        return dict(sorted(groups.items(), key=lambda item: -len(item[1])))
+
+    def format(self, limit=3):
+        lines = []
+        for site, statements in self.by_call_site().items():
+            lines.append(f'{len(statements):>4} x {site}')
+            for sql, count in Counter(statements).most_common(limit):
+                lines.append(f'         {count} x {sql}')
+        return '\n'.join(lines)
+
+
+@contextmanager
+def trace_queries(using='default'):
+    """Записывает запросы к БД внутри блока: ``with trace_queries() as trace: ...``."""
+    trace = QueryTrace()
+
+    def record(execute, sql, params, many, context):
+        trace.queries.append((sql, call_site(sys._getframe(1))))
+        return execute(sql, params, many, context)
+
+    with connections[using].execute_wrapper(record):
+        yield trace
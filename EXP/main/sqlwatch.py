@@ -0,0 +1,226 @@
+"""Разбор SQL отдельных запросов: N+1 и медленные запросы.
+
+``SQLWatchMiddleware`` записывает SQL доли запросов (``SQL_WATCH_SAMPLE_RATE``:
+в разработке - всех, в работе - выборки) вместе с местом вызова. По окончании
+запроса ищутся одинаковые по структуре запросы из одного места (N+1, например
+автор каждого комментария в цикле шаблона) и запросы дольше ``SQL_WATCH_SLOW_MS``.
+Находки пишутся в журнал ``main.sqlwatch`` и в файл ``SQL_WATCH_REPORT_PATH``,
+сводку по нему печатает команда ``sql_report``.
+"""
+import contextvars
+import json
+import logging
+import random
+import re
+import sys
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .sqltrace import call_site
+
+logger = logging.getLogger(__name__)
+
+N_PLUS_ONE = 'n+1'
+SLOW = 'slow'
+
+# Значения, подставленные прямо в текст запроса, и списки IN (...) разной длины
+# не меняют его структуру
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_LISTS = re.compile(r'\bIN \((?:(?:%s|\?), )*(?:%s|\?)\)')
+
+
+def get_sample_rate():
+    return getattr(settings, 'SQL_WATCH_SAMPLE_RATE', 0)
+
+
+def get_repeat_threshold():
+    return getattr(settings, 'SQL_WATCH_REPEAT_THRESHOLD', 5)
+
+
+def get_slow_ms():
+    return getattr(settings, 'SQL_WATCH_SLOW_MS', 100)
+
+
+def get_report_path():
+    return Path(getattr(settings, 'SQL_WATCH_REPORT_PATH',
+                        Path(settings.BASE_DIR) / 'cache' / 'sql_report.jsonl'))
+
+
+def fingerprint(sql):
+    """Текст запроса без конкретных значений: ``... WHERE "id" = ?`` для любого id."""
+    return _IN_LISTS.sub('IN (...)', _LITERALS.sub('?', sql))
+
+
+@dataclass
+class Finding:
+    kind: str
+    sql: str
+    site: str
+    count: int
+    ms: float
+    view: str = ''
+    path: str = ''
+
+
+class QueryLog:
+    def __init__(self):
+        self.queries = []
+
+    def findings(self, repeat_threshold=None, slow_ms=None):
+        repeat_threshold = repeat_threshold or get_repeat_threshold()
+        slow_ms = get_slow_ms() if slow_ms is None else slow_ms
+        groups = {}
+        found = []
+        for sql, site, ms in self.queries:
+            groups.setdefault((fingerprint(sql), site), []).append(ms)
+            if ms >= slow_ms:
+                found.append(Finding(SLOW, fingerprint(sql), site, 1, round(ms, 2)))
+        for (sql, site), timings in groups.items():
+            if len(timings) >= repeat_threshold:
+                found.append(Finding(N_PLUS_ONE, sql, site, len(timings), round(sum(timings), 2)))
+        return found
+
+
+# Журнал текущего запроса; None - запрос не попал в выборку
+_current = contextvars.ContextVar('sqlwatch_log', default=None)
+
+
+def _watch_query(execute, sql, params, many, context):
+    log = _current.get()
+    if log is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        log.queries.append((sql, call_site(sys._getframe(1)), (time.perf_counter() - started) * 1000))
+
+
+@receiver(connection_created)
+def install_query_watch(sender, connection, **kwargs):
+    if _watch_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _watch_query)
+
+
+@contextmanager
+def watch_queries():
+    """Записывает запросы к БД внутри блока: ``with watch_queries() as log: ...``."""
+    log = QueryLog()
+    token = _current.set(log)
+    try:
+        yield log
+    finally:
+        _current.reset(token)
+
+
+def report(findings, request=None):
+    """Пишет находки в журнал и дописывает их в файл отчёта."""
+    if not findings:
+        return
+    if request is not None:
+        match = getattr(request, 'resolver_match', None)
+        for finding in findings:
+            finding.view = match.view_name if match is not None else ''
+            finding.path = request.path
+    for finding in findings:
+        if finding.kind == N_PLUS_ONE:
+            logger.warning('N+1: %s одинаковых запросов %s\n  %s\n  %s',
+                           finding.count, finding.path, finding.site, finding.sql)
+        else:
+            logger.warning('Медленный запрос: %s мс %s\n  %s\n  %s',
+                           finding.ms, finding.path, finding.site, finding.sql)
+
+    path = get_report_path()
+    at = timezone.now().isoformat(timespec='seconds')
+    lines = ''.join(json.dumps({'at': at, **asdict(finding)}, ensure_ascii=False) + '\n'
+                    for finding in findings)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Одна запись в режиме дозаписи: строки разных процессов не перемешиваются
+        with open(path, 'a', encoding='utf-8') as file:
+            file.write(lines)
+    except OSError:
+        logger.exception('Не удалось записать отчёт %s', path)
+
+
+def read_report(path=None):
+    path = path or get_report_path()
+    try:
+        with open(path, encoding='utf-8') as file:
+            for line in file:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # Строка, недописанная при остановке процесса
+                    continue
+    except FileNotFoundError:
+        return
+
+
+def _watched(chunks, log, request):
+    # Потоковый ответ выполняет запросы, пока отдаётся тело: журнал остаётся
+    # активным на время каждой порции, а находки ищутся после отдачи всего тела
+    chunks = iter(chunks)
+    done = object()
+    try:
+        while True:
+            token = _current.set(log)
+            try:
+                chunk = next(chunks, done)
+            finally:
+                _current.reset(token)
+            if chunk is done:
+                return
+            yield chunk
+    finally:
+        report(log.findings(), request)
+
+
+def _finish(log, request, response):
+    # Готовый файл (FileResponse) запросов при отдаче не делает, а обёртка
+    # отключила бы wsgi.file_wrapper
+    if response.streaming and getattr(response, 'file_to_stream', None) is None:
+        response.streaming_content = _watched(response.streaming_content, log, request)
+    else:
+        report(log.findings(), request)
+    return response
+
+
+class SQLWatchMiddleware:
+    """Разбирает SQL запросов, попавших в выборку; при SQL_WATCH_SAMPLE_RATE = 0 отключается."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not get_sample_rate():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if random.random() >= get_sample_rate():
+            return self.get_response(request)
+        with watch_queries() as log:
+            response = self.get_response(request)
+        return _finish(log, request, response)
+
+    async def __acall__(self, request):
+        if random.random() >= get_sample_rate():
+            return await self.get_response(request)
+        with watch_queries() as log:
+            response = await self.get_response(request)
+        return _finish(log, request, response)
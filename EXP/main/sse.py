@@ -0,0 +1,167 @@
+import asyncio
+import json
+from http.cookies import SimpleCookie
+from importlib import import_module
+from types import SimpleNamespace
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.db import close_old_connections
+from django.urls import reverse
+
+from .live import EVENTS_BATCH, Viewer, events_after, get_poll_interval, latest_event_id
+
+# Комментарий-пинг, чтобы прокси не закрывали молчащее соединение
+HEARTBEAT_INTERVAL = 15
+
+
+def _closing(func, *args, **kwargs):
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def in_db_thread(func, *args, **kwargs):
+    # Запросы идут в пуле потоков, не блокируя цикл событий и не выстраиваясь в один поток
+    return await sync_to_async(_closing, thread_sensitive=False)(func, *args, **kwargs)
+
+
+def _load_viewer(session_key):
+    engine = import_module(settings.SESSION_ENGINE)
+    user = get_user(SimpleNamespace(session=engine.SessionStore(session_key)))
+    return Viewer.for_user(user) if user.is_authenticated else None
+
+
+class EventBroadcaster:
+    """Один опрос журнала событий на процесс, сколько бы страниц ни было открыто.
+
+    Каждое новое событие раскладывается по очередям подписчиков, которым
+    оно видно; пока подписчиков нет, журнал не опрашивается.
+    """
+
+    def __init__(self):
+        self.subscribers = set()
+        self.last_id = None
+        self.poller = None
+
+    async def subscribe(self, viewer):
+        if self.last_id is None:
+            last_id = await in_db_thread(latest_event_id)
+            if self.last_id is None:
+                self.last_id = last_id
+        # Между чтением last_id и регистрацией очереди нет await: всё, что новее
+        # last_id, опросчик доставит в очередь, всё, что старее, - догоняет подписчик
+        subscriber = (viewer, asyncio.Queue())
+        self.subscribers.add(subscriber)
+        if self.poller is None or self.poller.done():
+            self.poller = asyncio.ensure_future(self.poll())
+        return subscriber, self.last_id
+
+    def unsubscribe(self, subscriber):
+        self.subscribers.discard(subscriber)
+
+    async def poll(self):
+        while self.subscribers:
+            await asyncio.sleep(get_poll_interval())
+            while True:
+                events = await in_db_thread(events_after, self.last_id)
+                if not events:
+                    break
+                self.last_id = events[-1]['id']
+                for viewer, queue in list(self.subscribers):
+                    for event in events:
+                        if viewer.can_see(event):
+                            queue.put_nowait(event)
+                if len(events) < EVENTS_BATCH:
+                    break
+        # Опрос остановлен: при следующей подписке точка отсчёта будет прочитана заново
+        self.last_id = None
+
+
+broadcaster = EventBroadcaster()
+
+
+def _format(event):
+    return f"id: {event['id']}\nevent: task\ndata: {json.dumps(event, separators=(',', ':'))}\n\n".encode()
+
+
+async def _wait_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def _send_body(send, body):
+    await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+
+
+async def serve_events(scope, receive, send):
+    headers = dict(scope['headers'])
+    cookies = SimpleCookie(headers.get(b'cookie', b'').decode('latin-1'))
+    session = cookies.get(settings.SESSION_COOKIE_NAME)
+    viewer = await in_db_thread(_load_viewer, session.value) if session else None
+    if viewer is None:
+        await send({'type': 'http.response.start', 'status': 403,
+                    'headers': [(b'content-type', b'text/plain; charset=utf-8')]})
+        await send({'type': 'http.response.body', 'body': 'Требуется вход'.encode()})
+        return
+
+    # При переподключении браузер сам присылает Last-Event-ID
+    query = parse_qs(scope.get('query_string', b'').decode())
+    cursor = headers.get(b'last-event-id', b'').decode() or query.get('after', [''])[0]
+    cursor = int(cursor) if cursor.isdigit() else None
+
+    subscriber, start_id = await broadcaster.subscribe(viewer)
+    _, queue = subscriber
+    disconnected = asyncio.ensure_future(_wait_disconnect(receive))
+    try:
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [
+            (b'content-type', b'text/event-stream'),
+            (b'cache-control', b'no-cache'),
+            # Запрет буферизации ответа в nginx
+            (b'x-accel-buffering', b'no'),
+        ]})
+        await _send_body(send, b'retry: 3000\n\n')
+
+        # События, пропущенные со времени, когда страница была отрисована
+        while cursor is not None and cursor < start_id:
+            backlog = await in_db_thread(events_after, cursor, viewer, start_id)
+            for event in backlog:
+                await _send_body(send, _format(event))
+            cursor = backlog[-1]['id'] if len(backlog) == EVENTS_BATCH else None
+
+        while not disconnected.done():
+            getter = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait({getter, disconnected}, timeout=HEARTBEAT_INTERVAL,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if getter in done:
+                await _send_body(send, _format(getter.result()))
+            else:
+                getter.cancel()
+                if not disconnected.done():
+                    await _send_body(send, b': ping\n\n')
+    finally:
+        broadcaster.unsubscribe(subscriber)
+        disconnected.cancel()
+
+
+def with_live_events(django_application):
+    """Оборачивает ASGI-приложение Django: поток событий обслуживается до Django.
+
+    Потоковые ответы Django под ASGI отдаются синхронно и держат поток на всё
+    время соединения, поэтому SSE реализован напрямую на ASGI.
+    """
+    path = None
+
+    async def application(scope, receive, send):
+        nonlocal path
+        if path is None:
+            path = reverse('live_events')
+        if scope['type'] == 'http' and scope['path'] == path:
+            await serve_events(scope, receive, send)
+        else:
+            await django_application(scope, receive, send)
+
+    return application
@@ -0,0 +1,58 @@
+// Живое обновление страниц по событиям изменения задач.
+// Сначала пробуем SSE (работает при запуске через ASGI); если поток недоступен,
+// переключаемся на long-poll. Каждое событие передаётся в onEvent ровно один раз.
+(function () {
+    window.subscribeTaskEvents = function (options) {
+        let after = parseInt(options.after, 10) || 0;
+
+        function handle(event) {
+            if (event.id <= after) return;
+            after = event.id;
+            try {
+                options.onEvent(event);
+            } catch (err) {
+                console.error(err);
+            }
+        }
+
+        function poll(delay) {
+            setTimeout(function () {
+                fetch(options.pollUrl + '?after=' + after)
+                    .then(function (res) { return res.json(); })
+                    .then(function (data) {
+                        data.events.forEach(handle);
+                        after = Math.max(after, data.last_id);
+                        poll(0);
+                    })
+                    .catch(function () { poll(5000); });
+            }, delay);
+        }
+
+        if (!window.EventSource) {
+            poll(0);
+            return;
+        }
+        let opened = false;
+        const source = new EventSource(options.sseUrl + '?after=' + after);
+        source.addEventListener('open', function () { opened = true; });
+        source.addEventListener('task', function (e) { handle(JSON.parse(e.data)); });
+        source.addEventListener('error', function () {
+            // Обрыв уже открытого потока браузер переподключит сам;
+            // если поток не открылся ни разу - сервер работает через WSGI
+            if (!opened || source.readyState === EventSource.CLOSED) {
+                source.close();
+                poll(0);
+            }
+        });
+    };
+
+    // Свежая разметка задачи для точечного обновления
+    window.fetchTaskFragment = function (url) {
+        return fetch(url)
+            .then(function (res) { return res.json(); })
+            .then(function (data) {
+                if (!data.success) throw new Error(data.error);
+                return data.html;
+            });
+    };
+})();
@@ -0,0 +1,23 @@
+from django.db.models import Count, Q
+
+from .models import Task
+
+
+def task_stats(tasks):
+    """Считает задачи по статусам и приоритетам одним агрегирующим запросом."""
+    aggregates = {'total': Count('id')}
+    for status in Task.Status.values:
+        aggregates[f'status_{status}'] = Count('id', filter=Q(status=status))
+    for priority in Task.Priority.values:
+        aggregates[f'priority_{priority}'] = Count('id', filter=Q(priority=priority))
+
+    row = tasks.order_by().aggregate(**aggregates)
+    return {
+        'total': row['total'],
+        'by_status': {status: row[f'status_{status}'] for status in Task.Status.values},
+        'by_priority': {priority: row[f'priority_{priority}'] for priority in Task.Priority.values},
+    }
+
+
+def department_task_stats(department):
+    return task_stats(Task.objects.filter(department=department))
@@ -1,3 +1,280 @@
-from django.test import TestCase
+import tempfile
+from pathlib import Path
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import call_command
+from django.conf import settings
+from django.db import connection, router, transaction
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from .benchdata import SeedSizes, bench_fixtures, request_kwargs, route_cases, seed
+from .dashboard_cache import get_cache, get_version
+from .models import Comment, Department, Task, TaskEvent, User
+from .replicas import PIN_COOKIE, ReplicaPinMiddleware, primary, replica_reads
+from .search import search
+from .sqlwatch import N_PLUS_ONE, SQLWatchMiddleware, fingerprint, report, watch_queries
+from .sqltrace import trace_queries
+from .urls import urlpatterns
+
+# Сколько SQL-запросов выполняет каждая страница при пустом кэше дашбордов.
+# Число не должно зависеть от объёма данных: если оно растёт вместе с ними - это N+1.
+# Меняя страницу, поправьте число здесь осознанно
+QUERY_BUDGETS = {
+    'register (anonymous)': 2,
+    'login (anonymous)': 0,
+    'logout (leader)': 4,
+    'home (employee)': 5,
+    'home (leader)': 5,
+    'board_column (employee)': 3,
+    'create_task (leader)': 3,
+    'task_detail (leader)': 6,
+    'task_comments (leader)': 4,
+    'start_upload (leader)': 4,
+    'upload_chunk (leader)': 3,
+    'edit_task (leader)': 4,
+    'delete_task (leader)': 3,
+    'search (employee)': 5,
+    'search (leader)': 6,
+    'request_list (leader)': 3,
+    'create_request (leader)': 3,
+    'delete_request (leader)': 3,
+    'manager_dashboard (leader)': 4,
+    'department_tasks (leader)': 7,
+    'department_tasks_feed (leader)': 4,
+    'department_tasks_export (leader)': 5,
+    'update_task_status (employee)': 6,
+    'update_task_status_batch (employee)': 8,
+    'task_fragment (employee)': 3,
+    'task_fragment (leader, department)': 4,
+    'live_events (employee)': 2,
+    'live_poll (employee)': 3,
+    'dashboard_cache_stats (admin)': 2,
+    'job_stats (admin)': 5,
+    'metrics (admin)': 2,
+    'attachment_download (employee)': 3,
+    'attachment_preview (employee)': 3,
+}
+
+# Тесты идут в одном процессе, а общий файловый кэш дашбордов разработчика трогать незачем
+TEST_CACHES = {
+    **settings.CACHES,
+    'dashboard': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests'},
+}
+
+
+class QueryBudgetMixin:
+    # Сколько строк в каждой большой таблице (задачи, комментарии, заявки, вложения)
+    rows = None
+
+    @classmethod
+    def setUpClass(cls):
+        cls._media = tempfile.TemporaryDirectory()
+        cls._settings = override_settings(
+            MEDIA_ROOT=cls._media.name,
+            UPLOAD_TEMP_DIR=str(Path(cls._media.name) / 'partial'),
+            ATTACHMENT_SENDFILE_BACKEND=None,
+            CACHES=TEST_CACHES,
+            METRICS_PATH=Path(cls._media.name) / 'metrics.sqlite3',
+            SQL_WATCH_REPORT_PATH=Path(cls._media.name) / 'sql_report.jsonl',
+            # Бюджеты считаются по одной базе, даже если настроена реплика
+            REPLICA_DATABASE=None,
+        )
+        cls._settings.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls._settings.disable()
+        cls._media.cleanup()
+
+    @classmethod
+    def setUpTestData(cls):
+        seed(SeedSizes(departments=max(2, cls.rows // 10), users=cls.rows, tasks=cls.rows,
+                       comments=cls.rows, attachments=cls.rows, requests=cls.rows))
+
+    def setUp(self):
+        # Журнал событий изредка чистится при записи - лишний запрос в случайный момент
+        patcher = mock.patch('main.live.PRUNE_PROBABILITY', 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_query_budgets(self):
+        fixtures = bench_fixtures()
+        for case in route_cases(fixtures):
+            with self.subTest(case.label):
+                client = Client()
+                if fixtures[case.user] is not None:
+                    client.force_login(fixtures[case.user])
+                get_cache().clear()
+                # Изменения пишущих запросов откатываются, чтобы не влиять на следующие
+                with transaction.atomic():
+                    with trace_queries() as trace:
+                        response = getattr(client, case.method)(reverse(case.name, kwargs=case.kwargs),
+                                                                **request_kwargs(case))
+                        if response.streaming:
+                            for _ in response.streaming_content:
+                                pass
+                    transaction.set_rollback(True)
+                self.assertLess(response.status_code, 500)
+                budget = QUERY_BUDGETS[case.label]
+                self.assertEqual(
+                    len(trace), budget,
+                    f'{case.label}: {len(trace)} SQL-запросов вместо {budget} при {self.rows} строках\n'
+                    f'{trace.format()}',
+                )
+
+    def test_every_route_has_budget(self):
+        cases = route_cases(bench_fixtures())
+        names = {case.name for case in cases}
+        self.assertEqual([pattern.name for pattern in urlpatterns if pattern.name not in names], [])
+        self.assertEqual(sorted({case.label for case in cases} - set(QUERY_BUDGETS)), [])
+
+
+class SmallDatasetQueryBudgetTests(QueryBudgetMixin, TestCase):
+    rows = 10
+
+
+class LargeDatasetQueryBudgetTests(QueryBudgetMixin, TestCase):
+    rows = 1000
+
+
+@override_settings(CACHES=TEST_CACHES)
+class SQLWatchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seed(SeedSizes(departments=2, users=10, tasks=10, comments=10, attachments=0, requests=0))
+
+    def test_repeated_queries_are_found_with_call_site(self):
+        with watch_queries() as log:
+            authors = [comment.author.username for comment in Comment.objects.all()]
+        [finding] = log.findings(repeat_threshold=5, slow_ms=10_000)
+        self.assertEqual(finding.kind, N_PLUS_ONE)
+        self.assertEqual(finding.count, len(authors))
+        self.assertTrue(finding.site.startswith('main/tests.py:'), finding.site)
+        self.assertIn('WHERE "main_user"."id" = %s', finding.sql)
+
+    def test_fingerprint_ignores_values(self):
+        self.assertEqual(fingerprint("SELECT 1 FROM t WHERE a = 'x' AND b IN (%s, %s, %s)"),
+                         fingerprint("SELECT 2 FROM t WHERE a = 'y' AND b IN (%s)"))
+
+    def test_sql_report_groups_findings(self):
+        with tempfile.TemporaryDirectory() as tmp, \
+                override_settings(SQL_WATCH_REPORT_PATH=Path(tmp) / 'report.jsonl'):
+            for _ in range(2):
+                with watch_queries() as log:
+                    [comment.author for comment in Comment.objects.all()]
+                with self.assertLogs('main.sqlwatch', 'WARNING'):
+                    report(log.findings(repeat_threshold=5, slow_ms=10_000))
+            output = StringIO()
+            call_command('sql_report', stdout=output)
+        self.assertIn('Повторяющиеся запросы (N+1): 1', output.getvalue())
+        self.assertIn('2 запр., до 10 повторов', output.getvalue())
+
+    def test_streaming_body_queries_are_watched(self):
+        def view(request):
+            return StreamingHttpResponse(comment.author.username for comment in Comment.objects.all())
+
+        with tempfile.TemporaryDirectory() as tmp, \
+                override_settings(SQL_WATCH_SAMPLE_RATE=1, SQL_WATCH_REPEAT_THRESHOLD=5,
+                                  SQL_WATCH_REPORT_PATH=Path(tmp) / 'report.jsonl'):
+            response = SQLWatchMiddleware(view)(RequestFactory().get('/'))
+            with self.assertLogs('main.sqlwatch', 'WARNING') as logs:
+                b''.join(response.streaming_content)
+        self.assertIn('N+1: 10', logs.output[0])
+
+
+@override_settings(CACHES=TEST_CACHES)
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        department = Department.objects.create(name='Отдел')
+        cls.leader = User.objects.create_user('leader', is_staff=True, department=department)
+        cls.employee = User.objects.create_user('employee', department=department)
+        department.leader = cls.leader
+        department.save()
+        task = Task.objects.create(title='Отчёт', author=cls.employee, assignee=cls.employee, department=department)
+        Comment.objects.create(task=task, author=cls.employee, text='secretword here')
+
+    def found(self, user, text):
+        return [(hit.kind, getattr(hit.obj, 'text', None) or hit.obj.title) for hit in search(user, text).hits]
+
+    def test_leader_sees_subordinate_task_but_not_its_comments(self):
+        self.assertEqual(self.found(self.leader, 'отчёт'), [('task', 'Отчёт')])
+        self.assertEqual(self.found(self.leader, 'secretword'), [])
+        self.assertEqual(self.found(self.employee, 'secretword'), [('comment', 'secretword here')])
+
+
+@override_settings(CACHES=TEST_CACHES)
+class DepartmentMoveTests(TestCase):
+    def test_moved_author_refreshes_both_leaders(self):
+        leaders = []
+        for name in ('Старый', 'Новый'):
+            leader = User.objects.create_user(f'leader-{name}', is_staff=True)
+            leader.department = Department.objects.create(name=name, leader=leader)
+            leader.save()
+            leaders.append(leader)
+        old, new = (leader.department for leader in leaders)
+        author = User.objects.create_user('author', department=old)
+        author = User.objects.get(pk=author.pk)
+        task = Task.objects.create(title='Отчёт', author=author, assignee=author, department=old)
+        versions = [get_version(leader.pk) for leader in leaders]
+
+        author.department = new
+        author.save()
+
+        self.assertEqual(Task.objects.get(pk=task.pk).department, new)
+        self.assertTrue(all(get_version(leader.pk) != version for leader, version in zip(leaders, versions)))
+        event = TaskEvent.objects.filter(task_id=task.pk).latest('id')
+        self.assertEqual((event.previous_department_id, event.department_id), (old.pk, new.pk))
+
+
+@override_settings(CACHES=TEST_CACHES)
+class SQLiteBackendTests(TransactionTestCase):
+    def test_transactions_take_write_lock_at_begin(self):
+        with trace_queries() as trace, transaction.atomic():
+            User.objects.exists()
+        self.assertEqual(trace.queries[0][0], 'BEGIN IMMEDIATE')
+
+    def test_pragmas_are_applied(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], settings.SQLITE_PRAGMAS['busy_timeout'])
+
+
+class ReplicaRoutingTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch('main.replicas.get_replica', return_value='replica')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.factory = RequestFactory()
+
+    def read_alias(self, request):
+        @replica_reads
+        def view(request):
+            return HttpResponse(router.db_for_read(Task))
+        return view(request).content.decode()
+
+    def test_only_safe_unpinned_requests_read_from_replica(self):
+        self.assertEqual(self.read_alias(self.factory.get('/')), 'replica')
+        self.assertEqual(self.read_alias(self.factory.post('/')), 'default')
+        pinned = self.factory.get('/')
+        pinned.COOKIES[PIN_COOKIE] = '1'
+        self.assertEqual(self.read_alias(pinned), 'default')
+        self.assertEqual(router.db_for_write(Task), 'default')
+
+    def test_shared_cache_is_filled_from_primary(self):
+        @replica_reads
+        def view(request):
+            with primary():
+                return HttpResponse(router.db_for_read(Task))
+        self.assertEqual(view(self.factory.get('/')).content, b'default')
+
+    def test_writes_pin_user_to_primary(self):
+        middleware = ReplicaPinMiddleware(lambda request: HttpResponse())
+        self.assertIn(PIN_COOKIE, middleware(self.factory.post('/')).cookies)
+        self.assertNotIn(PIN_COOKIE, middleware(self.factory.get('/')).cookies)
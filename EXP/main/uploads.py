@@ -0,0 +1,230 @@
+import hashlib
+import os
+import re
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Attachment, Blob, UploadSession
+
+# Размер порции при чтении запроса и файлов: в памяти не держим больше этого
+READ_SIZE = 64 * 1024
+
+CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+
+
+class UploadError(Exception):
+    def __init__(self, message, status=400, offset=None):
+        super().__init__(message)
+        self.status = status
+        self.offset = offset
+
+
+def get_chunk_size():
+    return getattr(settings, 'UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024)
+
+
+def get_claim_timeout():
+    # Сколько секунд запрос может писать одну часть; дольше - считаем его оборванным
+    return getattr(settings, 'UPLOAD_CHUNK_TIMEOUT', 300)
+
+
+def get_max_size():
+    return getattr(settings, 'ATTACHMENT_MAX_SIZE', 2 * 1024 * 1024 * 1024)
+
+
+def upload_temp_dir():
+    return Path(getattr(settings, 'UPLOAD_TEMP_DIR', Path(settings.MEDIA_ROOT) / 'uploads' / 'partial'))
+
+
+def upload_temp_path(session):
+    return upload_temp_dir() / f'{session.pk}.part'
+
+
+def blob_name(sha256, filename):
+    # blobs/ab/cd/<sha256><расширение первого загруженного файла>
+    ext = os.path.splitext(filename)[1].lower()[:16]
+    return f'blobs/{sha256[:2]}/{sha256[2:4]}/{sha256}{ext}'
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fp:
+        for block in iter(lambda: fp.read(READ_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _save_to_storage(name, path):
+    # Для локального хранилища файл просто переносится, иначе копируется потоком
+    try:
+        target = default_storage.path(name)
+    except NotImplementedError:
+        with open(path, 'rb') as fp:
+            return default_storage.save(name, File(fp))
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    os.replace(path, target)
+    return name
+
+
+def store_blob(path, sha256, size, filename):
+    """Возвращает Blob с указанным содержимым, сохраняя файл, только если такого ещё нет.
+
+    ``path`` - временный файл; после вызова он удалён или перенесён в хранилище.
+    """
+    blob = Blob.objects.filter(sha256=sha256).first()
+    if blob is None:
+        name = _save_to_storage(blob_name(sha256, filename), path)
+        try:
+            with transaction.atomic():
+                blob = Blob.objects.create(sha256=sha256, size=size, file=name)
+        except IntegrityError:
+            # Такой же файл только что сохранил параллельный запрос
+            blob = Blob.objects.get(sha256=sha256)
+            if blob.file.name != name:
+                default_storage.delete(name)
+    if os.path.exists(path):
+        os.remove(path)
+    return blob
+
+
+def create_attachment(task, author, blob, filename):
+    return Attachment.objects.create(
+        task=task,
+        author=author,
+        blob=blob,
+        file=blob.file.name,
+        name=os.path.basename(filename)[:255],
+    )
+
+
+def attach_uploaded_file(task, author, uploaded_file):
+    # Обычная загрузка через форму: файл тоже попадает в общее хранилище по хэшу
+    temp_dir = upload_temp_dir()
+    temp_dir.mkdir(parents=True, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    temp_path = temp_dir / f'form-{os.getpid()}-{id(uploaded_file)}.part'
+    with open(temp_path, 'wb') as out:
+        for chunk in uploaded_file.chunks(READ_SIZE):
+            digest.update(chunk)
+            out.write(chunk)
+            size += len(chunk)
+    blob = store_blob(temp_path, digest.hexdigest(), size, uploaded_file.name)
+    return create_attachment(task, author, blob, uploaded_file.name)
+
+
+def start_upload(task, author, filename, size):
+    if not filename:
+        raise UploadError('Не указано имя файла')
+    if size < 0 or size > get_max_size():
+        raise UploadError('Недопустимый размер файла', status=413)
+    session = UploadSession.objects.create(task=task, author=author, filename=filename[:255], size=size)
+    path = upload_temp_path(session)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.touch()
+    return session
+
+
+def _write_chunk(path, stream, start, length, expected_sha256):
+    # Пишет часть с позиции start; при ошибке файл обрезается обратно до start
+    digest = hashlib.sha256()
+    written = 0
+    with open(path, 'r+b') as out:
+        out.seek(start)
+        out.truncate()
+        while written < length:
+            block = stream.read(min(READ_SIZE, length - written))
+            if not block:
+                break
+            digest.update(block)
+            out.write(block)
+            written += len(block)
+        if written != length:
+            out.truncate(start)
+            raise UploadError('Часть получена не полностью', offset=start)
+
+    chunk_sha256 = digest.hexdigest()
+    if expected_sha256 and expected_sha256.lower() != chunk_sha256:
+        with open(path, 'r+b') as out:
+            out.truncate(start)
+        raise UploadError('Контрольная сумма части не совпадает', offset=start)
+    return chunk_sha256
+
+
+def receive_chunk(session, stream, content_range, content_length, expected_sha256=None):
+    """Дописывает часть файла из потока запроса во временный файл.
+
+    Часть читается из ``stream`` порциями и хэшируется по мере поступления.
+    Если соединение оборвалось на середине, временный файл обрезается до
+    последней целой части, и клиент продолжает с ``session.received``.
+    Возвращает SHA-256 принятой части.
+    """
+    match = CONTENT_RANGE_RE.match(content_range or '')
+    if not match:
+        raise UploadError('Нужен заголовок Content-Range: bytes start-end/total')
+    start, end, total = (int(group) for group in match.groups())
+    length = end - start + 1
+    if total != session.size or end >= total or length <= 0:
+        raise UploadError('Content-Range не соответствует загрузке')
+    if start != session.received:
+        raise UploadError('Неверное смещение части', status=409, offset=session.received)
+    if length > get_chunk_size():
+        raise UploadError('Слишком большая часть', status=413)
+    if content_length is not None and content_length != length:
+        raise UploadError('Content-Length не совпадает с Content-Range')
+
+    # Смещение занимается до записи: параллельный запрос той же части получит 409,
+    # а не будет писать в тот же временный файл одновременно
+    claimed_at = timezone.now()
+    claimed = (UploadSession.objects
+               .filter(pk=session.pk, received=start)
+               .filter(Q(writing_since__isnull=True)
+                       | Q(writing_since__lt=claimed_at - timedelta(seconds=get_claim_timeout())))
+               .update(writing_since=claimed_at))
+    if not claimed:
+        received = UploadSession.objects.filter(pk=session.pk).values_list('received', flat=True).first()
+        raise UploadError('Часть уже принимается параллельным запросом', status=409, offset=received)
+    mine = UploadSession.objects.filter(pk=session.pk, received=start, writing_since=claimed_at)
+
+    try:
+        chunk_sha256 = _write_chunk(upload_temp_path(session), stream, start, length, expected_sha256)
+    except Exception:
+        mine.update(writing_since=None)
+        raise
+
+    # Смещение сдвигается, только если занятое место не перехватили по таймауту
+    updated = mine.update(received=start + length, writing_since=None, updated_at=timezone.now())
+    if not updated:
+        raise UploadError('Загрузка изменена параллельным запросом', status=409)
+    session.received = start + length
+    return chunk_sha256
+
+
+def finish_upload(session):
+    # Вся загрузка получена: считаем хэш, кладём содержимое в общее хранилище
+    path = upload_temp_path(session)
+    sha256 = file_sha256(path)
+    blob = store_blob(path, sha256, session.size, session.filename)
+    with transaction.atomic():
+        attachment = create_attachment(session.task, session.author, blob, session.filename)
+        session.delete()
+    return attachment
+
+
+def cleanup_stale_uploads(max_age=timedelta(days=1)):
+    # Удаляет брошенные загрузки вместе с их временными файлами
+    removed = 0
+    for session in UploadSession.objects.filter(updated_at__lt=timezone.now() - max_age):
+        path = upload_temp_path(session)
+        if path.exists():
+            path.unlink()
+        session.delete()
+        removed += 1
+    return removed
@@ -1,5 +1,9 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, views
+
+# Представления, которые только читают данные, под ASGI могут быть асинхронными
+read_views = async_views if getattr(settings, 'ASYNC_READ_VIEWS', False) else views
 
 urlpatterns = [
     # Аутентификация
@@ -10,22 +14,43 @@ urlpatterns = [
     # Задачи
     path('tasks/create/', views.create_task_view, name='create_task'),
     path('tasks/<int:pk>/', views.task_detail_view, name='task_detail'),
+    path('tasks/<int:pk>/comments/', views.task_comments_view, name='task_comments'),
+    path('tasks/<int:pk>/uploads/', views.start_upload_view, name='start_upload'),
+    path('uploads/<uuid:upload_id>/', views.upload_chunk_view, name='upload_chunk'),
+    path('attachments/<int:pk>/download/', views.attachment_download_view, name='attachment_download'),
+    path('attachments/<int:pk>/<str:kind>/', views.attachment_preview_view, name='attachment_preview'),
     path('tasks/<int:pk>/edit/', views.edit_task_view, name='edit_task'),
     path('tasks/<int:pk>/delete/', views.delete_task_view, name='delete_task'),
 
+    # Поиск
+    path('search/', views.search_view, name='search'),
+
     # Заявки
-    path('requests/', views.request_list_view, name='request_list'),
+    path('requests/', read_views.request_list_view, name='request_list'),
     path('requests/create/', views.create_request_view, name='create_request'),
     path('requests/<int:pk>/delete/', views.delete_request_view, name='delete_request'),
 
     # Кабинет руководителя
-    path('manager/dashboard/', views.manager_dashboard_view, name='manager_dashboard'),
+    path('manager/dashboard/', read_views.manager_dashboard_view, name='manager_dashboard'),
 
     # ДОБАВЛЕН ПУТЬ для просмотра руководителем всех задач отдела
-    path('department/tasks/', views.department_tasks_view, name='department_tasks'),
+    path('department/tasks/', read_views.department_tasks_view, name='department_tasks'),
+    path('department/tasks/feed/', views.department_tasks_feed_view, name='department_tasks_feed'),
+    path('department/tasks/export/', views.department_tasks_export_view, name='department_tasks_export'),
 
     path('tasks/update_status/', views.update_task_status_view, name='update_task_status'),
+    path('tasks/update_status/batch/', views.update_task_status_batch_view, name='update_task_status_batch'),
+    path('tasks/board/<str:status>/', views.board_column_view, name='board_column'),
+    path('tasks/<int:pk>/fragment/', views.task_fragment_view, name='task_fragment'),
+
+    # Живое обновление страниц: SSE (под ASGI) и long-poll
+    path('live/events/', views.live_events_view, name='live_events'),
+    path('live/poll/', views.live_poll_view, name='live_poll'),
+
+    path('cache/stats/', views.dashboard_cache_stats_view, name='dashboard_cache_stats'),
+    path('jobs/stats/', views.job_stats_view, name='job_stats'),
+    path('metrics', views.metrics_view, name='metrics'),
 
     # Главная страница
-    path('', views.home_view, name='home'),
+    path('', read_views.home_view, name='home'),
 ]
\ No newline at end of file
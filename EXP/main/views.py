@@ -1,14 +1,34 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponseForbidden, JsonResponse
+from django.http import Http404, HttpResponse, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
 from django.contrib import messages
 from .forms import (
     CustomUserCreationForm, CustomAuthenticationForm, TaskCreationForm,
-    RequestForm, TaskUpdateForm, CommentForm, AttachmentForm
+    RequestForm, TaskUpdateForm, CommentForm, AttachmentForm, TaskExportForm
 )
-from .models import Task, Request, User, Comment, Attachment
+from .models import Task, Request, User, Comment, Attachment, Blob, UploadSession
+from .board import BOARD_CARD_FIELDS, BOARD_STATUSES, build_board, board_column_page, apply_status_changes
+from .stats import department_task_stats
+from .dashboard_cache import cached_fragment, dashboard_cache_stats
+from .roster import department_roster
+from .pagination import InvalidCursor, KeysetPage, keyset_paginate
+from .downloads import content_disposition, serve_file
+from .exports import EXPORT_FORMATS, export_rows
+from .jobs import job, job_stats
+from .metrics import render_metrics, scrape_allowed
+from .replicas import replica_reads
+from .live import Viewer, events_after, get_poll_interval, latest_event_id
+from .search import search
+from .uploads import UploadError, attach_uploaded_file, finish_upload, get_chunk_size, receive_chunk, start_upload
+from django.conf import settings
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
 import json
+import os
+import time
 from django.utils import timezone
 from datetime import timedelta
 
@@ -45,31 +65,57 @@ def logout_view(request):
     return redirect('login')
 
 # --- Основные страницы ---
+def home_board_html(user):
+    today = timezone.now().date()
+    soon_threshold = today + timedelta(days=3)
+
+    def render_board():
+        # Вся доска пользователя собирается одним запросом и раскладывается по колонкам
+        return render_to_string('main/includes/board_columns.html', {
+            'columns': build_board(user),
+            'today': today,
+            'soon_threshold': soon_threshold,
+        })
+
+    # Подсветка просроченных задач зависит от даты, поэтому она входит в ключ
+    return mark_safe(cached_fragment(user.pk, 'board', render_board, suffix=today.isoformat()))
+
 @login_required
+@replica_reads
 def home_view(request):
-    # Получаем задачи, назначенные пользователю, и группируем их по статусу
-    all_tasks = Task.objects.filter(assignee=request.user)
+    context = {
+        'board_html': home_board_html(request.user),
+        'employees': department_roster(request.user.department_id),
+        # С этого события страница начинает получать живые обновления
+        'live_after': latest_event_id(),
+    }
+    return render(request, 'main/home.html', context)
 
-    new_tasks = all_tasks.filter(status=Task.Status.NEW)
-    in_progress_tasks = all_tasks.filter(status=Task.Status.IN_PROGRESS)
-    completed_tasks = all_tasks.filter(status=Task.Status.COMPLETED)
+@login_required
+def board_column_view(request, status):
+    # Подгрузка следующих карточек колонки канбана («Показать ещё»)
+    if status not in BOARD_STATUSES:
+        return JsonResponse({'success': False, 'error': 'Unknown status'}, status=400)
+    try:
+        offset = max(int(request.GET.get('offset', 0)), 0)
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Invalid offset'}, status=400)
 
-    department_employees = []
-    if request.user.department:
-        department_employees = User.objects.filter(department=request.user.department)
+    tasks, has_more = board_column_page(request.user, status, offset)
 
     today = timezone.now().date()
-    soon_threshold = today + timedelta(days=3)
-
-    context = {
-        'new_tasks': new_tasks,
-        'in_progress_tasks': in_progress_tasks,
-        'completed_tasks': completed_tasks,
-        'employees': department_employees,
+    html = render_to_string('main/includes/task_cards.html', {
+        'tasks': tasks,
         'today': today,
-        'soon_threshold': soon_threshold,
-    }
-    return render(request, 'main/home.html', context)
+        'soon_threshold': today + timedelta(days=3),
+    }, request=request)
+    return JsonResponse({
+        'success': True,
+        'html': html,
+        'count': len(tasks),
+        'has_more': has_more,
+        'next_offset': offset + len(tasks),
+    })
 
 # --- Задачи (CRUD) ---
 @login_required
@@ -88,16 +134,12 @@ def create_task_view(request):
 
 @login_required
 def task_detail_view(request, pk):
-    task = get_object_or_404(Task, pk=pk)
-
-    # 1. ПРОВЕРКА ПРАВ ДОСТУПА
-    is_author = request.user == task.author
-    is_assignee = request.user == task.assignee
-    is_leader = (request.user.is_staff and
-                 task.author.department and
-                 task.author.department == request.user.department)
-
-    if not (is_author or is_assignee or is_leader):
+    # 1. ПРОВЕРКА ПРАВ ДОСТУПА (задача и вердикт о доступе - одним запросом)
+    task = get_object_or_404(
+        Task.objects.select_related('author', 'assignee').with_access(request.user),
+        pk=pk,
+    )
+    if not task.can_view:
         return HttpResponseForbidden("У вас нет доступа к этой задаче.")
 
     # 2. ОБРАБОТКА POST-ЗАПРОСОВ (когда пользователь нажимает кнопки)
@@ -134,16 +176,18 @@ def task_detail_view(request, pk):
         elif 'add_attachment' in request.POST:
             form = AttachmentForm(request.POST, request.FILES)
             if form.is_valid():
-                attachment = form.save(commit=False)
-                attachment.author = request.user
-                attachment.task = task
-                attachment.save()
+                attach_uploaded_file(task, request.user, form.cleaned_data['file'])
                 messages.success(request, 'Файл успешно добавлен.')
             return redirect('task_detail', pk=task.pk)
 
     # 3. ПОДГОТОВКА ДАННЫХ ДЛЯ ОТОБРАЖЕНИЯ СТРАНИЦЫ (GET-запрос)
-    comments = task.comments.all()
-    attachments = task.attachments.all()
+    # Комментарии видны только автору и исполнителю; показываем последние,
+    # более ранние подгружаются через task_comments_view
+    comments_page = KeysetPage()
+    if task.can_edit or task.can_change_status:
+        comments_page = task_comments_page(task.pk)
+    attachments = task.attachments.select_related('blob')
+    upload_chunk_size = get_chunk_size()
 
     comment_form = CommentForm()
     update_form = TaskUpdateForm(instance=task, user=request.user)
@@ -151,19 +195,48 @@ def task_detail_view(request, pk):
 
     context = {
         'task': task,
-        'comments': comments,
+        'comments': comments_page.items,
+        'comments_cursor': comments_page.next_cursor,
         'attachments': attachments,
         'comment_form': comment_form,
         'update_form': update_form,
         'attachment_form': attachment_form,
+        'upload_chunk_size': upload_chunk_size,
         'statuses': Task.Status.choices,
     }
     return render(request, 'main/task_detail.html', context)
 
+def task_comments_page(task_id, cursor=None):
+    # Страница комментариев от новых к старым, внутри страницы - в хронологическом порядке
+    comments = Comment.objects.filter(task_id=task_id).select_related('author')
+    per_page = getattr(settings, 'TASK_COMMENTS_PAGE_SIZE', 20)
+    page = keyset_paginate(comments, cursor=cursor, per_page=per_page)
+    page.items.reverse()
+    return page
+
+@login_required
+def task_comments_view(request, pk):
+    # Более ранние комментарии задачи (HTML-фрагмент в JSON)
+    task = get_object_or_404(Task.objects.only('id', 'author_id', 'assignee_id').with_access(request.user), pk=pk)
+    if not (task.can_edit or task.can_change_status):
+        return JsonResponse({'success': False, 'error': 'Permission denied'}, status=403)
+    try:
+        page = task_comments_page(task.pk, cursor=request.GET.get('cursor'))
+    except InvalidCursor:
+        return JsonResponse({'success': False, 'error': 'Invalid cursor'}, status=400)
+
+    html = render_to_string('main/includes/comment_items.html', {'comments': page.items}, request=request)
+    return JsonResponse({
+        'success': True,
+        'html': html,
+        'count': len(page.items),
+        'next_cursor': page.next_cursor,
+    })
+
 @login_required
 def edit_task_view(request, pk):
-    task = get_object_or_404(Task, pk=pk)
-    if task.author != request.user:
+    task = get_object_or_404(Task.objects.with_access(request.user), pk=pk)
+    if not task.can_edit:
         return HttpResponseForbidden("У вас нет прав для редактирования этой задачи.")
     if request.method == 'POST':
         form = TaskCreationForm(request.POST, instance=task, user=request.user)
@@ -177,8 +250,8 @@ def edit_task_view(request, pk):
 
 @login_required
 def delete_task_view(request, pk):
-    task = get_object_or_404(Task, pk=pk)
-    if task.author != request.user:
+    task = get_object_or_404(Task.objects.select_related('assignee').with_access(request.user), pk=pk)
+    if not task.can_edit:
         return HttpResponseForbidden("У вас нет прав для удаления этой задачи.")
     if request.method == 'POST':
         task_title = task.title
@@ -188,13 +261,20 @@ def delete_task_view(request, pk):
     return render(request, 'main/delete_task_confirm.html', {'task': task})
 
 # --- Заявки ---
+def user_requests(user):
+    # Исполнитель и отдел выводятся в карточке заявки, поэтому подгружаются сразу
+    return list(Request.objects
+                .filter(requester=user)
+                .select_related('assignee', 'department')
+                .order_by('-created_at'))
+
 @login_required
+@replica_reads
 def request_list_view(request):
     # Доступ к списку заявок только у руководителей
     if not request.user.is_staff:
         return HttpResponseForbidden('Доступ к заявкам есть только у руководителей отделов.')
-    user_requests = Request.objects.filter(requester=request.user).order_by('-created_at')
-    return render(request, 'main/request_list.html', {'requests': user_requests})
+    return render(request, 'main/request_list.html', {'requests': user_requests(request.user)})
 
 @login_required
 def create_request_view(request):
@@ -220,15 +300,10 @@ def create_request_view(request):
 
 @login_required
 def delete_request_view(request, pk):
-    req = get_object_or_404(Request, pk=pk)
-    
     # Проверяем права: автор заявки или руководитель отдела
-    is_author = request.user == req.requester
-    is_leader = (request.user.is_staff and 
-                req.department and 
-                req.department.leader == request.user)
-    
-    if not (is_author or is_leader):
+    req = get_object_or_404(Request.objects.select_related('department').with_access(request.user), pk=pk)
+
+    if not req.can_edit:
         return HttpResponseForbidden("У вас нет прав для удаления этой заявки.")
     
     if request.method == 'POST':
@@ -240,63 +315,134 @@ def delete_request_view(request, pk):
     return render(request, 'main/delete_request_confirm.html', {'request': req})
 
 # --- Кабинет руководителя ---
-@login_required
-def manager_dashboard_view(request):
-    if not request.user.is_staff:
-        return HttpResponseForbidden('Доступ запрещён')
-
+@job(priority=10)
+def create_task_from_request(request_id, author_id):
+    # Задача по одобренной заявке: автор - руководитель, исполнитель - назначенный сотрудник
+    req = Request.objects.select_related('requester').get(pk=request_id)
+    Task.objects.create(
+        author_id=author_id,
+        assignee_id=req.assignee_id,
+        title=f'Выполнить по заявке: {req.title}',
+        description=f'Необходимо выполнить работу по заявке от {req.requester.get_full_name()}.\n\n'
+                    f'Обоснование: {req.justification}'
+    )
+
+def pending_requests(user):
+    # Заявки, ожидающие решения руководителя
+    def load_pending_requests():
+        return list(Request.objects.filter(
+            assignee=user,
+            status=Request.RequestStatus.NEW
+        ).select_related('requester', 'department').order_by('-created_at'))
+
+    return cached_fragment(user.pk, 'pending_requests', load_pending_requests)
+
+def assign_request(request):
     # Логика для назначения заявки сотруднику
-    if request.method == 'POST' and 'assign_request' in request.POST:
-        request_id = request.POST.get('request_id')
-        assignee_id = request.POST.get('assignee')
-        if request_id and assignee_id:
-            req = get_object_or_404(Request, pk=request_id)
-            assignee = get_object_or_404(User, pk=assignee_id)
-
-            if req.assignee == request.user:
+    request_id = request.POST.get('request_id')
+    assignee_id = request.POST.get('assignee')
+    if request_id and assignee_id:
+        req = get_object_or_404(Request, pk=request_id)
+        assignee = get_object_or_404(User, pk=assignee_id)
+
+        if req.assignee == request.user:
+            with transaction.atomic():
                 # Обновляем саму заявку
                 req.assignee = assignee
                 req.status = Request.RequestStatus.APPROVED  # Меняем статус на "Одобрена"
                 req.save()
 
-                # НОВАЯ ЛОГИКА: СОЗДАЁМ ЗАДАЧУ ДЛЯ СОТРУДНИКА
-                Task.objects.create(
-                    author=request.user,  # Автор задачи - руководитель
-                    assignee=assignee,  # Исполнитель - выбранный сотрудник
-                    title=f'Выполнить по заявке: {req.title}',
-                    description=f'Необходимо выполнить работу по заявке от {req.requester.get_full_name()}.\n\n'
-                                f'Обоснование: {req.justification}'
-                )
+                # Задача для сотрудника создаётся фоновым заданием
+                create_task_from_request.enqueue(request_id=req.pk, author_id=request.user.pk)
 
-                messages.success(request, f'Заявка "{req.title}" назначена исполнителю {assignee.get_full_name()}.')
+            messages.success(request, f'Заявка "{req.title}" назначена исполнителю {assignee.get_full_name()}.')
 
-            return redirect('manager_dashboard')
+    return redirect('manager_dashboard')
 
-    # ... (остальной код функции для отображения страницы остаётся без изменений) ...
-    pending_requests = Request.objects.filter(
-        assignee=request.user,
-        status=Request.RequestStatus.NEW
-    ).order_by('-created_at')
+@login_required
+@replica_reads
+def manager_dashboard_view(request):
+    if not request.user.is_staff:
+        return HttpResponseForbidden('Доступ запрещён')
 
-    department_employees = []
-    if request.user.department:
-        department_employees = User.objects.filter(department=request.user.department)
+    if request.method == 'POST' and 'assign_request' in request.POST:
+        return assign_request(request)
 
     context = {
-        'requests': pending_requests,
-        'employees': department_employees,
+        'requests': pending_requests(request.user),
+        'employees': department_roster(request.user.department_id),
     }
     return render(request, 'main/manager_dashboard.html', context)
 
+def department_tasks_page(department, cursor=None):
+    # Одна страница ленты задач отдела (keyset по created_at, id)
+    tasks = (Task.objects
+             .filter(department=department)
+             .select_related('author', 'assignee'))
+    per_page = getattr(settings, 'DEPARTMENT_TASKS_PAGE_SIZE', 25)
+    return keyset_paginate(tasks, cursor=cursor, per_page=per_page)
+
 # НОВАЯ ФУНКЦИЯ для просмотра руководителем всех задач отдела
 @login_required
+@replica_reads
 def department_tasks_view(request):
     if not request.user.is_staff or not request.user.department:
         return HttpResponseForbidden("Доступ есть только у руководителей отделов.")
-    department_tasks = Task.objects.filter(author__department=request.user.department).order_by('-created_at')
-    context = {'tasks': department_tasks, 'department': request.user.department}
+    department = request.user.department
+    page = department_tasks_page(department)
+    context = {
+        'tasks': page.items,
+        'next_cursor': page.next_cursor,
+        'stats': department_task_stats(department),
+        'department': department,
+        'live_after': latest_event_id(),
+        'export_form': TaskExportForm(user=request.user),
+    }
     return render(request, 'main/department_tasks.html', context)
 
+@login_required
+@replica_reads
+def department_tasks_feed_view(request):
+    # Следующие страницы ленты задач отдела для бесконечной прокрутки
+    if not request.user.is_staff or not request.user.department:
+        return JsonResponse({'success': False, 'error': 'Permission denied'}, status=403)
+    department = request.user.department
+    try:
+        page = department_tasks_page(department, cursor=request.GET.get('cursor'))
+    except InvalidCursor:
+        return JsonResponse({'success': False, 'error': 'Invalid cursor'}, status=400)
+
+    html = render_to_string('main/includes/department_task_items.html', {
+        'tasks': page.items,
+        'department': department,
+    }, request=request)
+    return JsonResponse({
+        'success': True,
+        'html': html,
+        'count': len(page.items),
+        'next_cursor': page.next_cursor,
+    })
+
+@login_required
+@replica_reads
+def department_tasks_export_view(request):
+    # Выгрузка задач отдела в CSV или XLSX: строки отдаются потоком по мере чтения из БД
+    if not request.user.is_staff or not request.user.department:
+        return HttpResponseForbidden("Доступ есть только у руководителей отделов.")
+    form = TaskExportForm(request.GET, user=request.user)
+    if not form.is_valid():
+        return JsonResponse({'success': False, 'errors': form.errors}, status=400)
+
+    department = request.user.department
+    export_format = form.cleaned_data['format']
+    content_type, stream = EXPORT_FORMATS[export_format]
+    tasks = form.filter(Task.objects.filter(department=department))
+    response = StreamingHttpResponse(stream(export_rows(tasks)), content_type=content_type)
+    filename = f'Задачи {department.name} {timezone.localdate():%Y-%m-%d}.{export_format}'
+    response['Content-Disposition'] = content_disposition(filename)
+    response['Cache-Control'] = 'private, no-store'
+    return response
+
 @login_required
 def update_task_status_view(request):
     if request.method == 'POST':
@@ -304,13 +450,238 @@ def update_task_status_view(request):
         task_id = data.get('task_id')
         new_status = data.get('status')
 
-        task = get_object_or_404(Task, pk=task_id)
+        if new_status not in Task.Status.values:
+            return JsonResponse({'success': False, 'error': 'Invalid status'})
+
+        task = get_object_or_404(Task.objects.with_access(request.user), pk=task_id)
 
         # Проверка прав: менять статус может только исполнитель
-        if task.assignee == request.user:
+        if task.can_change_status:
             task.status = new_status
-            task.save()
+            task.save(update_fields=['status', 'updated_at'])
             return JsonResponse({'success': True})
 
         return JsonResponse({'success': False, 'error': 'Permission denied'})
-    return JsonResponse({'success': False, 'error': 'Invalid request method'})
\ No newline at end of file
+    return JsonResponse({'success': False, 'error': 'Invalid request method'})
+
+@login_required
+def update_task_status_batch_view(request):
+    # Пачка перемещений карточек канбана: [{"task_id": 1, "status": "new"}, ...]
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Invalid request method'}, status=405)
+    try:
+        changes = json.loads(request.body).get('changes')
+    except (ValueError, AttributeError):
+        changes = None
+    if not isinstance(changes, list):
+        return JsonResponse({'success': False, 'error': 'Invalid payload'}, status=400)
+    limit = getattr(settings, 'BOARD_STATUS_BATCH_LIMIT', 200)
+    if len(changes) > limit:
+        return JsonResponse({'success': False, 'error': f'Too many changes (max {limit})'}, status=400)
+
+    results = apply_status_changes(request.user, changes)
+    return JsonResponse({
+        'success': all(item['success'] for item in results),
+        'results': results,
+    })
+
+@login_required
+@replica_reads
+def search_view(request):
+    # Полнотекстовый поиск по задачам, заявкам и комментариям, доступным пользователю
+    query = request.GET.get('q', '').strip()
+    try:
+        page_number = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        page_number = 1
+    return render(request, 'main/search.html', {
+        'search_query': query,
+        'page': search(request.user, query, page_number),
+    })
+
+@login_required
+def job_stats_view(request):
+    # Метрики очереди фоновых заданий (только для администраторов)
+    if not request.user.is_superuser:
+        return HttpResponseForbidden('Доступ запрещён')
+    return JsonResponse(job_stats())
+
+@login_required
+def dashboard_cache_stats_view(request):
+    # Счётчики кэша дашбордов (только для администраторов)
+    if not request.user.is_superuser:
+        return HttpResponseForbidden('Доступ запрещён')
+    return JsonResponse(dashboard_cache_stats())
+
+def metrics_view(request):
+    # Метрики для Prometheus: сборщику с разрешённого адреса или с токеном вход не нужен
+    if not scrape_allowed(request) and not request.user.is_superuser:
+        return HttpResponseForbidden('Доступ запрещён')
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+def _upload_error(error):
+    data = {'success': False, 'error': str(error)}
+    if error.offset is not None:
+        data['offset'] = error.offset
+    return JsonResponse(data, status=error.status)
+
+def _attachment_data(attachment):
+    return {'id': attachment.pk, 'name': attachment.name, 'url': reverse('attachment_download', args=[attachment.pk])}
+
+@login_required
+def start_upload_view(request, pk):
+    # Начало загрузки по частям: {"filename": "...", "size": 123} -> id загрузки
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Invalid request method'}, status=405)
+    task = get_object_or_404(Task.objects.only('id', 'author_id', 'assignee_id').with_access(request.user), pk=pk)
+    # Прикреплять файлы могут автор и исполнитель
+    if not (task.can_edit or task.can_change_status):
+        return JsonResponse({'success': False, 'error': 'Permission denied'}, status=403)
+    try:
+        data = json.loads(request.body)
+        filename = str(data.get('filename') or '')
+        size = int(data.get('size'))
+    except (ValueError, TypeError, AttributeError):
+        return JsonResponse({'success': False, 'error': 'Invalid payload'}, status=400)
+    try:
+        session = start_upload(task, request.user, filename, size)
+    except UploadError as error:
+        return _upload_error(error)
+    if session.size == 0:
+        # Пустому файлу части не нужны
+        attachment = finish_upload(session)
+        return JsonResponse({'success': True, 'offset': 0, 'size': 0, 'attachment': _attachment_data(attachment)})
+    return JsonResponse({
+        'success': True,
+        'upload_id': str(session.pk),
+        'offset': 0,
+        'chunk_size': get_chunk_size(),
+    })
+
+@login_required
+def upload_chunk_view(request, upload_id):
+    # GET - сколько байт уже принято (для продолжения), PUT - очередная часть файла
+    session = get_object_or_404(UploadSession.objects.select_related('task'), pk=upload_id, author=request.user)
+    if request.method == 'GET':
+        return JsonResponse({'success': True, 'offset': session.received, 'size': session.size})
+    if request.method != 'PUT':
+        return JsonResponse({'success': False, 'error': 'Invalid request method'}, status=405)
+
+    try:
+        content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        content_length = None
+    try:
+        # Тело читается из потока частями, целиком в память не попадает
+        receive_chunk(
+            session,
+            request,
+            request.headers.get('Content-Range'),
+            content_length,
+            expected_sha256=request.headers.get('X-Chunk-Sha256'),
+        )
+        if session.received < session.size:
+            return JsonResponse({'success': True, 'offset': session.received, 'size': session.size})
+        attachment = finish_upload(session)
+    except UploadError as error:
+        return _upload_error(error)
+    return JsonResponse({
+        'success': True,
+        'offset': session.size,
+        'size': session.size,
+        'attachment': _attachment_data(attachment),
+    })
+
+def visible_attachments(user):
+    # Вложения задач, которые видит пользователь (права проверяются подзапросом)
+    return (Attachment.objects
+            .select_related('blob')
+            .filter(task__in=Task.objects.visible_to(user).values('pk')))
+
+@login_required
+def attachment_download_view(request, pk):
+    # Файл отдаётся тем, кто видит задачу; права проверяются в том же запросе
+    attachment = get_object_or_404(visible_attachments(request.user), pk=pk)
+    filename = attachment.name or os.path.basename(attachment.file.name)
+    if attachment.blob_id:
+        # Содержимое блоба неизменно, поэтому его хэш - готовый ETag
+        blob = attachment.blob
+        return serve_file(request, blob.file, filename, blob.size, etag=f'"{blob.sha256}"')
+    return serve_file(request, attachment.file, filename, attachment.file.size)
+
+@login_required
+def attachment_preview_view(request, pk, kind):
+    # Миниатюра (thumb) или превью (preview) вложения, построенные в фоне
+    if kind not in ('thumb', 'preview'):
+        raise Http404
+    attachment = get_object_or_404(
+        visible_attachments(request.user),
+        pk=pk,
+        blob__preview_status=Blob.PreviewStatus.READY,
+    )
+    blob = attachment.blob
+    image = blob.thumbnail if kind == 'thumb' else blob.preview
+    return serve_file(request, image, os.path.basename(image.name), image.size,
+                      etag=f'"{blob.sha256}-{kind}"', as_attachment=False)
+
+@login_required
+def live_events_view(request):
+    # Поток событий (SSE) обслуживает ASGI-приложение из EXP/asgi.py до Django.
+    # Сюда запрос попадает только при запуске через WSGI - тогда клиент
+    # переключается на long-poll
+    return JsonResponse({'success': False, 'error': 'SSE is available only under ASGI'}, status=404)
+
+@login_required
+def live_poll_view(request):
+    # Запасной вариант для WSGI: ждём новых событий не дольше LIVE_LONG_POLL_TIMEOUT
+    # секунд (по умолчанию 2). Всё это время запрос занимает воркер, поэтому ожидание
+    # короткое, и клиент просто сразу спрашивает снова
+    try:
+        after = int(request.GET['after'])
+    except (KeyError, ValueError):
+        return JsonResponse({'success': True, 'events': [], 'last_id': latest_event_id()})
+
+    viewer = Viewer.for_user(request.user)
+    deadline = time.monotonic() + getattr(settings, 'LIVE_LONG_POLL_TIMEOUT', 2)
+    while True:
+        events = events_after(after, viewer)
+        if events or time.monotonic() >= deadline:
+            break
+        time.sleep(get_poll_interval())
+    return JsonResponse({
+        'success': True,
+        'events': events,
+        'last_id': events[-1]['id'] if events else after,
+    })
+
+@login_required
+def task_fragment_view(request, pk):
+    # Свежая разметка одной задачи для точечного обновления страницы по событию
+    kind = request.GET.get('kind')
+    today = timezone.now().date()
+    if kind == 'board':
+        task = Task.objects.filter(pk=pk, assignee=request.user).only(*BOARD_CARD_FIELDS).first()
+        if task is None:
+            return JsonResponse({'success': True, 'html': ''})
+        task.assignee = request.user
+        html = render_to_string('main/includes/task_cards.html', {
+            'tasks': [task],
+            'today': today,
+            'soon_threshold': today + timedelta(days=3),
+        }, request=request)
+    elif kind == 'department':
+        if not request.user.is_staff or not request.user.department_id:
+            return JsonResponse({'success': False, 'error': 'Permission denied'}, status=403)
+        task = (Task.objects
+                .filter(pk=pk, department_id=request.user.department_id)
+                .select_related('author', 'assignee')
+                .first())
+        if task is None:
+            return JsonResponse({'success': True, 'html': ''})
+        html = render_to_string('main/includes/department_task_items.html', {
+            'tasks': [task],
+            'department': request.user.department,
+        }, request=request)
+    else:
+        return JsonResponse({'success': False, 'error': 'Unknown kind'}, status=400)
+    return JsonResponse({'success': True, 'html': html, 'status': task.status})